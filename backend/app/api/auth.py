@@ -1,12 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import get_async_db, get_db
 from app.models.models import User
 from app.schemas.user import UserCreate, UserResponse, Token
 from app.services import auth_service
@@ -26,21 +27,21 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 @router.post("/register", response_model=UserResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = auth_service.get_user_by_email(db, email=user.email)
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await auth_service.fetch_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(
             status_code=400,
             detail="Email already registered"
         )
-    return auth_service.create_user(db=db, user=user)
+    return await auth_service.register_user(db=db, user=user)
 
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = auth_service.authenticate_user(db, form_data.username, form_data.password)
+    user = await auth_service.authenticate(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,14 +55,18 @@ async def login_for_access_token(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
-async def read_users_me(
-    current_user: User = Depends(auth_service.get_current_user)
+def read_users_me(
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
 ):
-    return current_user
+    user = auth_service.get_user(db, current_user.id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
 @router.post("/upgrade-to-premium")
-async def upgrade_to_premium(
-    current_user: User = Depends(auth_service.get_current_user),
+def upgrade_to_premium(
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     if current_user.role == "premium":
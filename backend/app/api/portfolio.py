@@ -1,48 +1,97 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import json
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from app.core.concurrency import run_analytics
+from app.db.pagination import NEXT_CURSOR_HEADER
 from app.db.session import get_db
 from app.models.models import User, Portfolio, PortfolioHolding
-from app.schemas.portfolio import PortfolioCreate, PortfolioResponse, PortfolioHoldingCreate
-from app.services import auth_service, portfolio_service
+from app.schemas.portfolio import (
+    PortfolioCreate, PortfolioResponse, PortfolioSummary, PortfolioHoldingCreate, PortfolioHoldingResponse,
+    PortfolioImportResult, PortfolioValuationResponse
+)
+from app.services import auth_service, nav_history, portfolio_service, quote_hub
 from app.core.config import settings
 
 router = APIRouter()
 
 @router.post("/", response_model=PortfolioResponse)
-async def create_portfolio(
+def create_portfolio(
     portfolio: PortfolioCreate,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Create a new portfolio"""
     return portfolio_service.create_portfolio(db, portfolio, current_user.id)
 
+def _page_params(
+    limit: int = Query(settings.DEFAULT_PAGE_SIZE, ge=1, le=settings.MAX_PAGE_SIZE),
+    cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} from the previous page")
+):
+    return limit, cursor
+
 @router.get("/", response_model=List[PortfolioResponse])
-async def get_user_portfolios(
-    current_user: User = Depends(auth_service.get_current_user),
+def get_user_portfolios(
+    response: Response,
+    page: tuple = Depends(_page_params),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Get all portfolios for the current user"""
-    return portfolio_service.get_user_portfolios(db, current_user.id)
+    """Get a page of the current user's portfolios with their holdings"""
+    portfolios, next_cursor = portfolio_service.get_user_portfolios(db, current_user.id, *page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return portfolios
+
+@router.get("/summary", response_model=List[PortfolioSummary])
+def get_user_portfolio_summaries(
+    response: Response,
+    page: tuple = Depends(_page_params),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a page of the current user's portfolios without holdings"""
+    portfolios, next_cursor = portfolio_service.get_user_portfolio_summaries(db, current_user.id, *page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return portfolios
 
 @router.get("/{portfolio_id}", response_model=PortfolioResponse)
-async def get_portfolio(
+def get_portfolio(
     portfolio_id: int,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get a specific portfolio"""
-    portfolio = portfolio_service.get_portfolio(db, portfolio_id)
+    portfolio = portfolio_service.get_portfolio_with_holdings(db, portfolio_id)
     if not portfolio or portfolio.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Portfolio not found")
     return portfolio
 
+@router.get("/{portfolio_id}/holdings", response_model=List[PortfolioHoldingResponse])
+def get_holdings(
+    portfolio_id: int,
+    response: Response,
+    page: tuple = Depends(_page_params),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Get a page of a portfolio's holdings"""
+    portfolio = portfolio_service.get_portfolio(db, portfolio_id)
+    if not portfolio or portfolio.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    holdings, next_cursor = portfolio_service.get_holdings(db, portfolio_id, *page)
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return holdings
+
 @router.post("/{portfolio_id}/holdings", response_model=PortfolioResponse)
-async def add_holding(
+def add_holding(
     portfolio_id: int,
     holding: PortfolioHoldingCreate,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Add a stock holding to a portfolio"""
@@ -51,11 +100,29 @@ async def add_holding(
         raise HTTPException(status_code=404, detail="Portfolio not found")
     return portfolio_service.add_holding(db, portfolio_id, holding)
 
-@router.delete("/{portfolio_id}/holdings/{holding_id}")
-async def remove_holding(
+@router.post("/{portfolio_id}/holdings/bulk", response_model=PortfolioImportResult)
+async def import_holdings(
+    portfolio_id: int,
+    request: Request,
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Import many holdings at once from a CSV (text/csv) or a JSON array body"""
+    portfolio = await run_analytics(portfolio_service.get_portfolio, db, portfolio_id)
+    if not portfolio or portfolio.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    
+    body = await request.body()
+    is_csv = request.headers.get("content-type", "").startswith("text/csv")
+    holdings = await run_analytics(portfolio_service.parse_holdings_import, body, is_csv)
+    imported = await run_analytics(portfolio_service.import_holdings, db, portfolio_id, holdings)
+    return {"portfolio_id": portfolio_id, "imported": imported}
+
+@router.delete("/{portfolio_id}/holdings/{holding_id}", response_model=PortfolioResponse)
+def remove_holding(
     portfolio_id: int,
     holding_id: int,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Remove a stock holding from a portfolio"""
@@ -67,7 +134,7 @@ async def remove_holding(
 @router.get("/{portfolio_id}/analysis")
 async def get_portfolio_analysis(
     portfolio_id: int,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get detailed analysis of a portfolio"""
@@ -77,8 +144,88 @@ async def get_portfolio_analysis(
             detail="Premium subscription required for portfolio analysis"
         )
     
+    portfolio = await run_analytics(portfolio_service.get_portfolio, db, portfolio_id)
+    if not portfolio or portfolio.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    
+    return await run_analytics(portfolio_service.analyze_portfolio, db, portfolio_id) 
+
+@router.get("/{portfolio_id}/history", response_model=List[PortfolioValuationResponse])
+def get_portfolio_history(
+    portfolio_id: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Daily market value and cost basis of a portfolio from the materialized history"""
     portfolio = portfolio_service.get_portfolio(db, portfolio_id)
+    if not portfolio or portfolio.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    return nav_history.get_history(db, portfolio_id, start, end)
+
+@router.get("/{portfolio_id}/risk")
+async def get_portfolio_risk(
+    portfolio_id: int,
+    method: str = Query("normal", pattern="^(normal|bootstrap)$"),
+    paths: int = Query(settings.RISK_DEFAULT_PATHS, ge=1000, le=settings.RISK_MAX_PATHS),
+    horizons: List[int] = Query([1, 10], description="Horizons in trading days"),
+    confidence: List[float] = Query([0.95, 0.99]),
+    seed: Optional[int] = Query(None, ge=0, description="Fix to reproduce a previous run"),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Monte Carlo value at risk and expected shortfall of a portfolio"""
+    if current_user.role == "free":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Premium subscription required for portfolio risk"
+        )
+    if not all(1 <= horizon <= settings.RISK_MAX_HORIZON_DAYS for horizon in horizons):
+        raise HTTPException(status_code=422, detail=f"Horizons must be between 1 and {settings.RISK_MAX_HORIZON_DAYS} days")
+    if not all(0 < level < 1 for level in confidence):
+        raise HTTPException(status_code=422, detail="Confidence levels must be between 0 and 1")
+    
+    portfolio = await run_analytics(portfolio_service.get_portfolio, db, portfolio_id)
+    if not portfolio or portfolio.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Portfolio not found")
+    
+    return await run_analytics(
+        portfolio_service.simulate_risk, db, portfolio_id, horizons, confidence, paths, method, seed
+    )
+
+async def _valuation_events(request: Request, valuation: portfolio_service.LiveValuation):
+    async with quote_hub.hub.subscribe(valuation.quantities) as subscription:
+        while not await request.is_disconnected():
+            quotes = await subscription.next(timeout=settings.QUOTE_STREAM_HEARTBEAT_SECONDS)
+            if not quotes:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keepalive\n\n"
+                continue
+            payload = {**valuation.apply(quotes), 'quotes': quotes}
+            yield f"event: valuation\ndata: {json.dumps(payload)}\n\n"
+
+@router.get("/{portfolio_id}/stream")
+async def stream_portfolio_valuation(
+    portfolio_id: int,
+    request: Request,
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stream live portfolio value and daily change as server-sent events"""
+    if current_user.role == "free":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Premium subscription required for portfolio analysis"
+        )
+    
+    portfolio = await run_analytics(portfolio_service.get_portfolio_with_holdings, db, portfolio_id)
     if not portfolio or portfolio.user_id != current_user.id:
         raise HTTPException(status_code=404, detail="Portfolio not found")
     
-    return portfolio_service.analyze_portfolio(db, portfolio_id) 
\ No newline at end of file
+    valuation = portfolio_service.LiveValuation(portfolio.holdings)
+    return StreamingResponse(
+        _valuation_events(request, valuation),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,42 +1,55 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from app.db.session import get_db
+from typing import List, Optional
+from app.core import singleflight
+from app.core.concurrency import run_analytics
+from app.db.session import get_async_db, get_db
 from app.models.models import User, Stock, StockView, StockRecommendation
 from app.schemas.stock import StockResponse, StockRecommendationResponse
-from app.services import auth_service, stock_service
+from app.services import auth_service, backtest, holdings_cache, market_data, stock_service, view_quota
 from app.core.config import settings
 
 router = APIRouter()
 
 @router.get("/qtop-holdings", response_model=List[StockResponse])
 async def get_qtop_holdings(
-    current_user: User = Depends(auth_service.get_current_user),
-    db: Session = Depends(get_db)
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    if_none_match: Optional[str] = Header(None)
 ):
     """Get all stocks in QTOP ETF"""
-    return stock_service.get_qtop_holdings(db)
+    cached = await holdings_cache.cache.get(lambda: stock_service.fetch_qtop_holdings(db))
+    headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+    if holdings_cache.etag_matches(if_none_match, cached.etag):
+        holdings_cache.cache.not_modified += 1
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
 
 @router.get("/stock/{symbol}", response_model=StockResponse)
-async def get_stock_details(
+def get_stock_details(
     symbol: str,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get detailed information about a specific stock"""
-    # Check if user has reached their free tier limit
-    if current_user.role == "free":
-        view_count = stock_service.get_user_stock_views_count(db, current_user.id)
-        if view_count >= settings.MAX_FREE_STOCK_VIEWS:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Free tier limit reached. Please upgrade to premium to view more stocks."
-            )
+    limit_reached = HTTPException(
+        status_code=status.HTTP_403_FORBIDDEN,
+        detail="Free tier limit reached. Please upgrade to premium to view more stocks."
+    )
+    # Turn away users already known to be at the free tier limit without a query
+    if current_user.role == "free" and view_quota.is_exhausted(current_user.id):
+        raise limit_reached
     
     stock = stock_service.get_stock_by_symbol(db, symbol)
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
     
+    # Count the view atomically; a concurrent request may have used the last one
+    if current_user.role == "free" and not view_quota.consume(db, current_user.id, settings.MAX_FREE_STOCK_VIEWS):
+        raise limit_reached
+    
     # Record the view
     stock_service.record_stock_view(db, current_user.id, stock.id)
     
@@ -45,7 +58,7 @@ async def get_stock_details(
 @router.get("/stock/{symbol}/recommendation", response_model=StockRecommendationResponse)
 async def get_stock_recommendation(
     symbol: str,
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get AI-powered recommendation for a specific stock"""
@@ -55,20 +68,22 @@ async def get_stock_recommendation(
             detail="Premium subscription required for stock recommendations"
         )
     
-    stock = stock_service.get_stock_by_symbol(db, symbol)
+    stock = await run_analytics(stock_service.get_stock_by_symbol, db, symbol)
     if not stock:
         raise HTTPException(status_code=404, detail="Stock not found")
     
-    recommendation = stock_service.get_stock_recommendation(db, stock.id)
+    recommendation = await run_analytics(stock_service.get_stock_recommendation, db, stock.id)
     if not recommendation:
-        # Generate new recommendation if none exists
-        recommendation = stock_service.generate_stock_recommendation(db, stock)
+        # Generate inline only if the scheduled refresh has not produced a fresh
+        # one; concurrent requests for the symbol share a single generation
+        key = ("stock_recommendation", stock.symbol, date.today(), settings.RECOMMENDATION_MODEL_VERSION)
+        recommendation = await singleflight.group.do_async(key, stock_service.generate_stock_recommendation, db, stock)
     
     return recommendation
 
 @router.get("/portfolio-recommendation")
 async def get_portfolio_recommendation(
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
     db: Session = Depends(get_db)
 ):
     """Get AI-powered portfolio recommendations"""
@@ -78,4 +93,65 @@ async def get_portfolio_recommendation(
             detail="Premium subscription required for portfolio recommendations"
         )
     
-    return stock_service.generate_portfolio_recommendation(db, current_user.id) 
\ No newline at end of file
+    # The recommendation depends only on the stock universe, so every user
+    # asking while one is being computed shares it
+    key = ("portfolio_recommendation", holdings_cache.stock_table_version.value, date.today())
+    return await singleflight.group.do_async(key, stock_service.generate_portfolio_recommendation, db, current_user.id) 
+
+_PERIOD_PATTERN = "^(" + "|".join(market_data.PERIOD_DAYS) + ")$"
+
+@router.get("/backtest")
+async def backtest_recommendation_rule(
+    period: str = Query("5y", pattern=_PERIOD_PATTERN),
+    fast: int = Query(backtest.RuleParams.fast, ge=2),
+    slow: int = Query(backtest.RuleParams.slow, ge=3),
+    rsi_period: int = Query(backtest.RuleParams.rsi_period, ge=2),
+    overbought: float = Query(backtest.RuleParams.overbought, gt=0, lt=100),
+    oversold: float = Query(backtest.RuleParams.oversold, gt=0, lt=100),
+    horizon: int = Query(20, ge=1, le=252, description="Bars after a signal used to score its hit rate"),
+    cost_bps: float = Query(0.0, ge=0),
+    short: bool = False,
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Backtest the buy/hold/sell rule over every QTOP stock"""
+    if current_user.role == "free":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Premium subscription required for backtests"
+        )
+    if fast >= slow or oversold >= overbought:
+        raise HTTPException(status_code=422, detail="Need fast < slow and oversold < overbought")
+    
+    params = backtest.RuleParams(fast, slow, rsi_period, overbought, oversold)
+    return await run_analytics(stock_service.backtest_recommendations, db, period, params, horizon, cost_bps, short)
+
+@router.get("/backtest/sweep")
+async def sweep_recommendation_rule(
+    period: str = Query("5y", pattern=_PERIOD_PATTERN),
+    fast: List[int] = Query([10, 20, 50]),
+    slow: List[int] = Query([50, 100, 200]),
+    rsi_period: List[int] = Query([backtest.RuleParams.rsi_period]),
+    overbought: List[float] = Query([70, 80]),
+    oversold: List[float] = Query([20, 30]),
+    horizon: int = Query(20, ge=1, le=252),
+    cost_bps: float = Query(0.0, ge=0),
+    short: bool = False,
+    current_user: auth_service.Principal = Depends(auth_service.get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Backtest a grid of rule parameters over every QTOP stock, best Sharpe ratio first"""
+    if current_user.role == "free":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Premium subscription required for backtests"
+        )
+    if min(fast + slow + rsi_period) < 2:
+        raise HTTPException(status_code=422, detail="Windows must be at least 2 bars")
+    grid = backtest.parameter_grid(fast, slow, rsi_period, overbought, oversold)
+    if not grid:
+        raise HTTPException(status_code=422, detail="No parameter set has fast < slow and oversold < overbought")
+    if len(grid) > settings.BACKTEST_MAX_GRID:
+        raise HTTPException(status_code=422, detail=f"Grid has {len(grid)} parameter sets; at most {settings.BACKTEST_MAX_GRID} allowed")
+    
+    return await run_analytics(stock_service.sweep_recommendation_rule, db, grid, period, horizon, cost_bps, short)
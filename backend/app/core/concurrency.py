@@ -0,0 +1,15 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from app.core.config import settings
+
+# Dedicated pool for pandas/NumPy analytics so they never run on the event loop
+# and cannot starve FastAPI's shared threadpool used by sync handlers
+analytics_executor = ThreadPoolExecutor(max_workers=settings.ANALYTICS_WORKERS, thread_name_prefix="analytics")
+
+async def run_analytics(fn, *args, **kwargs):
+    """Run a blocking analytics call on the analytics pool and await its result"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(analytics_executor, functools.partial(context.run, fn, *args, **kwargs))
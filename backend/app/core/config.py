@@ -12,11 +12,22 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./qtop_analyzer.db")
+    SQL_DEBUG_HEADERS: bool = False  # Add X-DB-Query-Count / X-DB-Time-Ms / X-DB-N-Plus-One to responses
+    SQL_N_PLUS_ONE_THRESHOLD: int = 5  # Executions of one statement per request that count as N+1
     
     # Security
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-here")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    BCRYPT_ROUNDS: int = 12  # Existing hashes are upgraded on the next login after a change
+    PASSWORD_HASH_WORKERS: int = 2  # Processes running bcrypt
+    PASSWORD_HASH_MAX_PENDING: int = 32  # Logins queued beyond this get a 503
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 60.0  # Upper bound on how long other workers see a stale role
+    
+    # Pagination
+    DEFAULT_PAGE_SIZE: int = 50
+    MAX_PAGE_SIZE: int = 500
     
     # Email
     SMTP_TLS: bool = True
@@ -30,6 +41,55 @@ class Settings(BaseSettings):
     # QTOP ETF Settings
     QTOP_SYMBOL: str = "QTOP"
     MAX_FREE_STOCK_VIEWS: int = 3
+    VIEW_FLUSH_INTERVAL_SECONDS: float = 1.0  # How often buffered stock views are written to stock_views
+    VIEW_FLUSH_BATCH_SIZE: int = 500  # Flush early once this many views are buffered
+    HOLDINGS_CACHE_TTL_SECONDS: float = 300.0  # Bounds staleness from stock writes made by other processes
+    CONSTITUENT_SOURCE: str = os.getenv("CONSTITUENT_SOURCE", "yfinance")  # Fundamentals from "yfinance" or "fixture"
+    CONSTITUENT_FIXTURE_PATH: str = os.getenv("CONSTITUENT_FIXTURE_PATH", "./fixtures/qtop_constituents.json")  # The constituent list, for either source
+
+    # Market data
+    MARKET_DATA_PROVIDER: str = os.getenv("MARKET_DATA_PROVIDER", "yfinance")  # "yfinance" or "fixture"
+    MARKET_DATA_DIR: str = os.getenv("MARKET_DATA_DIR", "./market_data")
+    MARKET_DATA_FIXTURE_DIR: str = os.getenv("MARKET_DATA_FIXTURE_DIR", "./fixtures/market_data")
+    MARKET_DATA_MAX_WORKERS: int = 8
+    MARKET_DATA_TIMEOUT_SECONDS: float = 10.0
+    MARKET_DATA_RETRIES: int = 2
+    MARKET_DATA_RETRY_BACKOFF_SECONDS: float = 0.5
+    MARKET_DATA_INTRADAY_REFRESH_SECONDS: float = 300.0  # How long a stored bar for an unfinished session is served before refetching it
+    MARKET_DATA_RATE_LIMIT_PER_SECOND: float = 5.0  # Budget for all calls to the remote provider from this process
+    MARKET_DATA_RATE_LIMIT_BURST: int = 10
+    MARKET_DATA_BREAKER_FAILURES: int = 5  # Consecutive upstream failures that open the circuit
+    MARKET_DATA_BREAKER_RESET_SECONDS: float = 30.0  # How long the circuit stays open before a trial call
+    QUOTE_POLL_SECONDS: float = 15.0  # Upstream poll interval per streamed symbol
+    QUOTE_STREAM_HEARTBEAT_SECONDS: float = 15.0
+
+    # Portfolio optimizer
+    OPTIMIZER_MAX_WEIGHT: Optional[float] = None  # Cap on any single position, e.g. 0.1
+    OPTIMIZER_SECTOR_CAP: Optional[float] = None  # Cap on the total weight of one sector
+
+    # Recommendations
+    RECOMMENDATION_MODEL_VERSION: str = "technical-v1"
+    RECOMMENDATION_TTL_HOURS: int = 36  # Older rows are regenerated inline on request
+    SCHEDULER_ENABLED: bool = False  # Run the daily precomputation jobs inside the API process
+    SCHEDULER_RUN_AT: str = "22:00"  # UTC, after the US market close
+
+    # Concurrency
+    ANALYTICS_WORKERS: int = 4
+
+    # Analytics caches
+    COVARIANCE_CACHE_SIZE: int = 32
+    BENCHMARK_REFRESH_SECONDS: float = 3600.0  # Benchmark index/ETF returns are refetched after this
+
+    # Monte Carlo risk
+    RISK_DEFAULT_PATHS: int = 100_000
+    RISK_MAX_PATHS: int = 1_000_000
+    RISK_MAX_HORIZON_DAYS: int = 252
+    RISK_SIMULATION_CHUNK_ELEMENTS: int = 2_000_000  # Paths x assets per chunk, about 16 MB per array
+    RISK_SIMULATION_WORKERS: int = 0  # Processes to spread chunks over; 0 simulates in the calling thread
+
+    # Backtesting
+    BACKTEST_WORKERS: int = 0  # Processes for parameter sweeps; 0 uses one per CPU
+    BACKTEST_MAX_GRID: int = 500  # Largest parameter grid a sweep request may ask for
     
     class Config:
         case_sensitive = True
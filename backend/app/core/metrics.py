@@ -0,0 +1,12 @@
+from typing import Callable, Dict
+
+# Named callables returning a dict of counters, collected on demand
+_providers: Dict[str, Callable[[], dict]] = {}
+
+def register(name: str, provider: Callable[[], dict]):
+    """Expose a component's counters under `name` in the metrics snapshot"""
+    _providers[name] = provider
+
+def snapshot() -> Dict[str, dict]:
+    """Current counters of every registered component"""
+    return {name: provider() for name, provider in _providers.items()}
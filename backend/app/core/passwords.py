@@ -0,0 +1,81 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Tuple
+from passlib.context import CryptContext
+from app.core import metrics
+from app.core.config import settings
+
+# Hashes made with a different cost than BCRYPT_ROUNDS report needs_update,
+# so they are replaced on the next successful login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Check a password; on success also return a new hash if the stored one uses outdated settings"""
+    return pwd_context.verify_and_update(password, hashed_password)
+
+class HasherSaturated(Exception):
+    """Raised when more hashing jobs are queued than the pool is allowed to hold"""
+
+class PasswordHasher:
+    """Runs bcrypt in a bounded process pool so logins never burn CPU on the event loop
+
+    At most `workers + max_pending` jobs are admitted at once; beyond that
+    submissions fail fast with HasherSaturated instead of queueing without
+    bound. The pool is started on first use.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.capacity = workers + max_pending
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _submit(self, fn, *args) -> Future:
+        with self._lock:
+            if self.in_flight >= self.capacity:
+                self.rejected += 1
+                raise HasherSaturated(f"{self.in_flight} password jobs already queued")
+            if self._pool is None:
+                # spawn keeps the workers free of the API's threads and open connections
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            self.in_flight += 1
+        future = self._pool.submit(fn, *args)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future: Future):
+        with self._lock:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await asyncio.wrap_future(self._submit(hash_password, password))
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await asyncio.wrap_future(self._submit(verify_and_update, password, hashed_password))
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING)
+metrics.register("password_hasher", hasher.stats)
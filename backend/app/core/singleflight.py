@@ -0,0 +1,73 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Dict, Hashable
+from app.core import metrics
+from app.core.concurrency import run_analytics
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one execution
+
+    The first caller for a key (the leader) runs the function; callers that
+    arrive while it is still running wait on the same Future and get its
+    result or exception. Nothing is cached once the call finishes, so the
+    next caller after that starts a new one. Only covers this process; the
+    stores behind each call must tolerate the same work arriving from other
+    workers.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+
+    def _join(self, key: Hashable):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.followers += 1
+                return future, False
+            future = self._calls[key] = Future()
+            # A running Future cannot be cancelled, so a follower that gives
+            # up (client disconnect, timeout) leaves it intact for the others
+            future.set_running_or_notify_cancel()
+            self.leaders += 1
+            return future, True
+
+    def _finish(self, key: Hashable, future: Future, fn, *args, **kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def do(self, key: Hashable, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) unless a call for key is in flight, then wait for that one"""
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        return self._finish(key, future, fn, *args, **kwargs)
+
+    async def do_async(self, key: Hashable, fn, *args, **kwargs):
+        """Like do, but the leader runs fn on the analytics pool and followers wait without a thread"""
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        return await run_analytics(self._finish, key, future, fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+group = SingleFlight()
+metrics.register("singleflight", group.stats)
@@ -0,0 +1,139 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_IN_LIST = re.compile(r"IN \((?:[^()]*?)\)", re.IGNORECASE)
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+def fingerprint(statement: str) -> str:
+    """Statement text with literals and IN lists collapsed, so repeats of one query compare equal"""
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    statement = _STRING.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    return _IN_LIST.sub("IN (...)", statement)
+
+class QueryStats:
+    """Statements executed while handling one request"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints: Counter = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.fingerprints[fingerprint(statement)] += 1
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Fingerprints run at least `threshold` times, the usual sign of a lazy load per row (N+1)"""
+        return {sql: n for sql, n in self.fingerprints.items() if n >= threshold}
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+
+class RouteAggregates:
+    """Query totals per route template across all requests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, dict] = {}
+        self._reported = set()
+        self.untracked_queries = 0
+
+    def add(self, route: str, stats: QueryStats, suspects: Dict[str, int]):
+        with self._lock:
+            totals = self._routes.setdefault(route, {
+                "requests": 0, "queries": 0, "db_time_ms": 0.0, "max_queries": 0, "n_plus_one_requests": 0,
+            })
+            totals["requests"] += 1
+            totals["queries"] += stats.count
+            totals["db_time_ms"] += stats.duration * 1000
+            totals["max_queries"] = max(totals["max_queries"], stats.count)
+            if suspects:
+                totals["n_plus_one_requests"] += 1
+            new = [(route, sql) for sql in suspects if (route, sql) not in self._reported]
+            self._reported.update(new)
+        for _, sql in new:
+            logger.warning("Possible N+1 on %s: %d executions of %s", route, suspects[sql], sql)
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = {
+                route: {**totals, "avg_queries": totals["queries"] / totals["requests"]}
+                for route, totals in self._routes.items()
+            }
+        return {"routes": routes, "untracked_queries": self.untracked_queries}
+
+aggregates = RouteAggregates()
+metrics.register("sql", aggregates.stats)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is None:
+        # Background jobs and startup work outside any request
+        aggregates.untracked_queries += 1
+        return
+    stats.record(statement, duration)
+
+def instrument(engine: Engine):
+    """Record every statement run through engine (pass async engines' .sync_engine)"""
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+class QueryStatsMiddleware:
+    """ASGI middleware collecting QueryStats per HTTP request
+
+    Totals are aggregated per route template for /metrics. With
+    SQL_DEBUG_HEADERS enabled they are also returned as X-DB-* headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and settings.SQL_DEBUG_HEADERS:
+                suspects = stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD)
+                headers = list(message.get("headers", []))
+                headers.append((b"x-db-query-count", str(stats.count).encode()))
+                headers.append((b"x-db-time-ms", f"{stats.duration * 1000:.2f}".encode()))
+                if suspects:
+                    headers.append((b"x-db-n-plus-one", str(max(suspects.values())).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            aggregates.add(
+                getattr(route, "path", "unmatched"),
+                stats,
+                stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD),
+            )
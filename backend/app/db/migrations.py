@@ -0,0 +1,76 @@
+"""Idempotent schema upgrades for databases created from older models
+
+Safe to run repeatedly; every step checks or uses IF NOT EXISTS. Run from
+the backend directory:
+
+    python -m app.db.migrations
+"""
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from app.db.base_class import Base
+from app.db.session import engine
+from app.models import models  # noqa: F401  registers the tables on Base.metadata
+
+logger = logging.getLogger(__name__)
+
+# Columns added to existing tables, as (table, column, SQL type)
+COLUMNS = [
+    ("stock_recommendations", "as_of", "DATE"),
+    ("stock_recommendations", "model_version", "VARCHAR"),
+]
+
+# Indexes behind the hot lookups, as (name, table, columns)
+INDEXES = [
+    ("ix_stock_views_user_id", "stock_views", ["user_id"]),
+    ("ix_portfolios_user_id_id", "portfolios", ["user_id", "id"]),
+    ("ix_portfolio_holdings_portfolio_id_id", "portfolio_holdings", ["portfolio_id", "id"]),
+    ("ix_stock_recommendations_stock_id_created_at", "stock_recommendations", ["stock_id", "created_at"]),
+]
+
+# Indexes made redundant by a composite index with the same leading columns
+DROPPED_INDEXES = [
+    "ix_portfolios_user_id",
+    "ix_portfolio_holdings_portfolio_id",
+    "ix_stock_recommendations_stock_id_as_of",
+]
+
+# Unique indexes, as (name, table, columns); older duplicates are dropped first,
+# keeping the newest row of each group
+UNIQUE_INDEXES = [
+    ("uq_stock_recommendations_stock_id_as_of_model_version", "stock_recommendations", ["stock_id", "as_of", "model_version"]),
+]
+
+def upgrade(bind: Engine = engine):
+    # New tables, with their indexes; existing tables are left alone
+    Base.metadata.create_all(bind)
+
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table, column, sql_type in COLUMNS:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                logger.info("Adding column %s.%s", table, column)
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sql_type}"))
+        for name, table, columns in INDEXES:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"))
+        for name in DROPPED_INDEXES:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        existing_indexes = {table: {index["name"] for index in inspector.get_indexes(table)} for _, table, _ in UNIQUE_INDEXES}
+        for name, table, columns in UNIQUE_INDEXES:
+            if name in existing_indexes[table]:
+                continue
+            keys = ", ".join(columns)
+            # Rows with a NULL key never collide, so they are left alone
+            not_null = " AND ".join(f"{column} IS NOT NULL" for column in columns)
+            removed = conn.execute(text(
+                f"DELETE FROM {table} WHERE {not_null} AND id NOT IN "
+                f"(SELECT MAX(id) FROM {table} WHERE {not_null} GROUP BY {keys})"
+            )).rowcount
+            if removed:
+                logger.info("Removed %d duplicate rows from %s", removed, table)
+            conn.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({keys})"))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    upgrade()
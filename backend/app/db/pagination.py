@@ -0,0 +1,38 @@
+import base64
+import binascii
+import json
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"id": last_id}).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if not cursor:
+        return None
+    try:
+        last_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))["id"]
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    if not isinstance(last_id, int):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    return last_id
+
+def keyset_page(query: Query, key, limit: int, cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    """One page of query ordered by the unique column key, starting after cursor
+
+    Seeks with `key > last` instead of OFFSET, so every page costs the same
+    no matter how deep it is. Returns the rows and the cursor for the next
+    page (None on the last one).
+    """
+    last_id = decode_cursor(cursor)
+    if last_id is not None:
+        query = query.filter(key > last_id)
+    rows = query.order_by(key).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].id)
@@ -0,0 +1,21 @@
+from typing import List
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+def upsert_statement(db: Session, model, conflict_columns: List[str], update_columns: List[str]):
+    """INSERT that updates update_columns of the existing row when conflict_columns collide
+
+    Execute it with a list of row dicts to upsert many rows at once. The
+    conflict columns must be covered by a unique index or constraint.
+    """
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(model)
+        return stmt.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_={column: stmt.excluded[column] for column in update_columns},
+        )
+    if dialect in ("mysql", "mariadb"):
+        stmt = mysql.insert(model)
+        return stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in update_columns})
+    raise NotImplementedError(f"Upsert is not supported on {dialect}")
@@ -1,8 +1,12 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
+from app.core import metrics
+from app.core.config import settings
+from app.db.instrumentation import QueryStatsMiddleware
 
 app = FastAPI(
     title="QTOP ETF Analyzer",
@@ -17,21 +21,76 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Per-request query counts for /metrics and, in debug, response headers
+app.add_middleware(QueryStatsMiddleware)
+
+# Mount static files when the frontend build is present
+if Path("static").is_dir():
+    app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Templates
 templates = Jinja2Templates(directory="templates")
 
 # Import and include routers
 from app.api import auth, stocks, portfolio
+from app.services.scheduler import scheduler
+from app.services.view_quota import recorder
+from app.core.passwords import hasher
+from app.services.risk_engine import engine as risk_engine
+from app.services import backtest, upstream
 
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(stocks.router, prefix="/api/stocks", tags=["Stocks"])
 app.include_router(portfolio.router, prefix="/api/portfolio", tags=["Portfolio"])
 
+@app.exception_handler(upstream.UpstreamUnavailable)
+async def upstream_unavailable(request: Request, exc: upstream.UpstreamUnavailable):
+    # Reached only when no stored data could stand in for the failed fetch
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Market data provider unavailable, try again later"},
+        headers={"Retry-After": str(int(settings.MARKET_DATA_BREAKER_RESET_SECONDS))},
+    )
+
+@app.on_event("startup")
+async def start_view_recorder():
+    recorder.start()
+
+@app.on_event("shutdown")
+async def stop_view_recorder():
+    # Write out any views still buffered
+    recorder.stop()
+
+@app.on_event("shutdown")
+async def stop_password_hasher():
+    hasher.shutdown()
+
+@app.on_event("shutdown")
+async def stop_risk_engine():
+    risk_engine.shutdown()
+
+@app.on_event("shutdown")
+async def stop_backtest_pool():
+    backtest.shutdown()
+
+@app.on_event("startup")
+async def start_scheduler():
+    if settings.SCHEDULER_ENABLED:
+        scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    if settings.SCHEDULER_ENABLED:
+        scheduler.stop()
+
 @app.get("/")
 async def root():
-    return {"message": "Welcome to QTOP ETF Analyzer API"} 
\ No newline at end of file
+    return {"message": "Welcome to QTOP ETF Analyzer API"}
+
+@app.get("/metrics")
+async def get_metrics():
+    """Counters of the in-process caches"""
+    return metrics.snapshot() 
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Float, DateTime, Enum
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, Float, Date, DateTime, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base_class import Base
@@ -44,7 +44,7 @@ class StockView(Base):
     __tablename__ = "stock_views"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     stock_id = Column(Integer, ForeignKey("stocks.id"))
     viewed_at = Column(DateTime(timezone=True), server_default=func.now())
 
@@ -52,6 +52,13 @@ class StockView(Base):
     user = relationship("User", back_populates="stock_views")
     stock = relationship("Stock", back_populates="views")
 
+class StockViewQuota(Base):
+    __tablename__ = "stock_view_quotas"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    view_count = Column(Integer, nullable=False, default=0)  # Authoritative count for the free tier limit
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class StockRecommendation(Base):
     __tablename__ = "stock_recommendations"
 
@@ -60,14 +67,26 @@ class StockRecommendation(Base):
     recommendation_type = Column(String)  # e.g., "buy", "hold", "sell"
     confidence_score = Column(Float)
     analysis_summary = Column(String)
+    as_of = Column(Date)  # Trading day of the last bar the recommendation was built from
+    model_version = Column(String)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Relationships
     stock = relationship("Stock", back_populates="recommendations")
 
+    __table_args__ = (
+        Index("ix_stock_recommendations_stock_id_created_at", "stock_id", "created_at"),
+        # One row per stock, trading day and model; concurrent generators upsert
+        # into it, and it also serves (stock_id, as_of) lookups
+        Index("uq_stock_recommendations_stock_id_as_of_model_version", "stock_id", "as_of", "model_version", unique=True),
+    )
+
 class Portfolio(Base):
     __tablename__ = "portfolios"
+    __table_args__ = (
+        Index("ix_portfolios_user_id_id", "user_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -82,6 +101,9 @@ class Portfolio(Base):
 
 class PortfolioHolding(Base):
     __tablename__ = "portfolio_holdings"
+    __table_args__ = (
+        Index("ix_portfolio_holdings_portfolio_id_id", "portfolio_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     portfolio_id = Column(Integer, ForeignKey("portfolios.id"))
@@ -93,4 +115,19 @@ class PortfolioHolding(Base):
 
     # Relationships
     portfolio = relationship("Portfolio", back_populates="holdings")
-    stock = relationship("Stock") 
\ No newline at end of file
+    stock = relationship("Stock") 
+
+class PortfolioValuation(Base):
+    __tablename__ = "portfolio_valuations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    portfolio_id = Column(Integer, ForeignKey("portfolios.id"), nullable=False)
+    date = Column(Date, nullable=False)  # Trading day whose close prices the value uses
+    market_value = Column(Float)
+    cost_basis = Column(Float)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # Also the index behind history range queries
+        UniqueConstraint("portfolio_id", "date", name="uq_portfolio_valuations_portfolio_id_date"),
+    )
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
-from datetime import datetime
+from datetime import date, datetime
+from app.schemas.stock import StockResponse
 
 class PortfolioBase(BaseModel):
     name: str
@@ -19,6 +20,15 @@ class PortfolioResponse(PortfolioBase):
     class Config:
         from_attributes = True
 
+class PortfolioSummary(PortfolioBase):
+    id: int
+    user_id: int
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
 class PortfolioHoldingBase(BaseModel):
     stock_id: int
     quantity: float
@@ -27,12 +37,32 @@ class PortfolioHoldingBase(BaseModel):
 class PortfolioHoldingCreate(PortfolioHoldingBase):
     pass
 
+class PortfolioHoldingImport(BaseModel):
+    symbol: str = Field(min_length=1)
+    quantity: float = Field(gt=0)
+    average_price: float = Field(ge=0)
+
+class PortfolioImportResult(BaseModel):
+    portfolio_id: int
+    imported: int
+
 class PortfolioHoldingResponse(PortfolioHoldingBase):
     id: int
     portfolio_id: int
     created_at: datetime
     updated_at: Optional[datetime] = None
-    stock: 'StockResponse'
+    stock: StockResponse
+
+    class Config:
+        from_attributes = True
+
+PortfolioResponse.model_rebuild()
+
+class PortfolioValuationResponse(BaseModel):
+    date: date
+    market_value: float
+    cost_basis: float
+    unrealized_pnl: float
 
     class Config:
         from_attributes = True
@@ -1,13 +1,13 @@
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
 class StockBase(BaseModel):
     symbol: str
     name: str
     sector: str
     industry: str
-    market_cap: float
+    market_cap: Optional[float] = None  # Unknown until the fundamentals source reports it
 
 class StockCreate(StockBase):
     pass
@@ -31,6 +31,8 @@ class StockRecommendationCreate(StockRecommendationBase):
 class StockRecommendationResponse(StockRecommendationBase):
     id: int
     stock_id: int
+    as_of: Optional[date] = None
+    model_version: Optional[str] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -1,51 +1,143 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from app.core import metrics, passwords
 from app.core.config import settings
-from app.db.session import get_db
-from app.models.models import User
+from app.db.session import get_async_db
+from app.models.models import User, UserRole
 from app.schemas.user import UserCreate, TokenData
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+@dataclass(frozen=True)
+class Principal:
+    """The fields of an authenticated user that authorization checks need"""
+    id: int
+    email: str
+    role: UserRole
+    is_active: bool
 
-def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(id=user.id, email=user.email, role=user.role, is_active=user.is_active)
 
-def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
+class PrincipalCache:
+    """Bounded LRU of resolved principals keyed by token subject, each entry valid for `ttl` seconds
 
-def create_user(db: Session, user: UserCreate) -> User:
-    hashed_password = get_password_hash(user.password)
+    Invalidation only reaches this process; other workers pick up a role
+    change once their entry expires.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, Principal]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation so a lookup that raced with one is not cached
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, subject: str) -> Optional[Principal]:
+        with self._lock:
+            entry = self._entries.get(subject)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[subject]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(subject)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, subject: str, principal: Principal, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[subject] = (time.monotonic() + self.ttl, principal)
+            self._entries.move_to_end(subject)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str):
+        with self._lock:
+            self._entries.pop(subject, None)
+            self.generation += 1
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+principal_cache = PrincipalCache(settings.PRINCIPAL_CACHE_SIZE, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+metrics.register("principal_cache", principal_cache.stats)
+
+def _hasher_overloaded() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many logins in progress. Please retry shortly.",
+        headers={"Retry-After": "1"},
+    )
+
+def get_user(db: Session, user_id: int) -> Optional[User]:
+    return db.query(User).filter(User.id == user_id).first()
+
+async def fetch_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
+    result = await db.execute(select(User).filter(User.email == email))
+    return result.scalars().first()
+
+async def register_user(db: AsyncSession, user: UserCreate) -> User:
+    """Create a user, hashing the password on the password pool"""
+    try:
+        hashed_password = await passwords.hasher.hash(user.password)
+    except passwords.HasherSaturated:
+        raise _hasher_overloaded()
     db_user = User(
         email=user.email,
         full_name=user.full_name,
         hashed_password=hashed_password
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
-def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
-    user = get_user_by_email(db, email)
+async def authenticate(db: AsyncSession, email: str, password: str) -> Optional[User]:
+    """The user if the password matches; rehashes the password if the bcrypt cost has changed"""
+    user = await fetch_user_by_email(db, email)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    try:
+        valid, new_hash = await passwords.hasher.verify_and_update(password, user.hashed_password)
+    except passwords.HasherSaturated:
+        raise _hasher_overloaded()
+    if not valid:
         return None
+    if new_hash is not None:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
-    db: Session = Depends(get_db)
-) -> User:
+    db: AsyncSession = Depends(get_async_db)
+) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -60,17 +152,25 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = get_user_by_email(db, email=token_data.email)
+    principal = principal_cache.get(token_data.email)
+    if principal is not None:
+        return principal
+    
+    generation = principal_cache.generation
+    user = await fetch_user_by_email(db, email=token_data.email)
     if user is None:
         raise credentials_exception
-    return user
+    principal = Principal.from_user(user)
+    principal_cache.put(token_data.email, principal, generation)
+    return principal
 
 def upgrade_to_premium(db: Session, user_id: int) -> User:
-    user = db.query(User).filter(User.id == user_id).first()
+    user = get_user(db, user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     user.role = "premium"
     db.commit()
     db.refresh(user)
-    return user 
\ No newline at end of file
+    principal_cache.invalidate(user.email)
+    return user
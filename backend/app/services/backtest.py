@@ -0,0 +1,234 @@
+"""Vectorized backtest of the SMA/RSI recommendation rule
+
+Every symbol is replayed at once on a dates x symbols close array: the
+indicators, the rule's daily BUY/HOLD/SELL codes, the positions they imply
+and the resulting P&L are all whole-array operations. A BUY goes long at the
+close, a SELL exits (or goes short with ``short=True``) and a HOLD keeps the
+previous position, so positions are the signal codes forward-filled.
+"""
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from app.core.config import settings
+from app.services import indicators
+
+TRADING_DAYS = 252
+
+@dataclass(frozen=True)
+class RuleParams:
+    fast: int = indicators.SMA_WINDOWS[0]
+    slow: int = indicators.SMA_WINDOWS[1]
+    rsi_period: int = indicators.RSI_PERIOD
+    overbought: float = indicators.RSI_OVERBOUGHT
+    oversold: float = indicators.RSI_OVERSOLD
+
+def _shift(values: np.ndarray, fill: float = 0.0) -> np.ndarray:
+    shifted = np.full(values.shape, fill, dtype=np.float64)
+    shifted[1:] = values[:-1]
+    return shifted
+
+def positions(codes: np.ndarray, short: bool = False) -> np.ndarray:
+    """Position held after each close: the last BUY/SELL code carried through HOLDs, flat before the first"""
+    target = np.where(codes == indicators.BUY, 1.0, np.where(codes == indicators.SELL, -1.0 if short else 0.0, np.nan))
+    return np.nan_to_num(indicators.fill_gaps(target))
+
+def performance(daily: np.ndarray, valid: np.ndarray) -> Dict[str, np.ndarray]:
+    """Return, risk and drawdown of each column of daily strategy returns, counting only valid rows"""
+    daily = np.where(valid, daily, 0.0)
+    days = valid.sum(axis=0)
+    equity = np.cumprod(1 + daily, axis=0)
+    total_return = equity[-1] - 1 if len(equity) else np.zeros(daily.shape[1])
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1 if len(equity) else np.zeros_like(daily)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = daily.sum(axis=0) / days
+        variance = (np.where(valid, daily - mean, 0.0) ** 2).sum(axis=0) / (days - 1)
+        volatility = np.sqrt(variance * TRADING_DAYS)
+        return {
+            "total_return": total_return,
+            "annualized_return": np.power(1 + total_return, TRADING_DAYS / days) - 1,
+            "volatility": volatility,
+            "sharpe_ratio": mean * TRADING_DAYS / volatility,
+            "max_drawdown": drawdown.min(axis=0) if len(drawdown) else np.zeros(daily.shape[1]),
+            "days": days,
+        }
+
+def hit_rates(codes: np.ndarray, closes: np.ndarray, horizon: int) -> Dict[str, np.ndarray]:
+    """How often the price moved the way each BUY/SELL call said over the next `horizon` bars"""
+    forward = np.full(closes.shape, np.nan)
+    if closes.shape[0] > horizon:
+        forward[:-horizon] = closes[horizon:] / closes[:-horizon] - 1
+    known = ~np.isnan(forward)
+    buys = (codes == indicators.BUY) & known
+    sells = (codes == indicators.SELL) & known
+    with np.errstate(invalid="ignore"):
+        buy_hits = (buys & (forward > 0)).sum(axis=0)
+        sell_hits = (sells & (forward < 0)).sum(axis=0)
+    return {
+        "buy_signals": buys.sum(axis=0),
+        "buy_hits": buy_hits,
+        "sell_signals": sells.sum(axis=0),
+        "sell_hits": sell_hits,
+    }
+
+def _rates(counts: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {
+            "buy_signals": counts["buy_signals"],
+            "buy_hit_rate": counts["buy_hits"] / counts["buy_signals"],
+            "sell_signals": counts["sell_signals"],
+            "sell_hit_rate": counts["sell_hits"] / counts["sell_signals"],
+        }
+
+def simulate(
+    closes: np.ndarray,
+    params: RuleParams = RuleParams(),
+    horizon: int = 20,
+    cost_bps: float = 0.0,
+    short: bool = False,
+    sma: Optional[Dict[int, np.ndarray]] = None,
+    rsi: Optional[Dict[int, np.ndarray]] = None,
+) -> Dict[str, dict]:
+    """Backtest the rule on a gap-filled dates x symbols close array
+
+    Returns per-symbol metric arrays under "symbols" and the equal-weighted
+    universe under "universe". sma and rsi are optional caches of indicator
+    arrays keyed by window, shared across calls in a parameter sweep.
+    """
+    sma = {} if sma is None else sma
+    rsi = {} if rsi is None else rsi
+    for window in (params.fast, params.slow):
+        if window not in sma:
+            sma[window] = indicators.rolling_mean(closes, window)
+    if params.rsi_period not in rsi:
+        rsi[params.rsi_period] = indicators.rsi_panel(closes, params.rsi_period)
+
+    codes = indicators.signal_codes(
+        closes, sma[params.fast], sma[params.slow], rsi[params.rsi_period], params.overbought, params.oversold
+    )
+    position = positions(codes, short)
+    asset_returns = indicators.returns_panel(closes)
+    valid = ~np.isnan(asset_returns)
+
+    # The position taken at a close earns the next bar's return; trades pay cost_bps of turnover
+    held = _shift(position)
+    turnover = np.abs(position - held)
+    daily = held * np.nan_to_num(asset_returns) - turnover * cost_bps / 10_000
+
+    symbols = performance(daily, valid)
+    symbols["exposure"] = np.where(valid, np.abs(held), 0.0).sum(axis=0) / np.maximum(valid.sum(axis=0), 1)
+    symbols["trades"] = (turnover > 0).sum(axis=0)
+    symbols["buy_and_hold_return"] = np.prod(1 + np.nan_to_num(asset_returns), axis=0) - 1
+    counts = hit_rates(codes, closes, horizon)
+    symbols.update(_rates(counts))
+
+    # Equal weight across the symbols trading on each day
+    any_valid = valid.any(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        universe_daily = np.where(valid, daily, 0.0).sum(axis=1) / valid.sum(axis=1)
+        universe_benchmark = np.where(valid, asset_returns, 0.0).sum(axis=1) / valid.sum(axis=1)
+    universe = performance(universe_daily[:, None], any_valid[:, None])
+    universe["buy_and_hold_return"] = np.prod(1 + np.nan_to_num(universe_benchmark))[None] - 1
+    universe.update(_rates({name: total.sum(keepdims=True) for name, total in counts.items()}))
+    return {"symbols": symbols, "universe": universe}
+
+def _clean(value) -> Optional[float]:
+    value = float(value)
+    return None if np.isnan(value) or np.isinf(value) else value
+
+def metrics_by_column(metrics: Dict[str, np.ndarray], columns: List[str]) -> Dict[str, dict]:
+    return {
+        column: {name: _clean(values[i]) for name, values in metrics.items()}
+        for i, column in enumerate(columns)
+    }
+
+def run(
+    closes: pd.DataFrame,
+    params: RuleParams = RuleParams(),
+    horizon: int = 20,
+    cost_bps: float = 0.0,
+    short: bool = False,
+) -> dict:
+    """Backtest the rule on a dates x symbols close panel; symbols without prices are skipped"""
+    closes = closes.loc[:, closes.notna().any()]
+    result = simulate(indicators.fill_gaps(closes.to_numpy(dtype=np.float64)), params, horizon, cost_bps, short)
+    return {
+        "params": asdict(params),
+        "horizon_days": horizon,
+        "start": closes.index[0].date().isoformat() if len(closes) else None,
+        "end": closes.index[-1].date().isoformat() if len(closes) else None,
+        "universe": metrics_by_column(result["universe"], ["universe"])["universe"],
+        "symbols": metrics_by_column(result["symbols"], list(closes.columns)),
+    }
+
+def _sweep_group(closes: np.ndarray, grid: List[RuleParams], horizon: int, cost_bps: float, short: bool) -> list:
+    """Universe metrics for parameter sets sharing indicator windows, reusing the indicator arrays"""
+    sma, rsi = {}, {}
+    results = []
+    for params in grid:
+        universe = simulate(closes, params, horizon, cost_bps, short, sma, rsi)["universe"]
+        results.append({"params": asdict(params), **metrics_by_column(universe, ["universe"])["universe"]})
+    return results
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = settings.BACKTEST_WORKERS or os.cpu_count() or 1
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def parameter_grid(
+    fast: List[int],
+    slow: List[int],
+    rsi_period: List[int],
+    overbought: List[float],
+    oversold: List[float],
+) -> List[RuleParams]:
+    """Every combination with fast < slow and oversold < overbought"""
+    axes = [sorted(set(values)) for values in (fast, slow, rsi_period, overbought, oversold)]
+    return [
+        RuleParams(*combination)
+        for combination in itertools.product(*axes)
+        if combination[0] < combination[1] and combination[4] < combination[3]
+    ]
+
+def sweep(
+    closes: pd.DataFrame,
+    grid: List[RuleParams],
+    horizon: int = 20,
+    cost_bps: float = 0.0,
+    short: bool = False,
+) -> List[dict]:
+    """Universe metrics of every parameter set, best Sharpe ratio first
+
+    Parameter sets are grouped by SMA windows so each group computes its
+    indicators once; groups run in parallel on a process pool.
+    """
+    values = indicators.fill_gaps(closes.loc[:, closes.notna().any()].to_numpy(dtype=np.float64))
+    groups: Dict[tuple, List[RuleParams]] = {}
+    for params in grid:
+        groups.setdefault((params.fast, params.slow), []).append(params)
+
+    if len(groups) > 1:
+        futures = [_executor().submit(_sweep_group, values, group, horizon, cost_bps, short) for group in groups.values()]
+        results = [result for future in futures for result in future.result()]
+    else:
+        results = [result for group in groups.values() for result in _sweep_group(values, group, horizon, cost_bps, short)]
+    return sorted(results, key=lambda result: -np.inf if result["sharpe_ratio"] is None else result["sharpe_ratio"], reverse=True)
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from app.core import metrics
+from app.core.config import settings
+from app.services import market_data
+
+logger = logging.getLogger(__name__)
+
+# Broad market benchmarks every portfolio is measured against
+MARKET_BENCHMARKS = {
+    "S&P 500": "^GSPC",
+    "Nasdaq-100": "^NDX",
+}
+
+# SPDR sector ETFs keyed by the sector names stocks are stored with
+SECTOR_BENCHMARKS = {
+    "Technology": "XLK",
+    "Healthcare": "XLV",
+    "Financial Services": "XLF",
+    "Consumer Cyclical": "XLY",
+    "Consumer Defensive": "XLP",
+    "Energy": "XLE",
+    "Industrials": "XLI",
+    "Basic Materials": "XLB",
+    "Utilities": "XLU",
+    "Real Estate": "XLRE",
+    "Communication Services": "XLC",
+}
+
+def benchmarks_for(sectors: List[str]) -> Dict[str, str]:
+    """Market benchmarks plus the ETF of every listed sector that has one, as name -> symbol"""
+    selected = dict(MARKET_BENCHMARKS)
+    for sector in dict.fromkeys(sectors):
+        if sector in SECTOR_BENCHMARKS:
+            selected[sector] = SECTOR_BENCHMARKS[sector]
+    return selected
+
+class BenchmarkCache:
+    """Daily returns of every benchmark, shared by all requests and refetched after `max_age` seconds
+
+    All benchmarks are fetched together as one panel, so a refresh costs a
+    single batch no matter how many portfolios ask for them in between.
+    Symbols that failed stay out of the cache until the next refresh.
+    """
+
+    def __init__(self, symbols: List[str], max_age: float):
+        self.symbols = list(dict.fromkeys(symbols))
+        self.max_age = max_age
+        self._returns: Optional[pd.DataFrame] = None
+        self._failed: Dict[str, str] = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.hits = 0
+        self.refreshes = 0
+
+    def _is_fresh(self) -> bool:
+        return self._returns is not None and time.monotonic() - self._loaded_at < self.max_age
+
+    def refresh(self):
+        panel = market_data.get_price_panel(self.symbols, period="1y")
+        returns = panel.returns()
+        with self._lock:
+            self._returns = returns
+            self._failed = panel.failed
+            self._loaded_at = time.monotonic()
+            self.refreshes += 1
+        logger.info("Refreshed %d benchmark series", len(returns.columns))
+
+    def get_returns(self, symbols: List[str]) -> pd.DataFrame:
+        """Returns of the requested benchmarks that are available, one column per symbol"""
+        if self._is_fresh():
+            with self._lock:
+                self.hits += 1
+        else:
+            # Only one caller refetches; the others wait and reuse its result
+            with self._refresh_lock:
+                if not self._is_fresh():
+                    self.refresh()
+        with self._lock:
+            return self._returns[[symbol for symbol in symbols if symbol in self._returns.columns]]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.refreshes
+        return {
+            "series": 0 if self._returns is None else len(self._returns.columns),
+            "failed": sorted(self._failed),
+            "hits": self.hits,
+            "refreshes": self.refreshes,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+cache = BenchmarkCache(
+    list(MARKET_BENCHMARKS.values()) + list(SECTOR_BENCHMARKS.values()),
+    max_age=settings.BENCHMARK_REFRESH_SECONDS,
+)
+metrics.register("benchmark_cache", cache.stats)
+
+def calculate_betas(returns_df: pd.DataFrame, benchmark_returns: pd.DataFrame) -> pd.DataFrame:
+    """Beta of every holding against every benchmark, as a holdings x benchmarks frame
+
+    Uses the dates on which all benchmarks have a return, and for each
+    holding only the dates it has a return, matching pairwise
+    ``cov(holding, benchmark) / var(benchmark)``. All pairs come out of a
+    handful of matrix products instead of one regression per pair.
+    """
+    benchmark_returns = benchmark_returns.dropna()
+    dates = returns_df.index.intersection(benchmark_returns.index)
+    holdings = returns_df.loc[dates].to_numpy(dtype=np.float64)
+    benchmarks = benchmark_returns.loc[dates].to_numpy(dtype=np.float64)
+
+    present = (~np.isnan(holdings)).astype(np.float64)
+    values = np.where(present > 0, holdings, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        counts = present.sum(axis=0)[:, None]
+        benchmark_sums = present.T @ benchmarks
+        covariances = values.T @ benchmarks - values.sum(axis=0)[:, None] * benchmark_sums / counts
+        variances = present.T @ (benchmarks * benchmarks) - benchmark_sums ** 2 / counts
+        betas = np.where(counts > 1, covariances / variances, np.nan)
+    return pd.DataFrame(betas, index=returns_df.columns, columns=benchmark_returns.columns)
+
+def portfolio_betas(betas: pd.DataFrame, values: pd.Series) -> pd.Series:
+    """Value-weighted portfolio beta against each benchmark, skipping holdings without a beta"""
+    weights = values.reindex(betas.index).fillna(0).to_numpy(dtype=np.float64)
+    matrix = betas.to_numpy()
+    known = ~np.isnan(matrix)
+    covered = weights @ known
+    with np.errstate(invalid="ignore", divide="ignore"):
+        result = (weights @ np.where(known, matrix, 0.0)) / covered
+    return pd.Series(np.where(covered > 0, result, np.nan), index=betas.columns)
@@ -0,0 +1,201 @@
+"""Sync the `stocks` table with the QTOP constituent list and company fundamentals
+
+A source lists the constituents and serves each company's name, sector,
+industry and market cap; fundamentals are fetched concurrently. The list
+itself comes from the JSON file at CONSTITUENT_FIXTURE_PATH (Yahoo has no
+full holdings list for the ETF), so update that file when the index
+reconstitutes. With the yfinance source, Yahoo supplies the fundamentals,
+and the file fills in whatever Yahoo does not return. The result is
+diffed against the stored rows and every new or changed row is written with
+one bulk upsert, whose commit bumps the holdings version that the
+qtop-holdings cache keys on. Symbols that drop out of the list are reported
+but kept, since holdings and recommendations still reference them. Run from
+the backend directory:
+
+    python -m app.services.constituent_sync [--source fixture] [--dry-run]
+"""
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import yfinance as yf
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.upsert import upsert_statement
+from app.models.models import Stock
+from app.services import holdings_cache, market_data, upstream
+
+logger = logging.getLogger(__name__)
+
+# Stock columns a sync fills in
+FIELDS = ["name", "sector", "industry", "market_cap"]
+
+class ConstituentSource:
+    """Interface for sources of the constituent list and per-company fundamentals"""
+    name = "base"
+
+    def fetch_constituents(self) -> Dict[str, dict]:
+        """Current constituents as symbol -> any FIELDS known from the list"""
+        raise NotImplementedError
+
+    def fetch_fundamentals(self, symbol: str, timeout: Optional[float] = None) -> dict:
+        """FIELDS for symbol; missing or unknown fields may be left out"""
+        raise NotImplementedError
+
+class YFinanceSource(ConstituentSource):
+    """Company profiles from Yahoo Finance, through the shared upstream client, for the list another source provides"""
+    name = "yfinance"
+
+    def __init__(self, client: upstream.UpstreamClient, listing: ConstituentSource):
+        self.client = client
+        self.listing = listing
+
+    def fetch_constituents(self) -> Dict[str, dict]:
+        return self.listing.fetch_constituents()
+
+    def _info(self, symbol: str, timeout: Optional[float] = None) -> dict:
+        return yf.Ticker(symbol).info
+
+    def fetch_fundamentals(self, symbol: str, timeout: Optional[float] = None) -> dict:
+        info = self.client.call(self._info, symbol, timeout=timeout)
+        market_cap = info.get("marketCap")
+        return {
+            "name": info.get("longName") or info.get("shortName"),
+            "sector": info.get("sector"),
+            "industry": info.get("industry"),
+            "market_cap": float(market_cap) if market_cap is not None else None,
+        }
+
+class FixtureSource(ConstituentSource):
+    """Serve constituents from a JSON list of {"symbol", "name", "sector", "industry", "market_cap"} objects"""
+    name = "fixture"
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._rows: Optional[Dict[str, dict]] = None
+
+    def _load(self) -> Dict[str, dict]:
+        if self._rows is None:
+            rows = json.loads(self.path.read_text())
+            self._rows = {
+                row["symbol"].upper(): {field: row.get(field) for field in FIELDS}
+                for row in rows
+            }
+        return self._rows
+
+    def fetch_constituents(self) -> Dict[str, dict]:
+        return {symbol: dict(row) for symbol, row in self._load().items()}
+
+    def fetch_fundamentals(self, symbol: str, timeout: Optional[float] = None) -> dict:
+        return self._load()[symbol]
+
+def create_source(name: Optional[str] = None) -> ConstituentSource:
+    """Build the source configured by CONSTITUENT_SOURCE"""
+    name = name or settings.CONSTITUENT_SOURCE
+    if name == "yfinance":
+        # Share the request budget and breaker of the price store when it also talks to Yahoo
+        provider = market_data.get_store().provider
+        if not isinstance(provider, upstream.UpstreamClient):
+            provider = upstream.create_client(market_data.YFinanceProvider())
+        return YFinanceSource(provider, FixtureSource(settings.CONSTITUENT_FIXTURE_PATH))
+    if name == "fixture":
+        return FixtureSource(settings.CONSTITUENT_FIXTURE_PATH)
+    raise ValueError(f"Unknown constituent source: {name}")
+
+def fetch_fundamentals(source: ConstituentSource, symbols: List[str], timeout: Optional[float] = None) -> tuple:
+    """Fundamentals of every symbol fetched on a bounded thread pool; returns (fundamentals, failed)"""
+    timeout = timeout or settings.MARKET_DATA_TIMEOUT_SECONDS
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.MARKET_DATA_MAX_WORKERS, len(symbols)))) as pool:
+        futures = {symbol: pool.submit(source.fetch_fundamentals, symbol, timeout) for symbol in symbols}
+
+    fundamentals = {}
+    failed = {}
+    for symbol, future in futures.items():
+        try:
+            fundamentals[symbol] = future.result()
+        except Exception as exc:
+            failed[symbol] = str(exc) or type(exc).__name__
+    return fundamentals, failed
+
+def _same(old, new) -> bool:
+    if isinstance(old, float) and isinstance(new, float):
+        return bool(np.isclose(old, new, rtol=1e-9, atol=0.0))
+    return old == new
+
+def diff(existing: Dict[str, dict], synced: Dict[str, dict]) -> List[dict]:
+    """Rows to upsert: new symbols, and stored ones where a field the source knows has changed
+
+    A field the source left out (or returned as None) keeps its stored value.
+    """
+    rows = []
+    for symbol, fields in synced.items():
+        stored = existing.get(symbol)
+        row = {field: fields.get(field) for field in FIELDS}
+        if stored is not None:
+            row = {field: stored[field] if row[field] is None else row[field] for field in FIELDS}
+            if all(_same(stored[field], row[field]) for field in FIELDS):
+                continue
+        rows.append({"symbol": symbol, **row})
+    return rows
+
+def sync(db: Session, source: Optional[ConstituentSource] = None, dry_run: bool = False) -> dict:
+    """Bring `stocks` in line with the source; returns what was (or, with dry_run, would be) changed"""
+    source = source or create_source()
+    existing = {
+        row.symbol: {field: getattr(row, field) for field in FIELDS}
+        for row in db.query(Stock.symbol, *(getattr(Stock, field) for field in FIELDS))
+    }
+    constituents = source.fetch_constituents()
+
+    fundamentals, failed = fetch_fundamentals(source, sorted(constituents))
+    synced = {}
+    for symbol, listed in constituents.items():
+        fields = dict(listed)
+        # Fundamentals win over what the constituent list says, except where they know nothing;
+        # a new symbol whose fundamentals failed is still added with what the list knows
+        fields.update({field: value for field, value in fundamentals.get(symbol, {}).items() if value is not None})
+        synced[symbol] = fields
+    rows = diff(existing, synced)
+
+    if rows and not dry_run:
+        now = datetime.now(timezone.utc)
+        for row in rows:
+            row["updated_at"] = now
+        db.execute(upsert_statement(db, Stock, ["symbol"], FIELDS + ["updated_at"]), rows)
+        db.commit()
+
+    result = {
+        "source": source.name,
+        "added": sorted(row["symbol"] for row in rows if row["symbol"] not in existing),
+        "updated": sorted(row["symbol"] for row in rows if row["symbol"] in existing),
+        "unlisted": sorted(set(existing) - set(constituents)),
+        "failed": failed,
+        "holdings_version": holdings_cache.stock_table_version.value,
+    }
+    if failed:
+        logger.warning("Fundamentals unavailable for %s", ", ".join(sorted(failed)))
+    logger.info(
+        "Constituent sync from %s: %d added, %d updated, %d no longer listed%s",
+        source.name, len(result["added"]), len(result["updated"]), len(result["unlisted"]),
+        " (dry run)" if dry_run else "",
+    )
+    return result
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Sync the stocks table with the QTOP constituents")
+    parser.add_argument("--source", choices=["yfinance", "fixture"], help="defaults to CONSTITUENT_SOURCE")
+    parser.add_argument("--dry-run", action="store_true", help="report the changes without writing them")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    session = SessionLocal()
+    try:
+        print(json.dumps(sync(session, create_source(args.source), args.dry_run), indent=2))
+    finally:
+        session.close()
@@ -0,0 +1,173 @@
+import threading
+from collections import OrderedDict, deque
+from typing import Optional, Tuple
+import numpy as np
+import pandas as pd
+from app.core import metrics
+from app.core.config import settings
+
+class RollingMoments:
+    """Pairwise-complete moments of a window of return rows, updated by rank-one adds and removes
+
+    For every pair of symbols (i, j) it keeps the number of rows where both
+    are present and, over those rows, the sums of x_i, x_i^2 and x_i * x_j.
+    That reproduces pandas' ``DataFrame.cov()``/``corr()`` NaN handling
+    while each new or expired row costs O(N^2) instead of a full O(T*N^2) pass.
+    """
+
+    def __init__(self, symbols: Tuple[str, ...]):
+        n = len(symbols)
+        self.symbols = symbols
+        self.dates = deque()
+        self.rows = deque()
+        self.counts = np.zeros((n, n))
+        self.sums = np.zeros((n, n))
+        self.squares = np.zeros((n, n))
+        self.products = np.zeros((n, n))
+        self.updates_since_rebuild = 0
+        self._frames = None
+
+    def _apply(self, row: np.ndarray, sign: float):
+        present = (~np.isnan(row)).astype(np.float64)
+        values = np.where(present > 0, row, 0.0)
+        self.counts += sign * np.outer(present, present)
+        self.sums += sign * np.outer(values, present)
+        self.squares += sign * np.outer(values * values, present)
+        self.products += sign * np.outer(values, values)
+        self._frames = None
+
+    def append(self, day, row: np.ndarray):
+        self._apply(row, 1.0)
+        self.dates.append(day)
+        self.rows.append(row)
+        self.updates_since_rebuild += 1
+
+    def popleft(self):
+        self._apply(self.rows.popleft(), -1.0)
+        self.dates.popleft()
+        self.updates_since_rebuild += 1
+
+    def pop(self):
+        self._apply(self.rows.pop(), -1.0)
+        self.dates.pop()
+        self.updates_since_rebuild += 1
+
+    @property
+    def epoch(self):
+        """Date of the newest row in the window"""
+        return self.dates[-1] if self.dates else None
+
+    def frames(self) -> Tuple[pd.Series, pd.DataFrame, pd.DataFrame]:
+        """Mean returns, covariance and correlation of the current window"""
+        if self._frames is None:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                counts = np.where(self.counts > 1, self.counts, np.nan)
+                cov = (self.products - self.sums * self.sums.T / counts) / (counts - 1)
+                var_i = (self.squares - self.sums ** 2 / counts) / (counts - 1)
+                corr = np.clip(cov / np.sqrt(var_i * var_i.T), -1.0, 1.0)
+                np.fill_diagonal(corr, np.where(np.diag(counts) > 1, 1.0, np.nan))
+                mean = np.diag(self.sums) / np.where(np.diag(self.counts) > 0, np.diag(self.counts), np.nan)
+            index = list(self.symbols)
+            self._frames = (
+                pd.Series(mean, index=index),
+                pd.DataFrame(cov, index=index, columns=index),
+                pd.DataFrame(corr, index=index, columns=index),
+            )
+        return self._frames
+
+class CovarianceCache:
+    """Covariance/correlation matrices shared across requests, keyed by (universe, window, price epoch)
+
+    A lookup whose rows match the cached window is a hit. If the frame has
+    moved forward by some days, expired rows are removed and new ones added
+    by rank-one updates instead of recomputing. Anything else, or too many
+    updates in a row, triggers a full rebuild, counted as a miss.
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, RollingMoments]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.updates = 0
+        self.misses = 0
+
+    def _rebuild(self, symbols: Tuple[str, ...], dates, values: np.ndarray) -> RollingMoments:
+        # One matrix product per moment is far cheaper than appending rows one at a time
+        moments = RollingMoments(symbols)
+        present = (~np.isnan(values)).astype(np.float64)
+        filled = np.where(present > 0, values, 0.0)
+        moments.counts = present.T @ present
+        moments.sums = filled.T @ present
+        moments.squares = (filled * filled).T @ present
+        moments.products = filled.T @ filled
+        moments.dates.extend(dates)
+        moments.rows.extend(values)
+        return moments
+
+    def _roll(self, moments: RollingMoments, dates, values: np.ndarray) -> bool:
+        """Move a cached window onto the given rows; False if they don't overlap"""
+        if not moments.dates or dates[0] not in moments.dates:
+            return False
+        while moments.dates and moments.dates[0] != dates[0]:
+            moments.popleft()
+
+        # Bars for the newest cached days may have been revised (e.g. an intraday close)
+        overlap = min(len(moments.dates), len(dates))
+        matching = 0
+        while matching < overlap and moments.dates[matching] == dates[matching] and np.array_equal(
+            moments.rows[matching], values[matching], equal_nan=True
+        ):
+            matching += 1
+        while len(moments.dates) > matching:
+            moments.pop()
+
+        for day, row in zip(dates[matching:], values[matching:]):
+            moments.append(day, row)
+        return True
+
+    def get(self, returns_df: pd.DataFrame, window: Optional[int] = None) -> Tuple[pd.Series, pd.DataFrame, pd.DataFrame]:
+        """Mean returns, covariance and correlation of the last `window` rows of returns_df (all rows if None)"""
+        if window is not None:
+            returns_df = returns_df.iloc[-window:]
+        symbols = tuple(returns_df.columns)
+        dates = list(returns_df.index)
+        values = returns_df.to_numpy(dtype=np.float64)
+        key = (symbols, window)
+
+        with self._lock:
+            moments = self._entries.get(key)
+            if moments is not None:
+                self._entries.move_to_end(key)
+                if moments.dates and list(moments.dates) == dates and np.array_equal(
+                    np.asarray(moments.rows), values, equal_nan=True
+                ):
+                    self.hits += 1
+                    return moments.frames()
+                if moments.updates_since_rebuild < len(dates) and self._roll(moments, dates, values):
+                    self.updates += 1
+                    return moments.frames()
+
+            self.misses += 1
+            moments = self._rebuild(symbols, dates, values)
+            self._entries[key] = moments
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return moments.frames()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.updates + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "incremental_updates": self.updates,
+            "misses": self.misses,
+            "hit_ratio": (self.hits + self.updates) / lookups if lookups else 0.0,
+        }
+
+cache = CovarianceCache(max_entries=settings.COVARIANCE_CACHE_SIZE)
+metrics.register("covariance_cache", cache.stats)
+
+def get_moments(returns_df: pd.DataFrame, window: Optional[int] = None) -> Tuple[pd.Series, pd.DataFrame, pd.DataFrame]:
+    """Mean returns, covariance and correlation of returns_df from the shared cache"""
+    return cache.get(returns_df, window)
@@ -0,0 +1,114 @@
+import hashlib
+import threading
+import time
+from typing import Awaitable, Callable, List, Optional
+from pydantic import TypeAdapter
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core import metrics
+from app.core.config import settings
+from app.models.models import Stock
+from app.schemas.stock import StockResponse
+
+_stocks_adapter = TypeAdapter(List[StockResponse])
+
+class StockTableVersion:
+    """Counter bumped whenever a transaction that wrote to `stocks` commits
+
+    Covers unit-of-work flushes as well as bulk insert/update/delete
+    statements run through any Session. Writes made by other processes are
+    only seen once the cache entry's TTL runs out.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+
+    def _after_flush(self, session, flush_context):
+        if any(isinstance(obj, Stock) for obj in (*session.new, *session.dirty, *session.deleted)):
+            session.info["stocks_changed"] = True
+
+    def _do_orm_execute(self, state):
+        if (state.is_insert or state.is_update or state.is_delete) and any(
+            mapper.class_ is Stock for mapper in state.all_mappers
+        ):
+            state.session.info["stocks_changed"] = True
+
+    def _after_commit(self, session):
+        if session.info.pop("stocks_changed", False):
+            self.bump()
+
+    def _after_rollback(self, session):
+        session.info.pop("stocks_changed", None)
+
+    def listen(self):
+        event.listen(Session, "after_flush", self._after_flush)
+        event.listen(Session, "do_orm_execute", self._do_orm_execute)
+        event.listen(Session, "after_commit", self._after_commit)
+        event.listen(Session, "after_rollback", self._after_rollback)
+
+class CachedBody:
+    def __init__(self, body: bytes, version: int):
+        self.body = body
+        self.version = version
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.created = time.monotonic()
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for GET)"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in (tag.removeprefix("W/") for tag in tags)
+
+class HoldingsCache:
+    """The serialized qtop-holdings response, reused until the stock table version changes or `ttl` passes"""
+
+    def __init__(self, version: StockTableVersion, ttl: float):
+        self.version = version
+        self.ttl = ttl
+        self._entry: Optional[CachedBody] = None
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def _current(self) -> Optional[CachedBody]:
+        entry = self._entry
+        if entry is None or entry.version != self.version.value or time.monotonic() - entry.created > self.ttl:
+            return None
+        return entry
+
+    async def get(self, load: Callable[[], Awaitable[List[Stock]]]) -> CachedBody:
+        entry = self._current()
+        if entry is not None:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        # Read the version first so a write racing with the load forces another reload
+        version = self.version.value
+        stocks = await load()
+        entry = CachedBody(_stocks_adapter.dump_json(_stocks_adapter.validate_python(stocks)), version)
+        self._entry = entry
+        return entry
+
+    def invalidate(self):
+        self.version.bump()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "version": self.version.value,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+stock_table_version = StockTableVersion()
+stock_table_version.listen()
+cache = HoldingsCache(stock_table_version, ttl=settings.HOLDINGS_CACHE_TTL_SECONDS)
+metrics.register("holdings_cache", cache.stats)
@@ -0,0 +1,343 @@
+import json
+import math
+import os
+import threading
+from collections import deque
+from datetime import date, timedelta
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+from app.services import market_data
+
+SMA_WINDOWS = (20, 50)
+RSI_PERIOD = 14
+
+# Thresholds and confidence scores of the technical recommendation rule
+RSI_OVERBOUGHT = 70
+RSI_OVERSOLD = 30
+SIGNAL_CONFIDENCE = 0.8
+HOLD_CONFIDENCE = 0.6
+BUY, HOLD, SELL = 1, 0, -1
+
+class IndicatorState:
+    """Incremental SMA/RSI state for one symbol, updated in O(1) per new bar
+
+    SMAs are kept as running sums over a window of recent closes. RSI is kept
+    both as the running-mean variant computed by ``stock_service.calculate_rsi``
+    and as Wilder-smoothed average gain/loss.
+    """
+
+    def __init__(self, sma_windows=SMA_WINDOWS, rsi_period=RSI_PERIOD):
+        self.sma_windows = tuple(sma_windows)
+        self.rsi_period = rsi_period
+        self.last_date: Optional[date] = None
+        self.last_close: Optional[float] = None
+        self.closes = deque(maxlen=max(self.sma_windows))
+        self.sums = {window: 0.0 for window in self.sma_windows}
+        self.gains = deque(maxlen=rsi_period)
+        self.losses = deque(maxlen=rsi_period)
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.deltas_seen = 0
+        self.avg_gain: Optional[float] = None
+        self.avg_loss: Optional[float] = None
+        # PriceStore.adjusted_at of the bars folded in
+        self.adjusted_at: Optional[str] = None
+
+    def update(self, bar_date: date, close: float):
+        """Fold one new closing price into the state; a missing (non-finite) close is skipped"""
+        # Like compute_signals, the windows cover only days with a price
+        if not math.isfinite(close):
+            return
+        # Keep each SMA window's running sum: add the new close, drop the one leaving the window
+        for window in self.sma_windows:
+            if len(self.closes) >= window:
+                self.sums[window] -= self.closes[-window]
+            self.sums[window] += close
+        self.closes.append(close)
+
+        # calculate_rsi turns the first (NaN) delta into a zero gain and loss
+        delta = 0.0 if self.last_close is None else close - self.last_close
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        if len(self.gains) == self.rsi_period:
+            self.gain_sum -= self.gains[0]
+            self.loss_sum -= self.losses[0]
+        self.gains.append(gain)
+        self.losses.append(loss)
+        self.gain_sum += gain
+        self.loss_sum += loss
+
+        if self.last_close is not None:
+            self.deltas_seen += 1
+            if self.avg_gain is None:
+                # Wilder's averages are seeded with the simple mean of the first `period` deltas
+                if self.deltas_seen == self.rsi_period:
+                    self.avg_gain = sum(list(self.gains)[-self.rsi_period:]) / self.rsi_period
+                    self.avg_loss = sum(list(self.losses)[-self.rsi_period:]) / self.rsi_period
+            else:
+                self.avg_gain = (self.avg_gain * (self.rsi_period - 1) + gain) / self.rsi_period
+                self.avg_loss = (self.avg_loss * (self.rsi_period - 1) + loss) / self.rsi_period
+
+        self.last_date = bar_date
+        self.last_close = close
+
+    def sma(self, window: int) -> float:
+        if len(self.closes) < window:
+            return math.nan
+        return self.sums[window] / window
+
+    @staticmethod
+    def _rsi(gain: float, loss: float) -> float:
+        if loss == 0:
+            return math.nan if gain == 0 else 100.0
+        return 100 - (100 / (1 + gain / loss))
+
+    @property
+    def rsi(self) -> float:
+        """RSI from rolling mean gain/loss, the value calculate_rsi produces"""
+        if len(self.gains) < self.rsi_period:
+            return math.nan
+        return self._rsi(self.gain_sum, self.loss_sum)
+
+    @property
+    def rsi_wilder(self) -> float:
+        """RSI from Wilder-smoothed average gain/loss"""
+        if self.avg_gain is None:
+            return math.nan
+        return self._rsi(self.avg_gain, self.avg_loss)
+
+    def values(self) -> Dict[str, float]:
+        """The indicator values read by the recommendation logic"""
+        result = {"Close": self.last_close if self.last_close is not None else math.nan}
+        for window in self.sma_windows:
+            result[f"SMA_{window}"] = self.sma(window)
+        result["RSI"] = self.rsi
+        result["RSI_Wilder"] = self.rsi_wilder
+        return result
+
+    def to_dict(self) -> dict:
+        return {
+            "sma_windows": list(self.sma_windows),
+            "rsi_period": self.rsi_period,
+            "last_date": self.last_date.isoformat() if self.last_date else None,
+            "last_close": self.last_close,
+            "closes": list(self.closes),
+            "sums": {str(window): total for window, total in self.sums.items()},
+            "gains": list(self.gains),
+            "losses": list(self.losses),
+            "gain_sum": self.gain_sum,
+            "loss_sum": self.loss_sum,
+            "deltas_seen": self.deltas_seen,
+            "avg_gain": self.avg_gain,
+            "avg_loss": self.avg_loss,
+            "adjusted_at": self.adjusted_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "IndicatorState":
+        state = cls(sma_windows=data["sma_windows"], rsi_period=data["rsi_period"])
+        state.last_date = date.fromisoformat(data["last_date"]) if data["last_date"] else None
+        state.last_close = data["last_close"]
+        state.closes.extend(data["closes"])
+        state.sums = {int(window): total for window, total in data["sums"].items()}
+        state.gains.extend(data["gains"])
+        state.losses.extend(data["losses"])
+        state.gain_sum = data["gain_sum"]
+        state.loss_sum = data["loss_sum"]
+        state.deltas_seen = data["deltas_seen"]
+        state.avg_gain = data["avg_gain"]
+        state.avg_loss = data["avg_loss"]
+        state.adjusted_at = data.get("adjusted_at")
+        return state
+
+    def copy(self) -> "IndicatorState":
+        return IndicatorState.from_dict(self.to_dict())
+
+class IndicatorEngine:
+    """Keeps persisted IndicatorState per symbol next to its bars in the price store
+
+    Only bars strictly before both the as-of date and the last day the store
+    has covered are folded into the persisted state, and only after the store
+    was brought up to date. The newest stored bar may still be intraday and
+    get replaced, so it and any later bars are applied to a throwaway copy
+    instead. The state is rebuilt when the store replaces its history after
+    a split or dividend.
+    """
+
+    def __init__(self, store: market_data.PriceStore):
+        self.store = store
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _path(self, symbol: str) -> str:
+        return os.path.join(self.store.root, symbol.upper(), "indicators.json")
+
+    def _load(self, symbol: str) -> Optional[IndicatorState]:
+        path = self._path(symbol)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return IndicatorState.from_dict(json.load(f))
+
+    def _save(self, symbol: str, state: IndicatorState):
+        path = self._path(symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(state.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    def _fold(self, state: IndicatorState, symbol: str, start: date, end: date):
+        dates, values = self.store.read_range(symbol, start, end)
+        close_column = market_data.COLUMNS.index("Close")
+        for bar_date, close in zip(dates.astype("datetime64[D]").tolist(), values[:, close_column].tolist()):
+            state.update(bar_date, close)
+
+    def latest(self, symbol: str, period: str = "1y", as_of: Optional[date] = None) -> IndicatorState:
+        """Bring the symbol's state up to date and return it including the as-of bar"""
+        start, end = market_data.period_range(period, as_of)
+        fresh = self.store.ensure(symbol, start, end)
+        covered_end = self.store.covered_end(symbol)
+        adjusted_at = self.store.adjusted_at(symbol)
+
+        with self._lock(symbol):
+            state = self._load(symbol)
+            if state is None or state.last_date is None or state.adjusted_at != adjusted_at:
+                # Nothing folded yet, or built from bars the store has since re-adjusted
+                state = IndicatorState()
+                state.adjusted_at = adjusted_at
+                fold_from = start
+            else:
+                fold_from = state.last_date + timedelta(days=1)
+            # While the store is serving stale bars nothing is final yet
+            final_through = min(end, covered_end) - timedelta(days=1) if fresh and covered_end else None
+            if final_through is not None and fold_from <= final_through:
+                self._fold(state, symbol, fold_from, final_through)
+                self._save(symbol, state)
+                fold_from = final_through + timedelta(days=1)
+
+        preview = state.copy()
+        self._fold(preview, symbol, fold_from, end)
+        return preview
+
+_engine: Optional[IndicatorEngine] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> IndicatorEngine:
+    """Get the indicator engine bound to the current price store"""
+    global _engine
+    store = market_data.get_store()
+    with _engine_lock:
+        if _engine is None or _engine.store is not store:
+            _engine = IndicatorEngine(store)
+        return _engine
+
+def fill_gaps(values: np.ndarray) -> np.ndarray:
+    """Carry each column's last price over missing days, leaving rows before its first price NaN"""
+    valid = ~np.isnan(values)
+    rows = np.where(valid, np.arange(values.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return values[rows, np.arange(values.shape[1])]
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over `window` rows for every column at once
+
+    A window containing any NaN yields NaN, like pandas' rolling().mean().
+    """
+    valid = ~np.isnan(values)
+    sums = np.cumsum(np.where(valid, values, 0.0), axis=0)
+    counts = np.cumsum(valid, axis=0)
+    sums = np.vstack([np.zeros((1, values.shape[1])), sums])
+    counts = np.vstack([np.zeros((1, values.shape[1]), dtype=counts.dtype), counts])
+
+    result = np.full(values.shape, np.nan)
+    if values.shape[0] >= window:
+        window_sums = sums[window:] - sums[:-window]
+        window_counts = counts[window:] - counts[:-window]
+        result[window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return result
+
+def rsi_panel(closes: np.ndarray, period: int = RSI_PERIOD) -> np.ndarray:
+    """RSI for every column, matching calculate_rsi applied to each column on its own"""
+    delta = np.full(closes.shape, np.nan)
+    delta[1:] = closes[1:] - closes[:-1]
+    # calculate_rsi counts the first price's undefined delta as zero gain and loss
+    first_price = ~np.isnan(closes)
+    first_price[1:] &= np.isnan(closes[:-1])
+    delta[first_price] = 0.0
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gain = rolling_mean(np.where(delta > 0, delta, np.where(np.isnan(delta), np.nan, 0.0)), period)
+        loss = rolling_mean(np.where(delta < 0, -delta, np.where(np.isnan(delta), np.nan, 0.0)), period)
+        return 100 - (100 / (1 + gain / loss))
+
+def returns_panel(closes: np.ndarray, periods: int = 1) -> np.ndarray:
+    """Simple returns over `periods` rows for every column"""
+    result = np.full(closes.shape, np.nan)
+    if closes.shape[0] > periods:
+        result[periods:] = closes[periods:] / closes[:-periods] - 1
+    return result
+
+def signal_codes(
+    close: np.ndarray,
+    sma_fast: np.ndarray,
+    sma_slow: np.ndarray,
+    rsi: np.ndarray,
+    overbought: float = RSI_OVERBOUGHT,
+    oversold: float = RSI_OVERSOLD,
+) -> np.ndarray:
+    """The buy/hold/sell rule as BUY/HOLD/SELL codes, elementwise over arrays of any shape"""
+    with np.errstate(invalid="ignore"):
+        buy = (close > sma_fast) & (sma_fast > sma_slow) & (rsi < overbought)
+        sell = ~buy & (close < sma_fast) & (sma_fast < sma_slow) & (rsi > oversold)
+    return buy.astype(np.int8) - sell.astype(np.int8)
+
+def classify(close: np.ndarray, sma_20: np.ndarray, sma_50: np.ndarray, rsi: np.ndarray):
+    """Vectorized form of the buy/hold/sell rule in generate_stock_recommendation"""
+    codes = signal_codes(close, sma_20, sma_50, rsi)
+    recommendation = np.where(codes == BUY, "buy", np.where(codes == SELL, "sell", "hold"))
+    confidence = np.where(codes != HOLD, SIGNAL_CONFIDENCE, HOLD_CONFIDENCE)
+    return recommendation, confidence
+
+def align_last_valid(values: np.ndarray) -> np.ndarray:
+    """Move each column's prices to the bottom rows in order, with its missing days as leading NaNs
+
+    Windows computed on the result only span bars the symbol actually has,
+    like the same window over that symbol's own series.
+    """
+    order = np.argsort(~np.isnan(values), axis=0, kind="stable")
+    return np.take_along_axis(values, order, axis=0)
+
+def compute_signals(closes: pd.DataFrame) -> pd.DataFrame:
+    """Latest indicators and recommendation for every column of a dates x symbols close panel
+
+    All symbols are handled in one NumPy pass over the aligned 2-D array.
+    Each symbol's windows cover only the days it has a price on, so the
+    values match the per-symbol path in generate_stock_recommendation.
+    Symbols without any price are dropped.
+    """
+    values = align_last_valid(closes.to_numpy(dtype=np.float64))
+    sma_20 = rolling_mean(values, 20)
+    sma_50 = rolling_mean(values, 50)
+    rsi = rsi_panel(values)
+    daily_returns = returns_panel(values)
+
+    if values.shape[0] == 0:
+        return pd.DataFrame(columns=["Close", "SMA_20", "SMA_50", "RSI", "Return_1D", "recommendation_type", "confidence_score"])
+
+    recommendation, confidence = classify(values[-1], sma_20[-1], sma_50[-1], rsi[-1])
+    signals = pd.DataFrame({
+        "Close": values[-1],
+        "SMA_20": sma_20[-1],
+        "SMA_50": sma_50[-1],
+        "RSI": rsi[-1],
+        "Return_1D": daily_returns[-1],
+        "recommendation_type": recommendation,
+        "confidence_score": confidence,
+    }, index=closes.columns)
+    return signals[signals["Close"].notna()]
@@ -0,0 +1,504 @@
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+import yfinance as yf
+from app.core.config import settings
+from app.services import upstream
+
+logger = logging.getLogger(__name__)
+
+# Column layout of the on-disk value arrays
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Calendar days covered by the yfinance-style period strings used by the services
+PERIOD_DAYS = {
+    "1mo": 31,
+    "3mo": 92,
+    "6mo": 183,
+    "1y": 366,
+    "2y": 731,
+    "5y": 1827,
+    "10y": 3653,
+}
+
+def _normalize(hist: pd.DataFrame) -> pd.DataFrame:
+    """Coerce provider output to tz-naive daily bars with the store's column layout"""
+    if hist is None or hist.empty:
+        return pd.DataFrame(columns=COLUMNS, index=pd.DatetimeIndex([], name="Date"), dtype=np.float64)
+
+    hist = hist.copy()
+    index = pd.DatetimeIndex(hist.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    hist.index = index.normalize()
+    hist.index.name = "Date"
+
+    for column in COLUMNS:
+        if column not in hist.columns:
+            hist[column] = 0.0 if column == "Volume" else np.nan
+    hist = hist[COLUMNS].astype(np.float64)
+    hist = hist[~hist.index.duplicated(keep="last")]
+    return hist.sort_index()
+
+class MarketDataProvider:
+    """Interface for upstream sources of daily OHLCV bars"""
+    name = "base"
+
+    def fetch_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> pd.DataFrame:
+        """Return daily bars for symbol between start and end (inclusive)"""
+        raise NotImplementedError
+
+    def fetch_quote(self, symbol: str, timeout: Optional[float] = None) -> Optional[float]:
+        """Latest traded price for symbol, or None if there is none"""
+        today = date.today()
+        hist = self.fetch_history(symbol, today - timedelta(days=7), today, timeout=timeout)
+        closes = hist["Close"].dropna()
+        return float(closes.iloc[-1]) if not closes.empty else None
+
+class YFinanceProvider(MarketDataProvider):
+    """Fetch bars from Yahoo Finance"""
+    name = "yfinance"
+
+    def fetch_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> pd.DataFrame:
+        ticker = yf.Ticker(symbol)
+        try:
+            # yfinance treats `end` as exclusive
+            # Split- and dividend-adjusted; PriceStore.ensure notices when upstream re-adjusts stored bars
+            hist = ticker.history(
+                start=start.isoformat(),
+                end=(end + timedelta(days=1)).isoformat(),
+                timeout=timeout or settings.MARKET_DATA_TIMEOUT_SECONDS,
+                auto_adjust=True,
+                raise_errors=True,
+            )
+        except Exception as exc:
+            # A range without trading days is not an error for the store
+            if "No data found" in str(exc) or "No price data found" in str(exc):
+                return _normalize(None)
+            raise
+        return _normalize(hist)
+
+    def fetch_quote(self, symbol: str, timeout: Optional[float] = None) -> Optional[float]:
+        # fast_info reads the lightweight chart endpoint instead of the full quoteSummary behind .info
+        price = yf.Ticker(symbol).fast_info["lastPrice"]
+        return float(price) if price is not None and not np.isnan(price) else None
+
+class FixtureProvider(MarketDataProvider):
+    """Serve bars from <SYMBOL>.csv files so the app can run offline"""
+    name = "fixture"
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def fetch_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> pd.DataFrame:
+        path = self.directory / f"{symbol}.csv"
+        if not path.exists():
+            return _normalize(None)
+        hist = _normalize(pd.read_csv(path, index_col=0, parse_dates=True))
+        return hist.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+    def fetch_quote(self, symbol: str, timeout: Optional[float] = None) -> Optional[float]:
+        # The last close in the file, however old, stands in for a live price
+        path = self.directory / f"{symbol}.csv"
+        if not path.exists():
+            return None
+        closes = _normalize(pd.read_csv(path, index_col=0, parse_dates=True))["Close"].dropna()
+        return float(closes.iloc[-1]) if not closes.empty else None
+
+def _slice(dates: np.ndarray, values: np.ndarray, start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+    lo = np.searchsorted(dates, np.datetime64(start, "ns"), side="left")
+    hi = np.searchsorted(dates, np.datetime64(end, "ns") + np.timedelta64(1, "D"), side="left")
+    return dates[lo:hi], values[lo:hi]
+
+def _adjustment_changed(stored: pd.DataFrame, fetched: List[pd.DataFrame]) -> bool:
+    """Whether refetched copies of stored bars have a different close"""
+    for frame in fetched:
+        overlap = stored.index.intersection(frame.index)
+        if len(overlap) and not np.allclose(
+            stored.loc[overlap, "Close"], frame.loc[overlap, "Close"], rtol=1e-4, equal_nan=True
+        ):
+            return True
+    return False
+
+class PriceStore:
+    """On-disk columnar bar store with one directory of memory-mapped arrays per symbol
+
+    Each write creates a new version directory ``v<N>`` under the symbol's
+    directory holding ``dates.npy`` (datetime64[ns]), ``values.npy`` (float64,
+    one column per entry of COLUMNS) and ``meta.json`` recording the date
+    range already requested from the provider and the last day whose bar was
+    complete when fetched. Only missing bars are fetched, plus any later bars
+    that may have been intraday ones, which are refreshed until they are
+    final. The ``CURRENT`` file names the version readers should use and is
+    swapped in with a single rename, so a reader always sees a matching set.
+    """
+
+    def __init__(self, root: str, provider: MarketDataProvider):
+        self.root = Path(root)
+        self.provider = provider
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, symbol: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(symbol, threading.Lock())
+
+    def _dir(self, symbol: str) -> Path:
+        return self.root / symbol.upper()
+
+    def _current(self, symbol: str) -> Path:
+        """Version directory that readers of symbol should use"""
+        directory = self._dir(symbol)
+        try:
+            return directory / (directory / "CURRENT").read_text()
+        except FileNotFoundError:
+            # Stores written before versioning keep their files at the top level
+            return directory
+
+    def _read_meta(self, version: Path) -> Optional[dict]:
+        path = version / "meta.json"
+        if not path.exists():
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _load(self, version: Path) -> Tuple[np.ndarray, np.ndarray]:
+        dates_path = version / "dates.npy"
+        if not dates_path.exists():
+            return np.empty(0, dtype="datetime64[ns]"), np.empty((0, len(COLUMNS)), dtype=np.float64)
+        dates = np.load(dates_path, mmap_mode="r")
+        values = np.load(version / "values.npy", mmap_mode="r")
+        return dates, values
+
+    def _snapshot(self, symbol: str) -> Tuple[np.ndarray, np.ndarray, Optional[dict]]:
+        """(dates, values, meta) of one version, retrying if writers pruned it before it was opened"""
+        for attempt in range(3):
+            try:
+                version = self._current(symbol)
+                return (*self._load(version), self._read_meta(version))
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+    def _write(self, symbol: str, bars: pd.DataFrame, meta: dict):
+        """Write bars and meta as a new version and point CURRENT at it; call with the symbol's lock held"""
+        directory = self._dir(symbol)
+        directory.mkdir(parents=True, exist_ok=True)
+        previous = self._current(symbol)
+        number = int(previous.name[1:]) + 1 if previous != directory else 1
+        version = directory / f"v{number}"
+        shutil.rmtree(version, ignore_errors=True)  # Left over from a write that died before the swap
+        version.mkdir()
+        if not bars.empty:
+            np.save(version / "dates.npy", bars.index.values.astype("datetime64[ns]"))
+            np.save(version / "values.npy", np.ascontiguousarray(bars.to_numpy(dtype=np.float64)))
+        with open(version / "meta.json", "w") as f:
+            json.dump(meta, f)
+        tmp_pointer = directory / "CURRENT.tmp"
+        tmp_pointer.write_text(version.name)
+        os.replace(tmp_pointer, directory / "CURRENT")
+
+        # Keep the previous version for readers that resolved CURRENT just
+        # before the swap; mapped arrays stay readable after their files go
+        for old in directory.glob("v*"):
+            if old.is_dir() and old.name not in (version.name, previous.name):
+                shutil.rmtree(old, ignore_errors=True)
+
+    def _now(self) -> datetime:
+        """Current UTC time, which decides whether a fetched bar can still be intraday"""
+        return datetime.utcnow()
+
+    def _frame(self, dates: np.ndarray, values: np.ndarray) -> pd.DataFrame:
+        return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name="Date"), columns=COLUMNS, copy=False)
+
+    def ensure(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> bool:
+        """Fetch whichever bars between start and end are not stored yet
+
+        Each fetch overlaps the stored final bar next to it. If upstream
+        reports a different close for that bar, it has re-adjusted history
+        for a split or dividend, so the whole stored range is fetched again
+        rather than mixing old and new adjustments.
+
+        Returns False when upstream is unavailable but earlier bars are
+        stored; those are left to be served as stale data. Without any
+        stored bars the upstream error is raised.
+        """
+        with self._lock(symbol):
+            dates, values, meta = self._snapshot(symbol)
+            stored = self._frame(np.array(dates), np.array(values))
+            now = self._now()
+            final_end = None
+            tail = None
+            if meta is None:
+                missing = [(start, end)]
+                tail = (start, end)
+            else:
+                covered_start = date.fromisoformat(meta["start"])
+                covered_end = date.fromisoformat(meta["end"])
+                # Stores written before final_end was recorded treat their last day as provisional
+                final_end = date.fromisoformat(meta["final_end"]) if "final_end" in meta else covered_end - timedelta(days=1)
+                final_dates = stored.index[stored.index <= pd.Timestamp(final_end)]
+                missing = []
+                if start < covered_start:
+                    head_end = final_dates[0].date() if len(final_dates) else covered_start - timedelta(days=1)
+                    missing.append((start, head_end))
+                # Bars after final_end may have been intraday when fetched; they are
+                # refetched along with any new days, or on their own once they are
+                # MARKET_DATA_INTRADAY_REFRESH_SECONDS old
+                age = (now - datetime.fromisoformat(meta["fetched_at"])).total_seconds()
+                if end > covered_end or (end > final_end and age >= settings.MARKET_DATA_INTRADAY_REFRESH_SECONDS):
+                    tail_start = final_dates[-1].date() if len(final_dates) else final_end + timedelta(days=1)
+                    tail = (tail_start, max(end, covered_end))
+                    missing.append(tail)
+            if not missing:
+                return True
+
+            new_start = min(start, date.fromisoformat(meta["start"])) if meta else start
+            new_end = max(end, date.fromisoformat(meta["end"])) if meta else end
+            adjusted_at = meta.get("adjusted_at") if meta else now.isoformat()
+            try:
+                fetched = [self.provider.fetch_history(symbol, lo, hi, timeout=timeout) for lo, hi in missing]
+                if meta is not None and _adjustment_changed(stored.loc[:pd.Timestamp(final_end)], fetched):
+                    logger.info("Upstream re-adjusted the history of %s; refetching %s to %s", symbol, new_start, new_end)
+                    stored = _normalize(None)
+                    fetched = [self.provider.fetch_history(symbol, new_start, new_end, timeout=timeout)]
+                    tail = (new_start, new_end)
+                    adjusted_at = now.isoformat()
+            except upstream.UpstreamUnavailable as exc:
+                if meta is None:
+                    raise
+                logger.warning("Serving stored bars for %s through %s: %s", symbol, meta["end"], exc)
+                return False
+            frames = [frame for frame in [stored, *fetched] if not frame.empty]
+            bars = pd.concat(frames) if frames else _normalize(None)
+            bars = bars[~bars.index.duplicated(keep="last")].sort_index()
+
+            if tail is not None:
+                # A day's bar is complete once the UTC date has moved past it, which is
+                # after the close of the US sessions the store serves
+                last_final = min(tail[1], now.date() - timedelta(days=1))
+                final_end = last_final if final_end is None else max(final_end, last_final)
+            new_meta = {
+                "start": new_start.isoformat(),
+                "end": new_end.isoformat(),
+                "final_end": final_end.isoformat(),
+                "adjusted_at": adjusted_at,
+                "provider": self.provider.name,
+                "fetched_at": now.isoformat(),
+            }
+            self._write(symbol, bars, new_meta)
+            return True
+
+    def adjusted_at(self, symbol: str) -> Optional[str]:
+        """When the stored bars were last fetched in full, so they all share one split/dividend adjustment
+
+        Changes whenever the stored history is replaced, which invalidates
+        anything derived from the old bars.
+        """
+        meta = self._snapshot(symbol)[2]
+        return meta.get("adjusted_at") if meta else None
+
+    def covered_end(self, symbol: str) -> Optional[date]:
+        """Last day whose bars have been requested from the provider, or None if nothing is stored"""
+        meta = self._snapshot(symbol)[2]
+        return date.fromisoformat(meta["end"]) if meta else None
+
+    def read_range(self, symbol: str, start: date, end: date) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (dates, values) views of the stored bars between start and end without copying"""
+        dates, values, _ = self._snapshot(symbol)
+        return _slice(dates, values, start, end)
+
+    def get_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> pd.DataFrame:
+        """Return daily bars between start and end, fetching missing ones first
+
+        When upstream could not be reached the stored bars are returned with
+        ``attrs["stale"]`` set and ``attrs["as_of"]`` holding the last day
+        they cover.
+        """
+        fresh = self.ensure(symbol, start, end, timeout=timeout)
+        dates, values, meta = self._snapshot(symbol)
+        frame = self._frame(*_slice(dates, values, start, end))
+        if not fresh:
+            frame.attrs["stale"] = True
+            frame.attrs["as_of"] = meta["end"]
+        return frame
+
+_store: Optional[PriceStore] = None
+_store_lock = threading.Lock()
+
+def create_provider(name: Optional[str] = None) -> MarketDataProvider:
+    """Build the provider configured by MARKET_DATA_PROVIDER"""
+    name = name or settings.MARKET_DATA_PROVIDER
+    if name == "yfinance":
+        return upstream.create_client(YFinanceProvider())
+    if name == "fixture":
+        return FixtureProvider(settings.MARKET_DATA_FIXTURE_DIR)
+    raise ValueError(f"Unknown market data provider: {name}")
+
+def get_store() -> PriceStore:
+    """Get the process-wide price store"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PriceStore(settings.MARKET_DATA_DIR, create_provider())
+        return _store
+
+def set_provider(provider: MarketDataProvider, root: Optional[str] = None) -> PriceStore:
+    """Swap the upstream provider (and optionally the store location)"""
+    global _store
+    with _store_lock:
+        _store = PriceStore(root or settings.MARKET_DATA_DIR, provider)
+        return _store
+
+def period_range(period: str = "1y", end: Optional[date] = None) -> Tuple[date, date]:
+    """Translate a yfinance-style period string into a (start, end) date range"""
+    if period not in PERIOD_DAYS:
+        raise ValueError(f"Unsupported period: {period}")
+    end = end or date.today()
+    return end - timedelta(days=PERIOD_DAYS[period]), end
+
+def get_history(symbol: str, period: str = "1y") -> pd.DataFrame:
+    """Get daily OHLCV bars for a symbol through the local price store"""
+    start, end = period_range(period)
+    return get_store().get_history(symbol, start, end)
+
+class PricePanel:
+    """Prices for several symbols aligned on a shared date index"""
+
+    def __init__(self, closes: pd.DataFrame, failed: Dict[str, str], stale: Optional[Dict[str, str]] = None):
+        self.closes = closes
+        self.failed = failed
+        # Symbols served from stored bars while upstream was down, with the last day they cover
+        self.stale = stale or {}
+
+    @property
+    def symbols(self) -> List[str]:
+        return list(self.closes.columns)
+
+    def returns(self) -> pd.DataFrame:
+        """Daily returns per symbol, NaN on dates a symbol has no bar
+
+        Returns across a gap are measured from the symbol's previous close,
+        matching what per-symbol ``pct_change().dropna()`` series produce.
+        """
+        closes = self.closes
+        returns = closes.ffill().pct_change(fill_method=None)
+        return returns.where(closes.notna()).iloc[1:].dropna(how="all")
+
+    def latest(self) -> pd.Series:
+        """Most recent close of every symbol in the panel"""
+        if self.closes.empty:
+            return pd.Series(dtype=np.float64)
+        return self.closes.ffill().iloc[-1]
+
+_executor = ThreadPoolExecutor(max_workers=settings.MARKET_DATA_MAX_WORKERS, thread_name_prefix="market-data")
+
+def _fetch_with_retries(store: PriceStore, symbol: str, start: date, end: date, timeout: float, retries: int) -> pd.DataFrame:
+    for attempt in range(retries + 1):
+        try:
+            return store.get_history(symbol, start, end, timeout=timeout)
+        except (upstream.CircuitOpen, upstream.RateLimited):
+            # Retrying cannot help until the breaker or the budget recovers
+            raise
+        except Exception as exc:
+            if attempt == retries:
+                raise
+            delay = settings.MARKET_DATA_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+            logger.warning("Fetching %s failed (%s), retrying in %.1fs", symbol, exc, delay)
+            time.sleep(delay)
+
+def get_price_panel(
+    symbols: List[str],
+    period: str = "1y",
+    field: str = "Close",
+    timeout: Optional[float] = None,
+    retries: Optional[int] = None,
+) -> PricePanel:
+    """Fetch history for many symbols concurrently and align one field into a panel
+
+    Symbols are fetched on a bounded thread pool with a per-symbol timeout and
+    retries. Symbols that still fail, or have no bars, are left out of the
+    panel and reported in ``PricePanel.failed`` instead of failing the batch.
+    Symbols served from stored bars while upstream is down are listed in
+    ``PricePanel.stale``.
+    """
+    timeout = timeout or settings.MARKET_DATA_TIMEOUT_SECONDS
+    retries = settings.MARKET_DATA_RETRIES if retries is None else retries
+    start, end = period_range(period)
+    store = get_store()
+
+    symbols = list(dict.fromkeys(symbols))
+    futures = {
+        symbol: _executor.submit(_fetch_with_retries, store, symbol, start, end, timeout, retries)
+        for symbol in symbols
+    }
+
+    series = {}
+    failed = {}
+    stale = {}
+    for symbol, future in futures.items():
+        try:
+            hist = future.result()
+        except Exception as exc:
+            failed[symbol] = str(exc) or exc.__class__.__name__
+            continue
+        if hist.empty:
+            failed[symbol] = "No data returned"
+            continue
+        series[symbol] = hist[field]
+        if hist.attrs.get("stale"):
+            stale[symbol] = hist.attrs["as_of"]
+
+    if failed:
+        logger.warning("Market data unavailable for %s", ", ".join(sorted(failed)))
+    if stale:
+        logger.warning("Serving stale market data for %s", ", ".join(sorted(stale)))
+
+    if series:
+        closes = pd.concat(series, axis=1).sort_index()
+    else:
+        closes = pd.DataFrame(index=pd.DatetimeIndex([], name="Date"), dtype=np.float64)
+    return PricePanel(closes, failed, stale)
+
+def get_quote(symbol: str) -> Optional[float]:
+    """Latest price for symbol straight from the provider, bypassing the daily bar store"""
+    return get_store().provider.fetch_quote(symbol, timeout=settings.MARKET_DATA_TIMEOUT_SECONDS)
+
+def get_quotes(symbols: List[str], timeout: Optional[float] = None) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """Latest prices for many symbols fetched concurrently; returns (quotes, failed)
+
+    Like get_quote, these bypass the daily bar store, whose newest bar may
+    be an intraday one from earlier in the session. Symbols without a quote
+    are reported in ``failed`` instead of failing the batch.
+    """
+    timeout = timeout or settings.MARKET_DATA_TIMEOUT_SECONDS
+    provider = get_store().provider
+    futures = {
+        symbol: _executor.submit(provider.fetch_quote, symbol, timeout)
+        for symbol in dict.fromkeys(symbols)
+    }
+
+    quotes = {}
+    failed = {}
+    for symbol, future in futures.items():
+        try:
+            price = future.result()
+        except Exception as exc:
+            failed[symbol] = str(exc) or exc.__class__.__name__
+            continue
+        if price is None:
+            failed[symbol] = "No quote returned"
+            continue
+        quotes[symbol] = price
+    if failed:
+        logger.warning("Quotes unavailable for %s", ", ".join(sorted(failed)))
+    return quotes, failed
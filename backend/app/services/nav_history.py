@@ -0,0 +1,156 @@
+"""Daily portfolio valuations materialized from holdings and the close-price panel
+
+A holding counts from the first trading day on or after its ``created_at``
+date. Each run values every portfolio on the trading days after its last
+stored row, in one array pass over all portfolios, and upserts those rows.
+Run from the backend directory to catch up outside the scheduler:
+
+    python -m app.services.nav_history
+"""
+import logging
+from datetime import date, datetime, timedelta, timezone
+from typing import List, Optional
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db.upsert import upsert_statement
+from app.models.models import PortfolioHolding, PortfolioValuation, Stock
+from app.services import indicators, market_data
+
+logger = logging.getLogger(__name__)
+
+def last_complete_day(now: Optional[datetime] = None) -> date:
+    """Latest day whose closes are final: today once the scheduled post-close run time has passed"""
+    now = now or datetime.now(timezone.utc)
+    run_at = datetime.combine(now.date(), datetime.strptime(settings.SCHEDULER_RUN_AT, "%H:%M").time(), timezone.utc)
+    return now.date() if now >= run_at else now.date() - timedelta(days=1)
+
+def _period_covering(start: date, end: date) -> str:
+    for period, days in sorted(market_data.PERIOD_DAYS.items(), key=lambda item: item[1]):
+        if end - timedelta(days=days) <= start:
+            return period
+    return max(market_data.PERIOD_DAYS, key=market_data.PERIOD_DAYS.get)
+
+def materialize(db: Session, through: Optional[date] = None) -> int:
+    """Store valuations for every portfolio up to `through`; returns the number of rows written
+
+    A portfolio's days stop before the first day on which one of its held
+    symbols has no price yet, so a later run resumes from there instead of
+    storing a partial value.
+    """
+    through = through or last_complete_day()
+    holdings = db.query(
+        PortfolioHolding.portfolio_id, Stock.symbol, PortfolioHolding.quantity,
+        PortfolioHolding.average_price, PortfolioHolding.created_at
+    ).join(Stock, PortfolioHolding.stock_id == Stock.id).all()
+    if not holdings:
+        return 0
+    last_stored = dict(
+        db.query(PortfolioValuation.portfolio_id, func.max(PortfolioValuation.date))
+        .group_by(PortfolioValuation.portfolio_id).all()
+    )
+
+    portfolio_ids, portfolio_codes = np.unique([row.portfolio_id for row in holdings], return_inverse=True)
+    symbols, symbol_codes = np.unique([row.symbol for row in holdings], return_inverse=True)
+    n_portfolios = len(portfolio_ids)
+    entry_dates = np.array(
+        [(row.created_at or datetime.now(timezone.utc)).date() for row in holdings], dtype="datetime64[D]"
+    )
+    first_entry_date = np.full(n_portfolios, np.datetime64(date.max, "D"))
+    np.minimum.at(first_entry_date, portfolio_codes, entry_dates)
+    # First day each portfolio still needs: after its last stored row, or its first entry
+    resume = np.array([
+        last_stored[pid] + timedelta(days=1) if pid in last_stored else first
+        for pid, first in zip(portfolio_ids.tolist(), first_entry_date.astype(date))
+    ], dtype="datetime64[D]")
+    start = resume.min().astype(date)
+    if start > through:
+        return 0
+
+    # A few days of slack before start so a symbol without a bar on the
+    # first day still gets its previous close carried in
+    fetch_from = start - timedelta(days=10)
+    panel = market_data.get_price_panel(symbols.tolist(), period=_period_covering(fetch_from, through))
+    closes = panel.closes.reindex(columns=symbols.tolist())
+    closes = closes[(closes.index.date >= fetch_from) & (closes.index.date <= through)]
+    prices = indicators.fill_gaps(closes.to_numpy(dtype=np.float64))
+    in_range = closes.index.date >= start
+    days = closes.index[in_range].to_numpy(dtype="datetime64[D]")
+    prices = prices[in_range]
+    n_days = len(days)
+    if n_days == 0:
+        return 0
+
+    # Quantity and cost changes land on each holding's entry day (day 0 for
+    # holdings older than the window) and accumulate down the days into what
+    # is held on every day, per (portfolio, symbol) pair
+    pairs, pair_codes = np.unique(portfolio_codes * len(symbols) + symbol_codes, return_inverse=True)
+    pair_portfolio, pair_symbol = np.divmod(pairs, len(symbols))
+    entry = np.searchsorted(days, entry_dates)
+    quantities = np.array([row.quantity for row in holdings], dtype=np.float64)
+    average_prices = np.array([row.average_price for row in holdings], dtype=np.float64)
+    quantity = np.zeros((n_days + 1, len(pairs)))
+    cost = np.zeros((n_days + 1, n_portfolios))
+    np.add.at(quantity, (entry, pair_codes), quantities)
+    np.add.at(cost, (entry, portfolio_codes), quantities * average_prices)
+    quantity = np.cumsum(quantity[:-1], axis=0)
+    cost = np.cumsum(cost[:-1], axis=0)
+
+    pair_prices = prices[:, pair_symbol]
+    held = quantity != 0
+    market_value = np.zeros((n_days, n_portfolios))
+    np.add.at(market_value.T, pair_portfolio, np.where(held, np.nan_to_num(pair_prices) * quantity, 0.0).T)
+    unpriced = np.zeros((n_days, n_portfolios), dtype=bool)
+    np.logical_or.at(unpriced.T, pair_portfolio, (held & np.isnan(pair_prices)).T)
+    holds_any = np.zeros((n_days, n_portfolios), dtype=bool)
+    np.logical_or.at(holds_any.T, pair_portfolio, held.T)
+
+    # Days to write: from resume on, while something is held, and before the
+    # first new day with an unpriced holding
+    day_index = np.arange(n_days)[:, None]
+    new_day = days[:, None] >= resume[None, :]
+    blocked = unpriced & new_day
+    first_blocked = np.where(blocked.any(axis=0), np.argmax(blocked, axis=0), n_days)
+    write = new_day & holds_any & (day_index < first_blocked)
+
+    rows = [
+        {
+            "portfolio_id": int(portfolio_ids[p]),
+            "date": days[d].astype(date),
+            "market_value": float(market_value[d, p]),
+            "cost_basis": float(cost[d, p]),
+        }
+        for d, p in zip(*np.nonzero(write))
+    ]
+    if rows:
+        # Upserted so a run racing another, or rerun over days it already
+        # stored, overwrites them instead of failing on the unique key
+        db.execute(upsert_statement(db, PortfolioValuation, ["portfolio_id", "date"], ["market_value", "cost_basis"]), rows)
+        db.commit()
+    logger.info("Stored %d portfolio valuations through %s", len(rows), through)
+    return len(rows)
+
+def get_history(db: Session, portfolio_id: int, start: Optional[date] = None, end: Optional[date] = None) -> List:
+    """Stored valuations of a portfolio between start and end inclusive, oldest first"""
+    query = db.query(
+        PortfolioValuation.date,
+        PortfolioValuation.market_value,
+        PortfolioValuation.cost_basis,
+        (PortfolioValuation.market_value - PortfolioValuation.cost_basis).label("unrealized_pnl"),
+    ).filter(PortfolioValuation.portfolio_id == portfolio_id)
+    if start is not None:
+        query = query.filter(PortfolioValuation.date >= start)
+    if end is not None:
+        query = query.filter(PortfolioValuation.date <= end)
+    return query.order_by(PortfolioValuation.date).all()
+
+if __name__ == "__main__":
+    from app.db.session import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    session = SessionLocal()
+    try:
+        materialize(session)
+    finally:
+        session.close()
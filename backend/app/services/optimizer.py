@@ -0,0 +1,280 @@
+from typing import Dict, Optional, Sequence, Union
+import numpy as np
+
+TRADING_DAYS = 252
+
+def _solve_breakpoints(upper_points: np.ndarray, lower_points: np.ndarray, target: np.ndarray) -> np.ndarray:
+    """Solve sum_i clip(y_i - lam, 0, u_i) = target for lam, one row at a time
+
+    Each term is zero above ``upper_points`` (y_i), grows with slope one below
+    it and saturates at ``lower_points`` (y_i - u_i). Sorting the breakpoints
+    makes the left-hand side an explicit piecewise-linear function, so the
+    root is found exactly without iterating.
+    """
+    rows, n = upper_points.shape
+    points = np.concatenate([upper_points, lower_points], axis=1)
+    steps = np.concatenate([np.ones((rows, n)), -np.ones((rows, n))], axis=1)
+    order = np.argsort(-points, axis=1, kind="stable")
+    points = np.take_along_axis(points, order, axis=1)
+    slopes = np.cumsum(np.take_along_axis(steps, order, axis=1), axis=1)
+
+    # Value of the sum at each breakpoint, walking from the highest one down
+    gaps = points[:, :-1] - points[:, 1:]
+    values = np.concatenate([np.zeros((rows, 1)), np.cumsum(slopes[:, :-1] * gaps, axis=1)], axis=1)
+
+    # Last breakpoint whose value is still below the target, then interpolate along its segment
+    index = np.maximum((values < target[:, None] - 1e-15).sum(axis=1) - 1, 0)
+    start = np.take_along_axis(points, index[:, None], axis=1)[:, 0]
+    value = np.take_along_axis(values, index[:, None], axis=1)[:, 0]
+    slope = np.take_along_axis(slopes, index[:, None], axis=1)[:, 0]
+    return start - (target - value) / np.maximum(slope, 1)
+
+class Constraints:
+    """Long-only feasible set: weights sum to one, per-asset and per-sector caps"""
+
+    def __init__(
+        self,
+        n_assets: int,
+        max_weight: Optional[float] = None,
+        sectors: Optional[Sequence[str]] = None,
+        sector_cap: Optional[Union[float, Dict[str, float]]] = None,
+    ):
+        self.upper = np.full(n_assets, 1.0 if max_weight is None else float(max_weight))
+        if self.upper.sum() < 1 - 1e-12:
+            raise ValueError(f"max_weight {max_weight} is infeasible for {n_assets} assets")
+
+        self.groups = []
+        if sector_cap is not None:
+            if sectors is None or len(sectors) != n_assets:
+                raise ValueError("sector_cap requires a sector label for every asset")
+            labels = [sector or "Unknown" for sector in sectors]
+            capacity = 0.0
+            for label in sorted(set(labels)):
+                members = np.array([i for i, sector in enumerate(labels) if sector == label])
+                cap = sector_cap.get(label, 1.0) if isinstance(sector_cap, dict) else float(sector_cap)
+                capacity += min(cap, self.upper[members].sum())
+                # A cap at or above the sector's total per-asset capacity can never bind
+                if cap < self.upper[members].sum():
+                    self.groups.append((members, cap))
+            if capacity < 1 - 1e-12:
+                raise ValueError("Sector caps are infeasible: they allow less than 100% allocation")
+
+    def project(self, points: np.ndarray) -> np.ndarray:
+        """Euclidean projection of every row onto the feasible set"""
+        rows = points.shape[0]
+        upper = np.broadcast_to(self.upper, points.shape)
+        floor = np.full(points.shape, -np.inf)
+
+        # The multiplier of a binding sector cap acts as a sector-wide floor on the
+        # shift applied to its members, found by solving the sector on its own
+        for members, cap in self.groups:
+            sub_points = points[:, members]
+            tau = _solve_breakpoints(sub_points, sub_points - upper[:, members], np.full(rows, cap))
+            floor[:, members] = tau[:, None]
+
+        lam = _solve_breakpoints(np.maximum(points, floor), np.maximum(points - upper, floor), np.ones(rows))
+        return np.clip(points - np.maximum(lam[:, None], floor), 0.0, upper)
+
+class Frontier:
+    """Efficient frontier points solved in one batch"""
+
+    def __init__(self, weights: np.ndarray, mean_returns: np.ndarray, cov_matrix: np.ndarray, risk_aversions: np.ndarray):
+        self.weights = weights
+        self.risk_aversions = risk_aversions
+        self.expected_returns = weights @ mean_returns
+        self.risks = np.sqrt(np.maximum(np.einsum("ij,jk,ik->i", weights, cov_matrix, weights), 0.0))
+
+    def sharpe_ratios(self, risk_free_rate: float = 0.0) -> np.ndarray:
+        """Annualized Sharpe ratio of every point"""
+        excess = self.expected_returns * TRADING_DAYS - risk_free_rate
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(self.risks > 0, excess / (self.risks * np.sqrt(TRADING_DAYS)), -np.inf)
+
+def _largest_eigenvalue(matrix: np.ndarray, iterations: int = 50) -> float:
+    vector = np.ones(matrix.shape[0]) / np.sqrt(matrix.shape[0])
+    value = 0.0
+    for _ in range(iterations):
+        product = matrix @ vector
+        norm = np.linalg.norm(product)
+        if norm == 0:
+            return 0.0
+        vector = product / norm
+        value = norm
+    return value
+
+def _polish(
+    point: np.ndarray,
+    mean_returns: np.ndarray,
+    cov_matrix: np.ndarray,
+    risk_aversion: float,
+    constraints: Constraints,
+    threshold: float = 1e-6,
+) -> Optional[np.ndarray]:
+    """Solve the equality-constrained problem on the active set `point` suggests
+
+    Weights near zero or their cap are fixed there and near-binding sector
+    caps become equalities; the remaining KKT system is solved directly.
+    Returns None if the solution leaves the feasible box.
+    """
+    upper = constraints.upper
+    at_upper = point >= upper - threshold
+    fixed = (point <= threshold) | at_upper
+    free = np.flatnonzero(~fixed)
+    if len(free) == 0:
+        return None
+    fixed_values = np.where(at_upper, upper, 0.0)
+    fixed_values[free] = 0.0
+
+    rows = [np.ones(len(free))]
+    targets = [1.0 - fixed_values.sum()]
+    for members, cap in constraints.groups:
+        if point[members].sum() >= cap - threshold:
+            in_sector = np.isin(free, members).astype(np.float64)
+            if in_sector.any():
+                rows.append(in_sector)
+                targets.append(cap - fixed_values[members].sum())
+    equalities = np.array(rows)
+
+    size = len(free) + len(rows)
+    system = np.zeros((size, size))
+    system[:len(free), :len(free)] = cov_matrix[np.ix_(free, free)]
+    system[:len(free), len(free):] = equalities.T
+    system[len(free):, :len(free)] = equalities
+    rhs = np.concatenate([
+        risk_aversion * mean_returns[free] - cov_matrix[free] @ fixed_values,
+        targets,
+    ])
+    solution = np.linalg.lstsq(system, rhs, rcond=None)[0][:len(free)]
+    if (solution < -threshold).any() or (solution > upper[free] + threshold).any():
+        return None
+
+    candidate = fixed_values
+    candidate[free] = np.clip(solution, 0.0, upper[free])
+    return candidate
+
+def solve_batch(
+    mean_returns: np.ndarray,
+    cov_matrix: np.ndarray,
+    risk_aversions: np.ndarray,
+    constraints: Constraints,
+    start: Optional[np.ndarray] = None,
+    max_iterations: int = 5000,
+    polish_every: int = 25,
+    tolerance: float = 1e-9,
+) -> np.ndarray:
+    """Minimize 0.5 w'Cw - t mu'w over the feasible set for every t at once
+
+    All problems are stacked as rows of one matrix and advanced together with
+    accelerated projected gradient (FISTA). Every few iterations each row's
+    active set is solved exactly and accepted once it is a fixed point of the
+    projected-gradient map, which is the optimality condition. This avoids
+    FISTA's slow tail on ill-conditioned covariance matrices. Row k of the
+    result solves the problem for ``risk_aversions[k]``.
+    """
+    n = len(mean_returns)
+    rows = len(risk_aversions)
+    # Power iteration underestimates slightly, pad the Lipschitz constant to keep steps stable
+    step = 1.0 / max(_largest_eigenvalue(cov_matrix) * 1.1, 1e-18)
+    linear = risk_aversions[:, None] * mean_returns[None, :]
+
+    if start is None:
+        start = np.full((rows, n), 1.0 / n)
+    weights = constraints.project(np.broadcast_to(start, (rows, n)).copy())
+    momentum = weights.copy()
+    t = np.ones(rows)
+    pending = np.arange(rows)
+
+    for iteration in range(1, max_iterations + 1):
+        gradient = momentum[pending] @ cov_matrix - linear[pending]
+        updated = constraints.project(momentum[pending] - step * gradient)
+        t_next = (1 + np.sqrt(1 + 4 * t[pending] ** 2)) / 2
+        momentum[pending] = updated + ((t[pending] - 1) / t_next)[:, None] * (updated - weights[pending])
+        converged = np.abs(updated - weights[pending]).max(axis=1) < tolerance
+        weights[pending] = updated
+        t[pending] = t_next
+
+        if iteration % polish_every == 0:
+            for index, row in enumerate(pending):
+                if converged[index]:
+                    continue
+                candidate = _polish(weights[row], mean_returns, cov_matrix, risk_aversions[row], constraints)
+                if candidate is None:
+                    continue
+                gradient = candidate @ cov_matrix - linear[row]
+                if np.abs(constraints.project((candidate - step * gradient)[None, :])[0] - candidate).max() < tolerance:
+                    weights[row] = candidate
+                    converged[index] = True
+        pending = pending[~converged]
+        if len(pending) == 0:
+            break
+    return weights
+
+def _risk_aversion_grid(mean_returns: np.ndarray, cov_matrix: np.ndarray, points: int) -> np.ndarray:
+    # Scale the grid so the largest value lets expected return dominate the variance term
+    spread = np.ptp(mean_returns)
+    if points < 2 or spread <= 0:
+        return np.zeros(max(points, 1))
+    top = 10 * _largest_eigenvalue(cov_matrix) / spread
+    return np.concatenate([[0.0], np.geomspace(top * 1e-4, top, points - 1)])
+
+def efficient_frontier(
+    mean_returns: np.ndarray,
+    cov_matrix: np.ndarray,
+    points: int = 20,
+    max_weight: Optional[float] = None,
+    sectors: Optional[Sequence[str]] = None,
+    sector_cap: Optional[Union[float, Dict[str, float]]] = None,
+) -> Frontier:
+    """Solve `points` frontier portfolios, from minimum variance to maximum return, in one batch"""
+    mean_returns = np.asarray(mean_returns, dtype=np.float64)
+    cov_matrix = np.asarray(cov_matrix, dtype=np.float64)
+    constraints = Constraints(len(mean_returns), max_weight, sectors, sector_cap)
+    risk_aversions = _risk_aversion_grid(mean_returns, cov_matrix, points)
+    weights = solve_batch(mean_returns, cov_matrix, risk_aversions, constraints)
+    return Frontier(weights, mean_returns, cov_matrix, risk_aversions)
+
+def min_variance(
+    mean_returns: np.ndarray,
+    cov_matrix: np.ndarray,
+    max_weight: Optional[float] = None,
+    sectors: Optional[Sequence[str]] = None,
+    sector_cap: Optional[Union[float, Dict[str, float]]] = None,
+) -> np.ndarray:
+    """Minimum-variance long-only weights"""
+    mean_returns = np.asarray(mean_returns, dtype=np.float64)
+    constraints = Constraints(len(mean_returns), max_weight, sectors, sector_cap)
+    return solve_batch(mean_returns, np.asarray(cov_matrix, dtype=np.float64), np.zeros(1), constraints)[0]
+
+def max_sharpe(
+    mean_returns: np.ndarray,
+    cov_matrix: np.ndarray,
+    max_weight: Optional[float] = None,
+    sectors: Optional[Sequence[str]] = None,
+    sector_cap: Optional[Union[float, Dict[str, float]]] = None,
+    points: int = 20,
+    risk_free_rate: float = 0.0,
+) -> np.ndarray:
+    """Maximum-Sharpe long-only weights
+
+    The best point of a coarse frontier is refined with a second batch over
+    the neighbouring risk-aversion interval, warm-started from that point.
+    """
+    mean_returns = np.asarray(mean_returns, dtype=np.float64)
+    cov_matrix = np.asarray(cov_matrix, dtype=np.float64)
+    constraints = Constraints(len(mean_returns), max_weight, sectors, sector_cap)
+    grid = _risk_aversion_grid(mean_returns, cov_matrix, points)
+    frontier = Frontier(solve_batch(mean_returns, cov_matrix, grid, constraints), mean_returns, cov_matrix, grid)
+    best = int(np.argmax(frontier.sharpe_ratios(risk_free_rate)))
+    if len(grid) < 3:
+        return frontier.weights[best]
+
+    fine_grid = np.linspace(grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)], points)
+    fine = Frontier(
+        solve_batch(mean_returns, cov_matrix, fine_grid, constraints, start=frontier.weights[best]),
+        mean_returns,
+        cov_matrix,
+        fine_grid,
+    )
+    candidates = np.vstack([frontier.weights[best], fine.weights])
+    sharpe = np.concatenate([frontier.sharpe_ratios(risk_free_rate)[best:best + 1], fine.sharpe_ratios(risk_free_rate)])
+    return candidates[int(np.argmax(sharpe))]
@@ -1,10 +1,22 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
-import yfinance as yf
+import csv
+import io
+import json
+from fastapi import HTTPException, status
+from pydantic import TypeAdapter, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session, joinedload, selectinload
+from typing import Dict, List, Optional, Tuple
 import pandas as pd
 import numpy as np
+from app.db.pagination import keyset_page
 from app.models.models import Portfolio, PortfolioHolding, Stock
-from app.schemas.portfolio import PortfolioCreate, PortfolioHoldingCreate
+from app.schemas.portfolio import PortfolioCreate, PortfolioHoldingCreate, PortfolioHoldingImport
+from app.services import benchmark_series, market_data, risk_engine
+
+MARKET_PROXY = "^GSPC"
+HOLDINGS_IMPORT_COLUMNS = ["symbol", "quantity", "average_price"]
+
+_holdings_import_adapter = TypeAdapter(List[PortfolioHoldingImport])
 
 def create_portfolio(db: Session, portfolio: PortfolioCreate, user_id: int) -> Portfolio:
     """Create a new portfolio"""
@@ -18,14 +30,40 @@ def create_portfolio(db: Session, portfolio: PortfolioCreate, user_id: int) -> P
     db.refresh(db_portfolio)
     return db_portfolio
 
-def get_user_portfolios(db: Session, user_id: int) -> List[Portfolio]:
-    """Get all portfolios for a user"""
-    return db.query(Portfolio).filter(Portfolio.user_id == user_id).all()
+def get_user_portfolios(db: Session, user_id: int, limit: int, cursor: Optional[str] = None) -> Tuple[List[Portfolio], Optional[str]]:
+    """Get one page of a user's portfolios and the cursor for the next page"""
+    # PortfolioResponse serializes every holding and its stock; load them up
+    # front so a page costs three queries however many holdings it has
+    query = db.query(Portfolio).options(
+        selectinload(Portfolio.holdings).selectinload(PortfolioHolding.stock)
+    ).filter(Portfolio.user_id == user_id)
+    return keyset_page(query, Portfolio.id, limit, cursor)
+
+def get_user_portfolio_summaries(db: Session, user_id: int, limit: int, cursor: Optional[str] = None) -> Tuple[list, Optional[str]]:
+    """Get one page of a user's portfolios without their holdings"""
+    query = db.query(
+        Portfolio.id, Portfolio.user_id, Portfolio.name, Portfolio.description,
+        Portfolio.created_at, Portfolio.updated_at
+    ).filter(Portfolio.user_id == user_id)
+    return keyset_page(query, Portfolio.id, limit, cursor)
 
 def get_portfolio(db: Session, portfolio_id: int) -> Optional[Portfolio]:
     """Get a specific portfolio"""
     return db.query(Portfolio).filter(Portfolio.id == portfolio_id).first()
 
+def get_portfolio_with_holdings(db: Session, portfolio_id: int) -> Optional[Portfolio]:
+    """Get a portfolio with its holdings and their stocks loaded in one query"""
+    return db.query(Portfolio).options(
+        joinedload(Portfolio.holdings).joinedload(PortfolioHolding.stock)
+    ).filter(Portfolio.id == portfolio_id).first()
+
+def get_holdings(db: Session, portfolio_id: int, limit: int, cursor: Optional[str] = None) -> Tuple[List[PortfolioHolding], Optional[str]]:
+    """Get one page of a portfolio's holdings and the cursor for the next page"""
+    query = db.query(PortfolioHolding).options(
+        selectinload(PortfolioHolding.stock)
+    ).filter(PortfolioHolding.portfolio_id == portfolio_id)
+    return keyset_page(query, PortfolioHolding.id, limit, cursor)
+
 def add_holding(db: Session, portfolio_id: int, holding: PortfolioHoldingCreate) -> Portfolio:
     """Add a stock holding to a portfolio"""
     portfolio = get_portfolio(db, portfolio_id)
@@ -40,8 +78,78 @@ def add_holding(db: Session, portfolio_id: int, holding: PortfolioHoldingCreate)
     )
     db.add(db_holding)
     db.commit()
-    db.refresh(portfolio)
-    return portfolio
+    return get_portfolio_with_holdings(db, portfolio_id)
+
+def parse_holdings_csv(text: str) -> List[dict]:
+    """Rows of a holdings CSV with a symbol,quantity,average_price header"""
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    header = [name.strip().lower() for name in reader.fieldnames or []]
+    missing = [column for column in HOLDINGS_IMPORT_COLUMNS if column not in header]
+    if missing:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"CSV is missing columns: {', '.join(missing)}"
+        )
+    reader.fieldnames = header
+    return [{column: row[column] for column in HOLDINGS_IMPORT_COLUMNS} for row in reader]
+
+def validate_holdings_import(rows: List[dict]) -> List[PortfolioHoldingImport]:
+    """Validate every row up front, reporting all problems at once"""
+    try:
+        return _holdings_import_adapter.validate_python(rows)
+    except ValidationError as exc:
+        errors = [
+            {'row': error['loc'][0] + 1, 'field': error['loc'][-1], 'error': error['msg']}
+            for error in exc.errors(include_url=False)
+        ]
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+
+def parse_holdings_import(body: bytes, is_csv: bool) -> List[PortfolioHoldingImport]:
+    """Decode, parse and validate an import body; CPU-bound, so callers run it off the event loop"""
+    if is_csv:
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="CSV must be UTF-8 encoded")
+        rows = parse_holdings_csv(text)
+    else:
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array or CSV")
+    return validate_holdings_import(rows)
+
+def import_holdings(db: Session, portfolio_id: int, holdings: List[PortfolioHoldingImport]) -> int:
+    """Add many holdings to a portfolio in one transaction; returns the number inserted
+
+    Symbols are resolved with a single IN query and nothing is written
+    unless every symbol is known.
+    """
+    symbols = list(dict.fromkeys(holding.symbol.strip().upper() for holding in holdings))
+    stock_ids = dict(db.query(Stock.symbol, Stock.id).filter(Stock.symbol.in_(symbols)).all())
+    unknown = [symbol for symbol in symbols if symbol not in stock_ids]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown symbols: {', '.join(unknown)}"
+        )
+    
+    rows = [
+        {
+            'portfolio_id': portfolio_id,
+            'stock_id': stock_ids[holding.symbol.strip().upper()],
+            'quantity': holding.quantity,
+            'average_price': holding.average_price
+        }
+        for holding in holdings
+    ]
+    if rows:
+        # A list of parameter sets runs as one executemany
+        db.execute(insert(PortfolioHolding), rows)
+        db.commit()
+    return len(rows)
 
 def remove_holding(db: Session, portfolio_id: int, holding_id: int) -> Portfolio:
     """Remove a stock holding from a portfolio"""
@@ -57,65 +165,94 @@ def remove_holding(db: Session, portfolio_id: int, holding_id: int) -> Portfolio
     if holding:
         db.delete(holding)
         db.commit()
-        db.refresh(portfolio)
     
-    return portfolio
+    return get_portfolio_with_holdings(db, portfolio_id)
+
+def get_current_prices(panel: market_data.PricePanel, symbols: List[str]) -> Tuple[pd.Series, List[str]]:
+    """Live quote of every symbol, or the panel's latest close where there is none
+
+    The panel is only history: its newest bar may be an intraday one stored
+    earlier in the session. Returns the prices and the symbols that fell
+    back to a stored close.
+    """
+    quotes, failed = market_data.get_quotes(symbols)
+    prices = pd.Series(quotes, index=list(dict.fromkeys(symbols)), dtype=np.float64)
+    prices = prices.fillna(panel.latest())
+    return prices, sorted(symbol for symbol in failed if symbol in panel.closes.columns)
 
 def analyze_portfolio(db: Session, portfolio_id: int):
     """Analyze a portfolio's performance and provide recommendations"""
-    portfolio = get_portfolio(db, portfolio_id)
+    portfolio = get_portfolio_with_holdings(db, portfolio_id)
     if not portfolio:
         raise ValueError("Portfolio not found")
     
-    # Get current prices for all holdings
-    holdings_data = []
-    for holding in portfolio.holdings:
-        ticker = yf.Ticker(holding.stock.symbol)
-        current_price = ticker.info.get('regularMarketPrice', 0)
-        holdings_data.append({
+    holdings = portfolio.holdings
+    symbols = list(dict.fromkeys(holding.stock.symbol for holding in holdings))
+    
+    # One batch of history and one of live quotes for the distinct symbols
+    panel = market_data.get_price_panel(symbols, period="1y")
+    prices, unquoted = get_current_prices(panel, symbols)
+    
+    # Align every holding onto the panel's symbols
+    quantities = np.array([holding.quantity for holding in holdings], dtype=np.float64)
+    average_prices = np.array([holding.average_price for holding in holdings], dtype=np.float64)
+    current_prices = prices.reindex([holding.stock.symbol for holding in holdings]).fillna(0).to_numpy(dtype=np.float64)
+    sectors = [holding.stock.sector for holding in holdings]
+    
+    holdings_data = [
+        {
             'symbol': holding.stock.symbol,
             'quantity': holding.quantity,
             'average_price': holding.average_price,
-            'current_price': current_price,
+            'current_price': float(price),
             'sector': holding.stock.sector
-        })
+        }
+        for holding, price in zip(holdings, current_prices)
+    ]
     
     # Calculate portfolio metrics
-    total_value = sum(h['quantity'] * h['current_price'] for h in holdings_data)
-    total_cost = sum(h['quantity'] * h['average_price'] for h in holdings_data)
-    daily_change = sum(h['quantity'] * (h['current_price'] - h['average_price']) for h in holdings_data)
+    values = quantities * current_prices
+    costs = quantities * average_prices
+    total_value = float(values.sum())
+    total_cost = float(costs.sum())
+    daily_change = float((quantities * (current_prices - average_prices)).sum())
     daily_change_percentage = (daily_change / total_cost) * 100 if total_cost > 0 else 0
     
-    # Calculate sector allocation
-    sector_allocation = {}
-    for holding in holdings_data:
-        sector = holding['sector']
-        value = holding['quantity'] * holding['current_price']
-        sector_allocation[sector] = sector_allocation.get(sector, 0) + value
-    
-    # Normalize sector allocation to percentages
-    total = sum(sector_allocation.values())
-    sector_allocation = {k: (v / total) * 100 for k, v in sector_allocation.items()}
+    # Calculate sector allocation as percentages, in order of first appearance
+    sector_codes, sector_names = pd.factorize(pd.Series(sectors, dtype=object), use_na_sentinel=False)
+    sector_values = np.bincount(sector_codes, weights=values, minlength=len(sector_names))
+    total = sector_values.sum()
+    sector_allocation = {
+        sector: (value / total) * 100 if total else 0.0
+        for sector, value in zip(sector_names, sector_values)
+    }
     
-    # Calculate risk metrics
-    returns = []
-    for holding in holdings_data:
-        ticker = yf.Ticker(holding['symbol'])
-        hist = ticker.history(period="1y")
-        returns.append(hist['Close'].pct_change().dropna())
+    # Calculate risk metrics from the same panel
+    returns_df = panel.returns()
     
-    if returns:
-        returns_df = pd.DataFrame(returns).T
+    if not returns_df.empty:
+        returns = returns_df.to_numpy()
+        mean = np.nanmean(returns, axis=0)
+        std = np.nanstd(returns, axis=0, ddof=1)
+        symbol_codes, symbol_names = pd.factorize(pd.Series([holding.stock.symbol for holding in holdings]))
+        position_values = pd.Series(np.bincount(symbol_codes, weights=values), index=symbol_names)
+        beta, benchmark_betas, holding_betas = calculate_beta(
+            returns_df, position_values, benchmark_series.benchmarks_for(sectors)
+        )
         risk_metrics = {
-            'volatility': returns_df.std().mean() * np.sqrt(252),  # Annualized volatility
-            'sharpe_ratio': (returns_df.mean() * 252) / (returns_df.std() * np.sqrt(252)),
-            'beta': calculate_beta(returns_df)
+            'volatility': np.nanmean(std) * np.sqrt(252),  # Annualized volatility
+            'sharpe_ratio': pd.Series((mean * 252) / (std * np.sqrt(252)), index=returns_df.columns),
+            'beta': beta,
+            'benchmark_betas': benchmark_betas,
+            'holding_betas': holding_betas
         }
     else:
         risk_metrics = {
             'volatility': 0,
             'sharpe_ratio': 0,
-            'beta': 1
+            'beta': 1,
+            'benchmark_betas': {},
+            'holding_betas': {}
         }
     
     # Calculate performance metrics
@@ -128,6 +265,19 @@ def analyze_portfolio(db: Session, portfolio_id: int):
     
     # Generate recommendations
     recommendations = generate_recommendations(holdings_data, sector_allocation, risk_metrics)
+    if panel.failed:
+        recommendations.append(
+            f"Market data unavailable for {', '.join(sorted(panel.failed))}; excluded from risk metrics"
+        )
+    if unquoted:
+        recommendations.append(
+            f"Live quotes unavailable for {', '.join(unquoted)}; valued at the latest stored close"
+        )
+    if panel.stale:
+        recommendations.append(
+            "Market data provider unavailable; using stored prices for "
+            + ", ".join(f"{symbol} (as of {as_of})" for symbol, as_of in sorted(panel.stale.items()))
+        )
     
     return {
         'total_value': total_value,
@@ -139,30 +289,96 @@ def analyze_portfolio(db: Session, portfolio_id: int):
         'recommendations': recommendations
     }
 
-def calculate_beta(returns_df):
-    """Calculate portfolio beta"""
-    # Get market returns (using S&P 500 as proxy)
-    market = yf.Ticker("^GSPC")
-    market_returns = market.history(period="1y")['Close'].pct_change().dropna()
+def simulate_risk(
+    db: Session,
+    portfolio_id: int,
+    horizons: List[int],
+    confidence_levels: List[float],
+    n_paths: int,
+    method: str = "normal",
+    seed: Optional[int] = None,
+) -> dict:
+    """Monte Carlo VaR/CVaR of a portfolio's current positions"""
+    portfolio = get_portfolio_with_holdings(db, portfolio_id)
+    if not portfolio:
+        raise ValueError("Portfolio not found")
     
-    # Align dates
-    aligned_returns = returns_df.join(market_returns, how='inner')
-    portfolio_returns = aligned_returns.iloc[:, :-1].mean(axis=1)
-    market_returns = aligned_returns.iloc[:, -1]
+    holdings = portfolio.holdings
+    symbols = [holding.stock.symbol for holding in holdings]
+    panel = market_data.get_price_panel(symbols, period="1y")
     
-    # Calculate beta
-    covariance = portfolio_returns.cov(market_returns)
-    market_variance = market_returns.var()
-    beta = covariance / market_variance if market_variance != 0 else 1
+    # Net position value per symbol at the current price
+    quantities = np.array([holding.quantity for holding in holdings], dtype=np.float64)
+    prices = get_current_prices(panel, symbols)[0].reindex(symbols).to_numpy(dtype=np.float64)
+    symbol_codes, symbol_names = pd.factorize(pd.Series(symbols, dtype=object))
+    position_values = pd.Series(np.bincount(symbol_codes, weights=quantities * prices, minlength=len(symbol_names)), index=symbol_names)
     
-    return beta
+    result = risk_engine.value_at_risk(
+        panel.returns(), position_values.dropna(), horizons, confidence_levels, n_paths, method, seed
+    )
+    result['excluded'] = sorted(panel.failed)
+    result['stale'] = panel.stale
+    return result
+
+def calculate_beta(returns_df, position_values, benchmarks):
+    """Value-weighted portfolio beta against the market proxy, plus portfolio and per-holding betas for each benchmark"""
+    benchmark_returns = benchmark_series.cache.get_returns(list(benchmarks.values()))
+    if benchmark_returns.empty:
+        return 1, {}, {}
+    
+    betas = benchmark_series.calculate_betas(returns_df, benchmark_returns)
+    portfolio = benchmark_series.portfolio_betas(betas, position_values)
+    names = {symbol: name for name, symbol in benchmarks.items()}
+    
+    def clean(value):
+        return None if np.isnan(value) else float(value)
+    
+    benchmark_betas = {names[symbol]: clean(value) for symbol, value in portfolio.items()}
+    holding_betas = {
+        symbol: {names[benchmark]: clean(value) for benchmark, value in row.items()}
+        for symbol, row in betas.iterrows()
+    }
+    market_beta = portfolio.get(MARKET_PROXY, np.nan)
+    return (1 if np.isnan(market_beta) else float(market_beta)), benchmark_betas, holding_betas
+
+class LiveValuation:
+    """Running value of a portfolio, updated by per-symbol price deltas as quotes arrive
+
+    Figures follow analyze_portfolio: symbols without a quote yet count at a
+    price of 0 and daily_change is measured against the cost basis.
+    """
+
+    def __init__(self, holdings: List[PortfolioHolding]):
+        self.quantities: Dict[str, float] = {}
+        self.cost = 0.0
+        for holding in holdings:
+            symbol = holding.stock.symbol
+            self.quantities[symbol] = self.quantities.get(symbol, 0.0) + holding.quantity
+            self.cost += holding.quantity * holding.average_price
+        self.prices: Dict[str, float] = {}
+        self.total_value = 0.0
+
+    def apply(self, quotes: Dict[str, float]) -> dict:
+        """Fold new prices into the running value and return the updated figures"""
+        for symbol, price in quotes.items():
+            quantity = self.quantities.get(symbol)
+            if quantity is None:
+                continue
+            self.total_value += quantity * (price - self.prices.get(symbol, 0.0))
+            self.prices[symbol] = price
+        daily_change = self.total_value - self.cost
+        return {
+            'total_value': self.total_value,
+            'daily_change': daily_change,
+            'daily_change_percentage': (daily_change / self.cost) * 100 if self.cost > 0 else 0
+        }
 
 def generate_recommendations(holdings_data, sector_allocation, risk_metrics):
     """Generate portfolio recommendations"""
     recommendations = []
     
     # Check sector concentration
-    max_sector_weight = max(sector_allocation.values())
+    max_sector_weight = max(sector_allocation.values(), default=0)
     if max_sector_weight > 50:
         recommendations.append("Consider reducing exposure to concentrated sectors for better diversification")
     
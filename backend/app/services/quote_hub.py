@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional, Set
+from app.core import metrics
+from app.core.config import settings
+from app.services import market_data
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """A client's view of the hub: the quotes that changed since it last asked"""
+
+    def __init__(self, hub: "QuoteHub", symbols: Set[str]):
+        self.hub = hub
+        self.symbols = symbols
+        self._changed: Dict[str, float] = {}
+        self._event = asyncio.Event()
+
+    def _push(self, symbol: str, price: float):
+        # Only the newest price per symbol is kept, so a slow client never builds a backlog
+        self._changed[symbol] = price
+        self._event.set()
+
+    async def next(self, timeout: Optional[float] = None) -> Dict[str, float]:
+        """Wait for at least one changed quote; returns {} if `timeout` passes first"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self._event.clear()
+        changed, self._changed = self._changed, {}
+        return changed
+
+    async def __aenter__(self) -> "Subscription":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.hub.unsubscribe(self)
+
+class QuoteHub:
+    """Latest prices for subscribed symbols, with one upstream poller per symbol
+
+    Pollers are started by the first subscriber to a symbol and cancelled
+    when the last one leaves, so upstream traffic depends on the number of
+    distinct symbols watched, not on the number of clients. Must be used
+    from the event loop thread.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.prices: Dict[str, float] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self.upstream_fetches = 0
+        self.upstream_errors = 0
+
+    def subscribe(self, symbols: Iterable[str]) -> Subscription:
+        subscription = Subscription(self, set(symbols))
+        for symbol in subscription.symbols:
+            self._subscribers.setdefault(symbol, set()).add(subscription)
+            if symbol in self.prices:
+                subscription._push(symbol, self.prices[symbol])
+            if symbol not in self._pollers:
+                self._pollers[symbol] = asyncio.create_task(self._poll(symbol), name=f"quote-poller-{symbol}")
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for symbol in subscription.symbols:
+            subscribers = self._subscribers.get(symbol)
+            if subscribers is None:
+                continue
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[symbol]
+                self._pollers.pop(symbol).cancel()
+                self.prices.pop(symbol, None)
+
+    async def _poll(self, symbol: str):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                price = await loop.run_in_executor(None, market_data.get_quote, symbol)
+                self.upstream_fetches += 1
+            except Exception as exc:
+                self.upstream_errors += 1
+                logger.warning("Quote for %s failed: %s", symbol, exc)
+                price = None
+            if price is not None and price != self.prices.get(symbol):
+                self.prices[symbol] = price
+                for subscription in self._subscribers.get(symbol, ()):
+                    subscription._push(symbol, price)
+            await asyncio.sleep(self.interval)
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._pollers),
+            "subscriptions": len({id(s) for subscribers in self._subscribers.values() for s in subscribers}),
+            "upstream_fetches": self.upstream_fetches,
+            "upstream_errors": self.upstream_errors,
+        }
+
+hub = QuoteHub(settings.QUOTE_POLL_SECONDS)
+metrics.register("quote_hub", hub.stats)
@@ -0,0 +1,112 @@
+import argparse
+import logging
+import threading
+from datetime import datetime, time, timedelta, timezone
+from typing import Callable, List, Optional, Tuple
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.services import benchmark_series, constituent_sync, nav_history, stock_service
+
+logger = logging.getLogger(__name__)
+
+class DailyScheduler:
+    """Runs registered jobs once per trading day (Monday to Friday) at a fixed UTC time
+
+    Jobs run one after another on a single daemon thread. A failing job is
+    logged and does not stop the others or later runs.
+    """
+
+    def __init__(self, run_at: time):
+        self.run_at = run_at
+        self.jobs: List[Tuple[str, Callable[[], None]]] = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_run: Optional[datetime] = None
+
+    def add_job(self, name: str, job: Callable[[], None]):
+        self.jobs.append((name, job))
+
+    def next_run(self, now: datetime) -> datetime:
+        """First weekday slot at `run_at` strictly after now"""
+        candidate = datetime.combine(now.date(), self.run_at, tzinfo=timezone.utc)
+        if candidate <= now:
+            candidate += timedelta(days=1)
+        while candidate.weekday() >= 5:
+            candidate += timedelta(days=1)
+        return candidate
+
+    def run_once(self):
+        for name, job in self.jobs:
+            started = datetime.now(timezone.utc)
+            try:
+                job()
+                logger.info("Scheduled job %s finished in %.1fs", name, (datetime.now(timezone.utc) - started).total_seconds())
+            except Exception:
+                logger.exception("Scheduled job %s failed", name)
+        self.last_run = datetime.now(timezone.utc)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            now = datetime.now(timezone.utc)
+            if self._stop.wait((self.next_run(now) - now).total_seconds()):
+                break
+            self.run_once()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="daily-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+def sync_constituents():
+    """Refresh the stock list and fundamentals before anything reads them"""
+    db = SessionLocal()
+    try:
+        constituent_sync.sync(db)
+    finally:
+        db.close()
+
+def refresh_recommendations():
+    """Regenerate every stock's recommendation in bulk"""
+    db = SessionLocal()
+    try:
+        stored = stock_service.refresh_stock_recommendations(db)
+        logger.info("Stored %d recommendations", stored)
+    finally:
+        db.close()
+
+def materialize_valuations():
+    """Append the new days of every portfolio's valuation history"""
+    db = SessionLocal()
+    try:
+        nav_history.materialize(db)
+    finally:
+        db.close()
+
+scheduler = DailyScheduler(time.fromisoformat(settings.SCHEDULER_RUN_AT))
+scheduler.add_job("constituents", sync_constituents)
+scheduler.add_job("benchmarks", benchmark_series.cache.refresh)
+scheduler.add_job("recommendations", refresh_recommendations)
+scheduler.add_job("valuations", materialize_valuations)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the daily precomputation jobs")
+    parser.add_argument("--daemon", action="store_true", help="keep running and fire after every trading day")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.daemon:
+        scheduler.start()
+        try:
+            while scheduler._thread.is_alive():
+                scheduler._thread.join(timeout=1)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    else:
+        scheduler.run_once()
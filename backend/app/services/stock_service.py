@@ -1,96 +1,176 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
-import yfinance as yf
+from datetime import datetime, timedelta, timezone
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
-from app.models.models import Stock, StockView, StockRecommendation
+from app.db.upsert import upsert_statement
+from app.models.models import Stock, StockRecommendation
 from app.core.config import settings
+from app.services import backtest, covariance, indicators, market_data, optimizer, view_quota
 
 def get_qtop_holdings(db: Session) -> List[Stock]:
     """Get all stocks in QTOP ETF"""
     return db.query(Stock).all()
 
+async def fetch_qtop_holdings(db: AsyncSession) -> List[Stock]:
+    """Get all stocks in QTOP ETF without blocking the event loop"""
+    result = await db.execute(select(Stock))
+    return list(result.scalars().all())
+
 def get_stock_by_symbol(db: Session, symbol: str) -> Optional[Stock]:
     """Get stock by symbol"""
     return db.query(Stock).filter(Stock.symbol == symbol).first()
 
 def get_user_stock_views_count(db: Session, user_id: int) -> int:
     """Get count of stocks viewed by user"""
-    return db.query(StockView).filter(StockView.user_id == user_id).count()
+    return view_quota.get_view_count(db, user_id)
 
 def record_stock_view(db: Session, user_id: int, stock_id: int):
-    """Record a stock view"""
-    view = StockView(user_id=user_id, stock_id=stock_id)
-    db.add(view)
-    db.commit()
+    """Record a stock view; it reaches stock_views with the next background flush"""
+    view_quota.recorder.record(user_id, stock_id)
+
+def get_stock_recommendation(db: Session, stock_id: int, max_age_hours: Optional[int] = None) -> Optional[StockRecommendation]:
+    """Get the latest recommendation for a stock, or None if it is older than the TTL"""
+    recommendation = db.query(StockRecommendation).filter(
+        StockRecommendation.stock_id == stock_id,
+        StockRecommendation.model_version == settings.RECOMMENDATION_MODEL_VERSION
+    ).order_by(
+        StockRecommendation.as_of.desc(),
+        StockRecommendation.created_at.desc()
+    ).first()
+    if recommendation is None:
+        return None
+    
+    max_age_hours = settings.RECOMMENDATION_TTL_HOURS if max_age_hours is None else max_age_hours
+    created_at = recommendation.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - created_at > timedelta(hours=max_age_hours):
+        return None
+    return recommendation
 
-def get_stock_recommendation(db: Session, stock_id: int) -> Optional[StockRecommendation]:
-    """Get existing recommendation for a stock"""
-    return db.query(StockRecommendation).filter(StockRecommendation.stock_id == stock_id).first()
+def _recommendation_upsert(db: Session):
+    return upsert_statement(
+        db, StockRecommendation,
+        conflict_columns=['stock_id', 'as_of', 'model_version'],
+        update_columns=['recommendation_type', 'confidence_score', 'analysis_summary', 'created_at']
+    )
 
 def generate_stock_recommendation(db: Session, stock: Stock) -> StockRecommendation:
     """Generate AI-powered recommendation for a stock"""
-    # Get historical data
-    ticker = yf.Ticker(stock.symbol)
-    hist = ticker.history(period="1y")
-    
-    # Calculate technical indicators
-    hist['SMA_20'] = hist['Close'].rolling(window=20).mean()
-    hist['SMA_50'] = hist['Close'].rolling(window=50).mean()
-    hist['RSI'] = calculate_rsi(hist['Close'])
+    # Get technical indicators, updated incrementally from the newest bars
+    state = indicators.get_engine().latest(stock.symbol, period="1y")
+    latest = state.values()
     
     # Generate recommendation based on technical analysis
-    current_price = hist['Close'].iloc[-1]
-    sma_20 = hist['SMA_20'].iloc[-1]
-    sma_50 = hist['SMA_50'].iloc[-1]
-    rsi = hist['RSI'].iloc[-1]
+    current_price = latest['Close']
+    sma_20 = latest['SMA_20']
+    sma_50 = latest['SMA_50']
+    rsi = latest['RSI']
     
     # Simple recommendation logic (can be enhanced with ML models)
-    if current_price > sma_20 and sma_20 > sma_50 and rsi < 70:
+    if current_price > sma_20 and sma_20 > sma_50 and rsi < indicators.RSI_OVERBOUGHT:
         recommendation_type = "buy"
-        confidence_score = 0.8
-    elif current_price < sma_20 and sma_20 < sma_50 and rsi > 30:
+        confidence_score = indicators.SIGNAL_CONFIDENCE
+    elif current_price < sma_20 and sma_20 < sma_50 and rsi > indicators.RSI_OVERSOLD:
         recommendation_type = "sell"
-        confidence_score = 0.8
+        confidence_score = indicators.SIGNAL_CONFIDENCE
     else:
         recommendation_type = "hold"
-        confidence_score = 0.6
-    
-    # Create recommendation
-    recommendation = StockRecommendation(
-        stock_id=stock.id,
-        recommendation_type=recommendation_type,
-        confidence_score=confidence_score,
-        analysis_summary=f"Technical analysis suggests {recommendation_type}ing {stock.symbol}"
-    )
+        confidence_score = indicators.HOLD_CONFIDENCE
     
-    db.add(recommendation)
+    # Create recommendation; a worker that already stored one for the same
+    # trading day gets its row refreshed instead of a duplicate
+    db.execute(_recommendation_upsert(db), [{
+        'stock_id': stock.id,
+        'recommendation_type': recommendation_type,
+        'confidence_score': confidence_score,
+        'analysis_summary': f"Technical analysis suggests {recommendation_type}ing {stock.symbol}",
+        'as_of': state.last_date,
+        'model_version': settings.RECOMMENDATION_MODEL_VERSION,
+        'created_at': datetime.now(timezone.utc)
+    }])
     db.commit()
-    db.refresh(recommendation)
-    return recommendation
+    return db.query(StockRecommendation).filter(
+        StockRecommendation.stock_id == stock.id,
+        StockRecommendation.as_of == state.last_date,
+        StockRecommendation.model_version == settings.RECOMMENDATION_MODEL_VERSION
+    ).order_by(StockRecommendation.id.desc()).first()
+
+def backtest_recommendations(
+    db: Session,
+    period: str = "5y",
+    params: backtest.RuleParams = backtest.RuleParams(),
+    horizon: int = 20,
+    cost_bps: float = 0.0,
+    short: bool = False,
+) -> dict:
+    """Replay the recommendation rule over the history of every QTOP stock"""
+    panel = market_data.get_price_panel([stock.symbol for stock in get_qtop_holdings(db)], period=period)
+    result = backtest.run(panel.closes, params, horizon, cost_bps, short)
+    result['excluded'] = sorted(panel.failed)
+    result['stale'] = panel.stale
+    return result
+
+def sweep_recommendation_rule(
+    db: Session,
+    grid: List[backtest.RuleParams],
+    period: str = "5y",
+    horizon: int = 20,
+    cost_bps: float = 0.0,
+    short: bool = False,
+) -> List[dict]:
+    """Backtest every parameter set in grid over the QTOP stocks, best Sharpe ratio first"""
+    panel = market_data.get_price_panel([stock.symbol for stock in get_qtop_holdings(db)], period=period)
+    return backtest.sweep(panel.closes, grid, horizon, cost_bps, short)
+
+def refresh_stock_recommendations(db: Session) -> int:
+    """Regenerate recommendations for every QTOP stock in one vectorized pass; returns how many were stored"""
+    stocks = get_qtop_holdings(db)
+    panel = market_data.get_price_panel([stock.symbol for stock in stocks], period="1y")
+    signals = indicators.compute_signals(panel.closes)
+    created_at = datetime.now(timezone.utc)
+    
+    recommendations = []
+    for stock in stocks:
+        if stock.symbol not in signals.index:
+            continue
+        signal = signals.loc[stock.symbol]
+        recommendations.append({
+            'stock_id': stock.id,
+            'recommendation_type': signal['recommendation_type'],
+            'confidence_score': float(signal['confidence_score']),
+            'analysis_summary': f"Technical analysis suggests {signal['recommendation_type']}ing {stock.symbol}",
+            'as_of': panel.closes[stock.symbol].last_valid_index().date(),
+            'model_version': settings.RECOMMENDATION_MODEL_VERSION,
+            'created_at': created_at
+        })
+    
+    # Rerunning on the same trading day refreshes that day's rows
+    if recommendations:
+        db.execute(_recommendation_upsert(db), recommendations)
+        db.commit()
+    return len(recommendations)
 
 def generate_portfolio_recommendation(db: Session, user_id: int):
     """Generate AI-powered portfolio recommendations"""
     # Get all QTOP stocks
     stocks = get_qtop_holdings(db)
     
-    # Get historical data for all stocks
-    stock_data = {}
-    for stock in stocks:
-        ticker = yf.Ticker(stock.symbol)
-        hist = ticker.history(period="1y")
-        stock_data[stock.symbol] = {
-            'returns': hist['Close'].pct_change().dropna(),
-            'market_cap': stock.market_cap
-        }
+    # Get historical data for all stocks in one batch
+    panel = market_data.get_price_panel([stock.symbol for stock in stocks], period="1y")
+    market_caps = {stock.symbol: stock.market_cap for stock in stocks}
     
-    # Calculate correlation matrix
-    returns_df = pd.DataFrame({symbol: data['returns'] for symbol, data in stock_data.items()})
-    correlation_matrix = returns_df.corr()
+    # Calculate correlation matrix (shared with the optimizer and risk calculations below)
+    returns_df = panel.returns()
+    _, _, correlation_matrix = covariance.get_moments(returns_df)
     
     # Calculate optimal portfolio weights using Modern Portfolio Theory
-    weights = calculate_optimal_weights(returns_df, correlation_matrix)
+    sectors = {stock.symbol: stock.sector for stock in stocks}
+    weights = calculate_optimal_weights(returns_df, correlation_matrix, sectors)
     
     # Calculate portfolio metrics
     portfolio_return = calculate_portfolio_return(returns_df, weights)
@@ -102,14 +182,16 @@ def generate_portfolio_recommendation(db: Session, user_id: int):
             {
                 'symbol': symbol,
                 'weight': weight,
-                'market_cap': stock_data[symbol]['market_cap']
+                'market_cap': market_caps[symbol]
             }
             for symbol, weight in weights.items()
         ],
         'allocation': weights,
         'risk_score': portfolio_risk,
         'expected_return': portfolio_return,
-        'analysis_summary': "Portfolio optimized for risk-adjusted returns using Modern Portfolio Theory"
+        'analysis_summary': "Portfolio optimized for risk-adjusted returns using Modern Portfolio Theory",
+        'unavailable_symbols': panel.failed,
+        'stale_symbols': panel.stale
     }
     
     return recommendation
@@ -122,31 +204,41 @@ def calculate_rsi(prices, period=14):
     rs = gain / loss
     return 100 - (100 / (1 + rs))
 
-def calculate_optimal_weights(returns_df, correlation_matrix):
-    """Calculate optimal portfolio weights using Modern Portfolio Theory"""
+def calculate_optimal_weights(returns_df, correlation_matrix, sectors=None):
+    """Calculate maximum-Sharpe portfolio weights using Modern Portfolio Theory"""
     # Calculate mean returns and covariance matrix
-    mean_returns = returns_df.mean()
-    cov_matrix = returns_df.cov()
+    mean_returns, cov_matrix, _ = covariance.get_moments(returns_df)
     
-    # Set up optimization problem
-    n_assets = len(returns_df.columns)
-    weights = np.random.random(n_assets)
-    weights = weights / np.sum(weights)
+    # Assets without enough history to estimate their moments get no weight
+    usable = mean_returns.notna() & pd.Series(np.diag(cov_matrix), index=cov_matrix.index).notna()
+    symbols = list(mean_returns.index[usable])
+    weights = {symbol: 0.0 for symbol in returns_df.columns}
+    if not symbols:
+        return weights
     
-    # Calculate portfolio metrics
-    portfolio_return = np.sum(mean_returns * weights)
-    portfolio_risk = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights)))
-    
-    # Return weights as dictionary
-    return {symbol: weight for symbol, weight in zip(returns_df.columns, weights)}
+    # Solve the long-only problem with the configured position and sector caps.
+    # With too few usable assets for the position cap to reach 100%, it is
+    # loosened to the equal weight instead of making the problem infeasible
+    max_weight = settings.OPTIMIZER_MAX_WEIGHT
+    if max_weight is not None:
+        max_weight = max(max_weight, 1 / len(symbols))
+    optimal = optimizer.max_sharpe(
+        mean_returns[symbols].to_numpy(),
+        cov_matrix.loc[symbols, symbols].fillna(0).to_numpy(),
+        max_weight=max_weight,
+        sectors=[sectors.get(symbol) for symbol in symbols] if sectors else None,
+        sector_cap=settings.OPTIMIZER_SECTOR_CAP if sectors else None
+    )
+    weights.update(zip(symbols, optimal))
+    return weights
 
 def calculate_portfolio_return(returns_df, weights):
     """Calculate expected portfolio return"""
-    mean_returns = returns_df.mean()
+    mean_returns, _, _ = covariance.get_moments(returns_df)
     return np.sum(mean_returns * np.array(list(weights.values())))
 
 def calculate_portfolio_risk(returns_df, weights, correlation_matrix):
     """Calculate portfolio risk"""
-    cov_matrix = returns_df.cov()
+    _, cov_matrix, _ = covariance.get_moments(returns_df)
     weights_array = np.array(list(weights.values()))
     return np.sqrt(np.dot(weights_array.T, np.dot(cov_matrix, weights_array))) 
\ No newline at end of file
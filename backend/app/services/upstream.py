@@ -0,0 +1,172 @@
+"""Guard rails around the remote market data provider
+
+Every call to the upstream source goes through UpstreamClient, which spends
+from one process-wide requests-per-second budget, bounds each call with a
+timeout and trips a circuit breaker after repeated failures. While the
+breaker is open calls fail immediately with CircuitOpen, so the price store
+can fall back to the last bars it has instead of waiting on a dead upstream.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import date
+from typing import Optional
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+class UpstreamUnavailable(Exception):
+    """The upstream provider could not serve a call"""
+
+class CircuitOpen(UpstreamUnavailable):
+    """Raised without calling upstream while the breaker is open"""
+
+class UpstreamTimeout(UpstreamUnavailable):
+    """The call did not finish within its timeout"""
+
+class RateLimited(UpstreamUnavailable):
+    """No request budget became available within the call's timeout"""
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average with bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout: float) -> bool:
+        """Take one token, waiting up to timeout seconds for it; False if none came"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one trial call through after `reset_timeout`"""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            # Open, or half-open with the trial call still running
+            return False
+
+    def cancel_trial(self):
+        """Give back a half-open trial that never reached upstream"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning("Upstream circuit opened after %d failures", self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+class UpstreamClient:
+    """Wraps a MarketDataProvider with the rate limit, timeouts and circuit breaker"""
+
+    def __init__(self, provider, rate: float, burst: int, failure_threshold: int, reset_timeout: float, max_workers: int):
+        self.provider = provider
+        self.name = provider.name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        # Calls run here so a hung request is abandoned at its timeout instead
+        # of holding the caller; the pool bounds how many can pile up
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+        self.calls = 0
+        self.failures = 0
+        self.rejected = 0
+
+    def call(self, fn, *args, timeout: Optional[float] = None):
+        """Run fn(*args, timeout=timeout) against upstream under the budget, timeout and breaker"""
+        timeout = timeout or settings.MARKET_DATA_TIMEOUT_SECONDS
+        if not self.breaker.allow():
+            self.rejected += 1
+            raise CircuitOpen(f"{self.name} circuit is open")
+        if not self.bucket.acquire(timeout):
+            # Our own budget, not an upstream failure: leave the breaker alone
+            self.breaker.cancel_trial()
+            self.rejected += 1
+            raise RateLimited(f"{self.name} request budget exhausted")
+
+        self.calls += 1
+        future = self._executor.submit(fn, *args, timeout=timeout)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise UpstreamTimeout(f"{self.name} did not answer within {timeout:.1f}s")
+        except Exception as exc:
+            self.failures += 1
+            self.breaker.record_failure()
+            raise UpstreamUnavailable(f"{self.name}: {exc}") from exc
+        self.breaker.record_success()
+        return result
+
+    def fetch_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None):
+        return self.call(self.provider.fetch_history, symbol, start, end, timeout=timeout)
+
+    def fetch_quote(self, symbol: str, timeout: Optional[float] = None) -> Optional[float]:
+        return self.call(self.provider.fetch_quote, symbol, timeout=timeout)
+
+    def stats(self) -> dict:
+        return {
+            "provider": self.name,
+            "breaker": self.breaker.state,
+            "times_opened": self.breaker.times_opened,
+            "calls": self.calls,
+            "failures": self.failures,
+            "rejected": self.rejected,
+        }
+
+def create_client(provider) -> UpstreamClient:
+    """Wrap provider using the MARKET_DATA_* limits and register its stats"""
+    client = UpstreamClient(
+        provider,
+        rate=settings.MARKET_DATA_RATE_LIMIT_PER_SECOND,
+        burst=settings.MARKET_DATA_RATE_LIMIT_BURST,
+        failure_threshold=settings.MARKET_DATA_BREAKER_FAILURES,
+        reset_timeout=settings.MARKET_DATA_BREAKER_RESET_SECONDS,
+        max_workers=settings.MARKET_DATA_MAX_WORKERS,
+    )
+    metrics.register("upstream", client.stats)
+    return client
@@ -0,0 +1,155 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, Set
+from sqlalchemy import func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.core import metrics
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.models import StockView, StockViewQuota
+
+logger = logging.getLogger(__name__)
+
+# Users known to be at the free tier limit. Counters only ever grow, so an
+# entry stays valid until the process restarts.
+_exhausted: Set[int] = set()
+_exhausted_lock = threading.Lock()
+
+def _mark_exhausted(user_id: int):
+    with _exhausted_lock:
+        _exhausted.add(user_id)
+
+def get_view_count(db: Session, user_id: int) -> int:
+    """Views counted against the user's quota, creating the counter from stock_views on first use"""
+    count = db.query(StockViewQuota.view_count).filter(StockViewQuota.user_id == user_id).scalar()
+    if count is not None:
+        return count
+
+    count = db.query(func.count(StockView.id)).filter(StockView.user_id == user_id).scalar()
+    db.add(StockViewQuota(user_id=user_id, view_count=count))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker created the counter first; theirs is authoritative
+        db.rollback()
+        count = db.query(StockViewQuota.view_count).filter(StockViewQuota.user_id == user_id).scalar()
+    return count
+
+def is_exhausted(user_id: int) -> bool:
+    """True if this process has already seen the user reach the limit; never queries the database"""
+    return user_id in _exhausted
+
+def _increment(db: Session, user_id: int, limit: int) -> bool:
+    result = db.execute(
+        update(StockViewQuota)
+        .where(StockViewQuota.user_id == user_id, StockViewQuota.view_count < limit)
+        .values(view_count=StockViewQuota.view_count + 1)
+    )
+    return result.rowcount == 1
+
+def consume(db: Session, user_id: int, limit: int) -> bool:
+    """Atomically count one view against the quota; False if the limit was already reached
+
+    The conditional UPDATE is evaluated by the database, so concurrent
+    requests on any number of workers can never push a counter past `limit`.
+    A view normally costs that one UPDATE and its commit; the counter is only
+    read (and created on first use) when the UPDATE matches no row.
+    """
+    if user_id in _exhausted:
+        return False
+    counted = _increment(db, user_id, limit)
+    if not counted and get_view_count(db, user_id) < limit:
+        # The counter did not exist yet and has just been created
+        counted = _increment(db, user_id, limit)
+    db.commit()
+    if not counted:
+        _mark_exhausted(user_id)
+    return counted
+
+class ViewRecorder:
+    """Buffers stock view events and writes them to stock_views in batches from a background thread
+
+    The view log is not used for quota enforcement, so a crash can lose at
+    most one flush interval of history but never lets a user exceed the limit.
+    """
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._buffer: List[dict] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.recorded = 0
+        self.flushed = 0
+        self.failed_flushes = 0
+
+    def record(self, user_id: int, stock_id: int):
+        with self._lock:
+            self._buffer.append({"user_id": user_id, "stock_id": stock_id, "viewed_at": datetime.now(timezone.utc)})
+            self.recorded += 1
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Insert everything buffered so far in one executemany; returns the number of rows written"""
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(StockView), rows)
+            db.commit()
+        except Exception:
+            db.rollback()
+            logger.exception("Failed to flush %d stock views, will retry", len(rows))
+            with self._lock:
+                self._buffer[:0] = rows
+                self.failed_flushes += 1
+            return 0
+        finally:
+            db.close()
+
+        with self._lock:
+            self.flushed += len(rows)
+        return len(rows)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="stock-view-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            buffered = len(self._buffer)
+        return {
+            "buffered": buffered,
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "failed_flushes": self.failed_flushes,
+            "exhausted_users": len(_exhausted),
+        }
+
+recorder = ViewRecorder(settings.VIEW_FLUSH_INTERVAL_SECONDS, settings.VIEW_FLUSH_BATCH_SIZE)
+metrics.register("stock_views", recorder.stats)
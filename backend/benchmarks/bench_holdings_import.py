@@ -0,0 +1,77 @@
+"""Throughput of the bulk holdings import against one add_holding call per row
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_holdings_import --rows 10000
+"""
+import argparse
+import time
+import numpy as np
+from benchmarks import server, synthetic
+
+server.temporary_environment()
+
+from app.db.base_class import Base
+from app.db.session import SessionLocal, engine
+from app.models.models import Portfolio, Stock, User
+from app.schemas.portfolio import PortfolioHoldingCreate
+from app.services import portfolio_service
+
+def make_csv(symbols, rows: int, seed: int = 0) -> str:
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(symbols), rows)
+    quantities = rng.integers(1, 500, rows)
+    prices = rng.uniform(5, 500, rows).round(2)
+    lines = ["symbol,quantity,average_price"]
+    lines += [f"{symbols[i]},{q},{p}" for i, q, p in zip(picks, quantities, prices)]
+    return "\n".join(lines) + "\n"
+
+def new_portfolio(db, name: str) -> int:
+    user = db.query(User).first()
+    portfolio = Portfolio(user_id=user.id, name=name)
+    db.add(portfolio)
+    db.commit()
+    return portfolio.id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--baseline-rows", type=int, default=500, help="rows imported one add_holding call at a time")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+    symbols = synthetic.symbols(args.symbols)
+    db = SessionLocal()
+    try:
+        db.add_all([Stock(symbol=symbol, name=symbol, sector="Synthetic", industry="Synthetic", market_cap=1e9) for symbol in symbols])
+        db.add(User(email="import@example.com", full_name="Import", hashed_password="-"))
+        db.commit()
+        stock_ids = dict(db.query(Stock.symbol, Stock.id).all())
+        text = make_csv(symbols, args.rows)
+
+        portfolio_id = new_portfolio(db, "bulk")
+        start = time.perf_counter()
+        rows = portfolio_service.parse_holdings_csv(text)
+        holdings = portfolio_service.validate_holdings_import(rows)
+        parsed = time.perf_counter()
+        imported = portfolio_service.import_holdings(db, portfolio_id, holdings)
+        done = time.perf_counter()
+        print(f"bulk import: {imported} rows in {(done - start) * 1000:.0f} ms "
+              f"(parse+validate {(parsed - start) * 1000:.0f} ms, insert {(done - parsed) * 1000:.0f} ms), "
+              f"{imported / (done - start):,.0f} rows/s")
+
+        portfolio_id = new_portfolio(db, "one by one")
+        sample = holdings[:args.baseline_rows]
+        start = time.perf_counter()
+        for holding in sample:
+            portfolio_service.add_holding(db, portfolio_id, PortfolioHoldingCreate(
+                stock_id=stock_ids[holding.symbol], quantity=holding.quantity, average_price=holding.average_price
+            ))
+        elapsed = time.perf_counter() - start
+        print(f"add_holding:  {len(sample)} rows in {elapsed * 1000:.0f} ms, {len(sample) / elapsed:,.0f} rows/s")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
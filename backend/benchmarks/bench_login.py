@@ -0,0 +1,90 @@
+"""Login throughput and event loop responsiveness during a burst of /api/auth/token calls
+
+Registers a set of users, then fires concurrent logins while probing `/`
+to show whether bcrypt work is stalling other requests. Run from the
+backend directory:
+
+    python -m benchmarks.bench_login --rounds 12 --workers 2
+
+The app is imported inside main() because the password pool spawns worker
+processes that re-import this module.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from collections import Counter
+import httpx
+from benchmarks import server
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument("--workers", type=int, default=2, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--max-pending", type=int, default=32, help="PASSWORD_HASH_MAX_PENDING")
+    parser.add_argument("--port", type=int, default=8766)
+    return parser.parse_args()
+
+PASSWORD = "correct horse battery staple"
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event) -> list:
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        (await client.get("/")).raise_for_status()
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+    return latencies
+
+async def run(args):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", timeout=300) as client:
+        emails = [f"user{i}@example.com" for i in range(args.users)]
+        for email in emails:
+            response = await client.post("/api/auth/register", json={"email": email, "full_name": email, "password": PASSWORD})
+            response.raise_for_status()
+
+        statuses = Counter()
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def login(i):
+            async with semaphore:
+                response = await client.post("/api/auth/token", data={"username": emails[i % len(emails)], "password": PASSWORD})
+                statuses[response.status_code] += 1
+
+        stop = asyncio.Event()
+        probing = asyncio.create_task(probe(client, stop))
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(args.logins)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        latencies = sorted(await probing)
+
+    print(f"bcrypt rounds={args.rounds} workers={args.workers} max pending={args.max_pending}")
+    print(f"{args.logins} logins in {elapsed:.2f}s: {statuses[200] / elapsed:.1f} successful logins/s, statuses {dict(statuses)}")
+    if latencies:
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"GET / during burst: n={len(latencies)} p50={statistics.median(latencies):.1f} ms p99={p99:.1f} ms")
+
+def main():
+    args = parse_args()
+    server.temporary_environment(
+        BCRYPT_ROUNDS=args.rounds,
+        PASSWORD_HASH_WORKERS=args.workers,
+        PASSWORD_HASH_MAX_PENDING=args.max_pending,
+    )
+    from app.db.base_class import Base
+    from app.db.session import engine
+    from app.main import app
+
+    Base.metadata.create_all(engine)
+    uvicorn_server = server.serve(app, args.port)
+    try:
+        asyncio.run(run(args))
+    finally:
+        uvicorn_server.should_exit = True
+
+if __name__ == "__main__":
+    main()
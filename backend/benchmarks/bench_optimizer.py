@@ -0,0 +1,51 @@
+"""Benchmark the mean-variance optimizer on synthetic factor-model returns
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_optimizer
+"""
+import argparse
+import time
+import numpy as np
+from app.services import optimizer
+
+def synthetic_moments(n_assets: int, n_days: int = 252, n_sectors: int = 11, seed: int = 0):
+    """Mean returns and covariance of a three-factor model with sector labels"""
+    rng = np.random.default_rng(seed)
+    factors = rng.normal(0, 0.01, (n_days, 3))
+    loadings = rng.normal(1, 0.3, (n_assets, 3)) / 2
+    returns = factors @ loadings.T + rng.normal(0.0004, 0.015, (n_days, n_assets))
+    sectors = [f"Sector {i % n_sectors}" for i in range(n_assets)]
+    return returns.mean(axis=0), np.cov(returns, rowvar=False), sectors
+
+def best_of(repeat: int, fn, *args, **kwargs) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--assets", type=int, nargs="+", default=[10, 100, 300])
+    parser.add_argument("--points", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'assets':>6} {'constraints':<22} {'min-var ms':>10} {'max-sharpe ms':>13} {'frontier ms':>11}")
+    for n_assets in args.assets:
+        mean_returns, cov_matrix, sectors = synthetic_moments(n_assets)
+        max_weight = max(0.05, 2.0 / n_assets)
+        for label, kwargs in (
+            ("long-only", {}),
+            ("max weight", {"max_weight": max_weight}),
+            ("max weight + sector", {"max_weight": max_weight, "sectors": sectors, "sector_cap": 0.2}),
+        ):
+            min_var = best_of(args.repeat, optimizer.min_variance, mean_returns, cov_matrix, **kwargs)
+            sharpe = best_of(args.repeat, optimizer.max_sharpe, mean_returns, cov_matrix, **kwargs)
+            frontier = best_of(args.repeat, optimizer.efficient_frontier, mean_returns, cov_matrix, points=args.points, **kwargs)
+            print(f"{n_assets:>6} {label:<22} {min_var:>10.1f} {sharpe:>13.1f} {frontier:>11.1f}")
+
+if __name__ == "__main__":
+    main()
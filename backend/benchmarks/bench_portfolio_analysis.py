@@ -0,0 +1,76 @@
+"""Query count and latency of analyze_portfolio as the number of holdings grows
+
+The query count is reported for reference; tests/test_portfolio_analysis.py
+fails if it starts depending on the number of holdings. Run from the
+backend directory:
+
+    python -m benchmarks.bench_portfolio_analysis
+"""
+import argparse
+import os
+import time
+from benchmarks import server, synthetic
+
+server.temporary_environment()
+
+from sqlalchemy import event
+from app.db.base_class import Base
+from app.db.session import SessionLocal, engine
+from app.models.models import Portfolio, PortfolioHolding, Stock, User
+from app.services import portfolio_service
+
+def seed(n_holdings: int) -> int:
+    closes = synthetic.price_frame(n_holdings + 1, seed=n_holdings)
+    closes = closes.rename(columns={closes.columns[-1]: portfolio_service.MARKET_PROXY})
+    synthetic.write_fixture_csvs(os.environ["MARKET_DATA_FIXTURE_DIR"], closes)
+
+    db = SessionLocal()
+    try:
+        existing = {symbol for (symbol,) in db.query(Stock.symbol)}
+        db.add_all([
+            Stock(symbol=symbol, name=symbol, sector=f"Sector {i % 11}", industry="Synthetic", market_cap=1e9)
+            for i, symbol in enumerate(closes.columns[:-1]) if symbol not in existing
+        ])
+        user = User(email=f"bench{n_holdings}@example.com", full_name="Bench", hashed_password="-")
+        db.add(user)
+        db.commit()
+        portfolio = Portfolio(user_id=user.id, name=f"{n_holdings} holdings")
+        db.add(portfolio)
+        db.commit()
+        stocks = db.query(Stock).filter(Stock.symbol.in_(list(closes.columns[:-1]))).all()
+        db.add_all([
+            PortfolioHolding(portfolio_id=portfolio.id, stock_id=stock.id, quantity=10, average_price=100)
+            for stock in stocks
+        ])
+        db.commit()
+        return portfolio.id
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--holdings", type=int, nargs="+", default=[5, 50, 200])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *rest: statements.append(statement))
+
+    print(f"{'holdings':>8} {'queries':>7} {'cold ms':>8} {'warm ms':>8}")
+    for n_holdings in args.holdings:
+        portfolio_id = seed(n_holdings)
+        timings = []
+        for _ in range(args.repeat + 1):
+            db = SessionLocal()
+            try:
+                statements.clear()
+                start = time.perf_counter()
+                portfolio_service.analyze_portfolio(db, portfolio_id)
+                timings.append((time.perf_counter() - start) * 1000)
+            finally:
+                db.close()
+        print(f"{n_holdings:>8} {len(statements):>7} {timings[0]:>8.1f} {min(timings[1:]):>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Timings of the upstream client under injected faults: rate limit, timeouts, circuit breaker, stale bars
+
+Serves synthetic bars from a local HTTP server that can be told to answer
+slowly or with errors, points a PriceStore at it through an UpstreamClient
+and reports how long each behaviour takes. The behaviours themselves are
+covered by tests/test_upstream.py. Run from the backend directory:
+
+    python -m benchmarks.bench_upstream_faults
+"""
+import io
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+from benchmarks import server, synthetic
+
+server.temporary_environment()
+
+from app.services import market_data, upstream
+
+CLOSES = synthetic.price_frame(3, n_days=300)
+
+class FaultyUpstream(BaseHTTPRequestHandler):
+    """GET /<SYMBOL>?start=&end= returns bars as CSV after `latency` seconds, or `error` as the status"""
+
+    latency = 0.0
+    error: Optional[int] = None
+    hits = []
+    hits_lock = threading.Lock()
+
+    def do_GET(self):
+        with self.hits_lock:
+            self.hits.append(time.monotonic())
+        time.sleep(self.latency)
+        if self.error:
+            self.send_error(self.error)
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        symbol = url.path.strip("/")
+        close = CLOSES[symbol].loc[query["start"][0]:query["end"][0]]
+        body = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1.0}).to_csv()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.end_headers()
+            self.wfile.write(body.encode())
+        except BrokenPipeError:
+            # The client gave up on a slow answer
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+class HTTPProvider(market_data.MarketDataProvider):
+    name = "fake-http"
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def fetch_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> pd.DataFrame:
+        url = f"{self.base_url}/{symbol}?start={start.isoformat()}&end={end.isoformat()}"
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return market_data._normalize(pd.read_csv(io.BytesIO(response.read()), index_col=0, parse_dates=True))
+
+def fault(latency: float = 0.0, error: Optional[int] = None):
+    FaultyUpstream.latency = latency
+    FaultyUpstream.error = error
+
+def hits_since(mark: float) -> int:
+    with FaultyUpstream.hits_lock:
+        return sum(1 for hit in FaultyUpstream.hits if hit >= mark)
+
+def main():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FaultyUpstream)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    provider = HTTPProvider(f"http://127.0.0.1:{httpd.server_address[1]}")
+    end = CLOSES.index[-1].date()
+    start = end - timedelta(days=120)
+
+    # Request budget: a burst of calls is spread out to rate per second after the first `burst`
+    rate, burst, calls = 20.0, 5, 45
+    client = upstream.UpstreamClient(provider, rate, burst, failure_threshold=100, reset_timeout=1.0, max_workers=8)
+    mark = time.monotonic()
+    threads = [
+        threading.Thread(target=client.fetch_history, args=("SYN0000", start, end), kwargs={"timeout": 10.0})
+        for _ in range(calls)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - mark
+    print(f"rate limit: {hits_since(mark)} calls in {elapsed:.2f}s ({hits_since(mark) / elapsed:.1f}/s, budget {rate:.0f}/s after a burst of {burst})")
+
+    # Timeouts: a slow upstream is abandoned at the call's timeout
+    client = upstream.UpstreamClient(provider, 100.0, 100, failure_threshold=3, reset_timeout=0.5, max_workers=8)
+    fault(latency=1.0)
+    mark = time.monotonic()
+    try:
+        client.fetch_history("SYN0000", start, end, timeout=0.2)
+    except upstream.UpstreamTimeout:
+        pass
+    print(f"timeout: 1.0s call cut off after {time.monotonic() - mark:.2f}s (timeout 0.2s)")
+
+    # Breaker: once open, calls fail without waiting on upstream
+    fault(error=503)
+    mark = time.monotonic()
+    for _ in range(2):
+        try:
+            client.fetch_history("SYN0000", start, end, timeout=1.0)
+        except upstream.UpstreamUnavailable:
+            pass
+    print(f"breaker: {client.breaker.state} after 3 failures, {(time.monotonic() - mark) / 2 * 1000:.2f} ms per failing call")
+    mark = time.monotonic()
+    for _ in range(100):
+        try:
+            client.fetch_history("SYN0000", start, end, timeout=1.0)
+        except upstream.CircuitOpen:
+            pass
+    print(f"breaker: open circuit rejects in {(time.monotonic() - mark) / 100 * 1e6:.0f} us")
+
+    # Stale bars: the store serves what it has while the circuit is open
+    fault()
+    client.breaker.record_success()
+    store = market_data.PriceStore(tempfile.mkdtemp(prefix="qtop-upstream-"), client)
+    store.get_history("SYN0001", start, end - timedelta(days=30))
+    fault(error=500)
+    for _ in range(3):
+        try:
+            client.fetch_history("SYN0001", start, end, timeout=1.0)
+        except upstream.UpstreamUnavailable:
+            pass
+    mark = time.monotonic()
+    stale = store.get_history("SYN0001", start, end)
+    print(f"stale: {len(stale)} stored bars as of {stale.attrs.get('as_of')} served in {(time.monotonic() - mark) * 1000:.2f} ms")
+
+    # Recovery: after reset_timeout one trial call goes through and closes the breaker
+    fault()
+    time.sleep(client.breaker.reset_timeout)
+    mark = time.monotonic()
+    recovered = store.get_history("SYN0001", start, end)
+    print(f"recovery: breaker {client.breaker.state}, {len(recovered)} fresh bars in {(time.monotonic() - mark) * 1000:.1f} ms")
+
+    httpd.shutdown()
+    print(client.stats())
+
+if __name__ == "__main__":
+    main()
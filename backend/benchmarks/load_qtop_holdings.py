@@ -0,0 +1,119 @@
+"""Latency of /api/stocks/qtop-holdings while heavy analytics requests are in flight
+
+Starts the API on a throwaway SQLite database with synthetic fixture prices,
+then measures holdings latency alone and again while portfolio
+recommendation and analysis requests run concurrently. Run from the
+backend directory:
+
+    python -m benchmarks.load_qtop_holdings
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from benchmarks import server
+
+WORKDIR = server.temporary_environment()
+
+import httpx
+from app.api.auth import create_access_token
+from app.db.base_class import Base
+from app.db.session import SessionLocal, engine
+from app.main import app
+from app.models.models import Portfolio, PortfolioHolding, Stock, User, UserRole
+from app.services.portfolio_service import MARKET_PROXY
+from benchmarks import synthetic
+
+def seed(n_assets: int) -> tuple:
+    closes = synthetic.price_frame(n_assets + 1)
+    closes = closes.rename(columns={closes.columns[-1]: MARKET_PROXY})
+    synthetic.write_fixture_csvs(os.environ["MARKET_DATA_FIXTURE_DIR"], closes)
+
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    try:
+        stocks = [
+            Stock(symbol=symbol, name=symbol, sector=f"Sector {i % 11}", industry="Synthetic", market_cap=1e9 * (i + 1))
+            for i, symbol in enumerate(closes.columns[:-1])
+        ]
+        user = User(email="load@example.com", full_name="Load Test", hashed_password="-", role=UserRole.PREMIUM)
+        db.add_all(stocks + [user])
+        db.commit()
+        portfolio = Portfolio(user_id=user.id, name="Load test")
+        db.add(portfolio)
+        db.commit()
+        db.add_all([
+            PortfolioHolding(portfolio_id=portfolio.id, stock_id=stock.id, quantity=10, average_price=100)
+            for stock in stocks[:20]
+        ])
+        db.commit()
+        return create_access_token({"sub": user.email}), portfolio.id
+    finally:
+        db.close()
+
+async def measure(client: httpx.AsyncClient, requests: int, concurrency: int) -> list:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get("/api/stocks/qtop-holdings")
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return latencies
+
+async def background_load(client: httpx.AsyncClient, portfolio_id: int, stop: asyncio.Event, workers: int):
+    paths = ["/api/stocks/portfolio-recommendation", f"/api/portfolio/{portfolio_id}/analysis"]
+
+    async def worker(path):
+        while not stop.is_set():
+            (await client.get(path)).raise_for_status()
+
+    await asyncio.gather(*(worker(paths[i % len(paths)]) for i in range(workers)))
+
+def report(label: str, latencies: list):
+    latencies = sorted(latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:<22} n={len(latencies):<5} p50={statistics.median(latencies):7.1f} ms  p99={p99:7.1f} ms")
+
+async def run(args, token: str, portfolio_id: int):
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", headers=headers, timeout=120) as client:
+        # Warm the price store and caches so both phases see the same state
+        for path in ("/api/stocks/portfolio-recommendation", f"/api/portfolio/{portfolio_id}/analysis"):
+            (await client.get(path)).raise_for_status()
+
+        report("idle", await measure(client, args.requests, args.concurrency))
+
+        stop = asyncio.Event()
+        load = asyncio.create_task(background_load(client, portfolio_id, stop, args.analytics_workers))
+        await asyncio.sleep(0.5)
+        latencies = await measure(client, args.requests, args.concurrency)
+        stop.set()
+        await load
+        report("under analytics load", latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--assets", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--analytics-workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    token, portfolio_id = seed(args.assets)
+    uvicorn_server = server.serve(app, args.port)
+    try:
+        asyncio.run(run(args, token, portfolio_id))
+    finally:
+        uvicorn_server.should_exit = True
+    print(f"data in {WORKDIR}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Offline benchmark suite for the analytics functions and the API hot paths
+
+Times the analytics entry points at several universe sizes on synthetic
+prices, then load-tests the API on SQLite with httpx, and writes everything
+to a JSON file so runs can be compared across commits. Run from the backend
+directory:
+
+    python -m benchmarks.run_suite --assets 10 100 1000
+    python -m benchmarks.run_suite --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from benchmarks import server, synthetic
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+# Sector names that have benchmark ETFs, so sector betas are exercised too
+SECTORS = ("Technology", "Healthcare", "Financial Services", "Energy", "Industrials")
+
+def timed(repeat: int, fn, *args, **kwargs) -> dict:
+    """First-call and best-of-repeat wall time in milliseconds"""
+    timings = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        fn(*args, **kwargs)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"first_ms": timings[0], "best_ms": min(timings[1:]) if repeat else timings[0]}
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def seed_universe(n_assets: int) -> tuple:
+    """Replace the stock universe with n synthetic stocks held by one premium user; returns (user id, portfolio id)"""
+    from app.db.session import SessionLocal
+    from app.models.models import Portfolio, PortfolioHolding, Stock, StockRecommendation, User, UserRole
+
+    db = SessionLocal()
+    try:
+        for model in (PortfolioHolding, Portfolio, StockRecommendation, Stock):
+            db.query(model).delete()
+        user = db.query(User).filter(User.email == "suite@example.com").first()
+        if user is None:
+            user = User(email="suite@example.com", full_name="Suite", hashed_password="-", role=UserRole.PREMIUM)
+            db.add(user)
+        stocks = [
+            Stock(symbol=symbol, name=symbol, sector=SECTORS[i % len(SECTORS)], industry="Synthetic", market_cap=1e9 * (i + 1))
+            for i, symbol in enumerate(synthetic.symbols(n_assets))
+        ]
+        db.add_all(stocks)
+        db.commit()
+        portfolio = Portfolio(user_id=user.id, name=f"{n_assets} assets")
+        db.add(portfolio)
+        db.commit()
+        db.add_all([
+            PortfolioHolding(portfolio_id=portfolio.id, stock_id=stock.id, quantity=10 + i, average_price=100)
+            for i, stock in enumerate(stocks)
+        ])
+        db.commit()
+        return user.id, portfolio.id
+    finally:
+        db.close()
+
+def run_functions(sizes, repeat: int) -> list:
+    from app.db.session import SessionLocal
+    from app.services import backtest, benchmark_series, covariance, market_data, portfolio_service, risk_engine, stock_service
+
+    results = []
+    print(f"{'function':<36} {'assets':>6} {'first ms':>9} {'best ms':>9}")
+    for n_assets in sizes:
+        user_id, portfolio_id = seed_universe(n_assets)
+        symbols = synthetic.symbols(n_assets)
+        panel = market_data.get_price_panel(symbols, period="1y")
+        returns_df = panel.returns()
+        _, _, correlation_matrix = covariance.get_moments(returns_df)
+        sectors = {symbol: SECTORS[i % len(SECTORS)] for i, symbol in enumerate(symbols)}
+        weights = stock_service.calculate_optimal_weights(returns_df, correlation_matrix, sectors)
+        position_values = panel.latest() * 10
+        benchmarks = benchmark_series.benchmarks_for(list(sectors.values()))
+
+        def fresh_cache(fn):
+            # Measure the computation itself, not a covariance cache hit
+            def run(*args):
+                covariance.cache = covariance.CovarianceCache(covariance.cache.max_entries)
+                return fn(*args)
+            return run
+
+        def analyze():
+            db = SessionLocal()
+            try:
+                portfolio_service.analyze_portfolio(db, portfolio_id)
+            finally:
+                db.close()
+
+        def recommend():
+            db = SessionLocal()
+            try:
+                stock_service.generate_portfolio_recommendation(db, user_id)
+            finally:
+                db.close()
+
+        cases = {
+            "calculate_rsi (all assets)": lambda: [stock_service.calculate_rsi(panel.closes[s]) for s in panel.closes.columns],
+            "calculate_optimal_weights": fresh_cache(lambda: stock_service.calculate_optimal_weights(returns_df, correlation_matrix, sectors)),
+            "calculate_portfolio_risk": fresh_cache(lambda: stock_service.calculate_portfolio_risk(returns_df, weights, correlation_matrix)),
+            "calculate_beta": lambda: portfolio_service.calculate_beta(returns_df, position_values, benchmarks),
+            "value_at_risk (normal, 100k)": lambda: risk_engine.value_at_risk(returns_df, position_values, [1, 10], [0.95, 0.99], 100_000, "normal", 0),
+            "value_at_risk (bootstrap, 100k)": lambda: risk_engine.value_at_risk(returns_df, position_values, [1, 10], [0.95, 0.99], 100_000, "bootstrap", 0),
+            "backtest.run": lambda: backtest.run(panel.closes),
+            "analyze_portfolio": analyze,
+            "generate_portfolio_recommendation": recommend,
+        }
+        for name, fn in cases.items():
+            timing = timed(repeat, fn)
+            results.append({"function": name, "assets": n_assets, **timing})
+            print(f"{name:<36} {n_assets:>6} {timing['first_ms']:>9.1f} {timing['best_ms']:>9.1f}")
+    return results
+
+async def load_endpoint(client: httpx.AsyncClient, path: str, requests: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            errors += response.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+    }
+
+def run_load(n_assets: int, requests: int, concurrency: int, port: int) -> dict:
+    from app.api.auth import create_access_token
+    from app.main import app
+
+    _, portfolio_id = seed_universe(n_assets)
+    paths = {
+        "qtop-holdings": "/api/stocks/qtop-holdings",
+        "portfolios": "/api/portfolio/",
+        "portfolio-analysis": f"/api/portfolio/{portfolio_id}/analysis",
+        "portfolio-recommendation": "/api/stocks/portfolio-recommendation",
+    }
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': 'suite@example.com'})}"}
+
+    async def run():
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", headers=headers, timeout=300) as client:
+            results = {}
+            for name, path in paths.items():
+                (await client.get(path)).raise_for_status()
+                results[name] = await load_endpoint(client, path, requests, concurrency)
+                r = results[name]
+                print(f"{name:<26} rps={r['rps']:7.1f} p50={r['p50_ms']:7.1f} ms p99={r['p99_ms']:7.1f} ms errors={r['errors']}")
+            return results
+
+    uvicorn_server = server.serve(app, port)
+    try:
+        return {"assets": n_assets, "concurrency": concurrency, "endpoints": asyncio.run(run())}
+    finally:
+        uvicorn_server.should_exit = True
+
+def compare(before_path: str, after_path: str):
+    before, after = (json.loads(Path(p).read_text()) for p in (before_path, after_path))
+    old = {(r["function"], r["assets"]): r["best_ms"] for r in before["functions"]}
+    print(f"{before['revision']} -> {after['revision']}")
+    print(f"{'function':<36} {'assets':>6} {'before ms':>10} {'after ms':>10} {'speedup':>8}")
+    for r in after["functions"]:
+        key = (r["function"], r["assets"])
+        if key in old:
+            print(f"{key[0]:<36} {key[1]:>6} {old[key]:>10.1f} {r['best_ms']:>10.1f} {old[key] / r['best_ms']:>7.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--assets", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--load-assets", type=int, default=100, help="universe size for the API load test")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--output", help="JSON file to write (default: benchmarks/results/<time>-<revision>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="print the speedup between two result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    workdir = server.temporary_environment()
+    from app.db import migrations
+    from app.services import market_data
+
+    migrations.upgrade()
+    market_data.set_provider(synthetic.SyntheticProvider(), root=os.path.join(workdir, "market_data"))
+
+    revision = git_revision()
+    report = {
+        "revision": revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "functions": run_functions(args.assets, args.repeat),
+    }
+    if not args.skip_load:
+        report["load"] = run_load(args.load_assets, args.requests, args.concurrency, args.port)
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}-{revision}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"results written to {output}")
+
+if __name__ == "__main__":
+    main()
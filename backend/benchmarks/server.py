@@ -0,0 +1,29 @@
+"""Run the API in-process against throwaway storage for the load benchmarks
+
+Call temporary_environment() before anything imports `app`, since settings
+are read at import time.
+"""
+import os
+import tempfile
+import threading
+import time
+import uvicorn
+
+def temporary_environment(**overrides) -> str:
+    """Point the database and market data at a fresh temp directory; returns its path"""
+    workdir = tempfile.mkdtemp(prefix="qtop-bench-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir}/bench.db"
+    os.environ["MARKET_DATA_PROVIDER"] = "fixture"
+    os.environ["MARKET_DATA_FIXTURE_DIR"] = f"{workdir}/fixtures"
+    os.environ["MARKET_DATA_DIR"] = f"{workdir}/market_data"
+    for name, value in overrides.items():
+        os.environ[name] = str(value)
+    return workdir
+
+def serve(app, port: int) -> uvicorn.Server:
+    """Start uvicorn on a daemon thread and wait until it accepts connections"""
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
@@ -0,0 +1,61 @@
+"""Synthetic market data shared by the benchmark scripts
+
+Nothing here imports `app`, so scripts can use it before pointing the
+settings at a temporary environment.
+"""
+import zlib
+from datetime import date
+from pathlib import Path
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+
+def symbols(n_assets: int) -> List[str]:
+    return [f"SYN{i:04d}" for i in range(n_assets)]
+
+def price_frame(n_assets: int, n_days: int = 400, seed: int = 0, end: str = None) -> pd.DataFrame:
+    """Business-day closes from a one-factor geometric random walk, one column per symbol"""
+    rng = np.random.default_rng(seed)
+    index = pd.bdate_range(end=end or pd.Timestamp.today().normalize(), periods=n_days)
+    market = rng.normal(0.0003, 0.01, (n_days, 1))
+    betas = rng.uniform(0.5, 1.5, n_assets)
+    returns = market * betas + rng.normal(0.0001, 0.015, (n_days, n_assets))
+    closes = 100 * np.exp(np.cumsum(returns, axis=0))
+    return pd.DataFrame(closes, index=index, columns=symbols(n_assets))
+
+def write_fixture_csvs(directory: str, closes: pd.DataFrame):
+    """Write one <SYMBOL>.csv per column in the layout FixtureProvider reads"""
+    root = Path(directory)
+    root.mkdir(parents=True, exist_ok=True)
+    for symbol in closes.columns:
+        close = closes[symbol]
+        pd.DataFrame({
+            "Open": close, "High": close, "Low": close, "Close": close, "Volume": 1_000_000.0,
+        }).to_csv(root / f"{symbol}.csv")
+
+class SyntheticProvider:
+    """In-memory stand-in for the market data provider (same interface as MarketDataProvider)
+
+    Every symbol gets a deterministic one-factor random walk over the last
+    `years` of business days, so any universe size can be served offline and
+    repeated runs see identical prices.
+    """
+    name = "synthetic"
+
+    def __init__(self, seed: int = 0, years: int = 3):
+        self.seed = seed
+        self.index = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=years * 261, name="Date")
+        self.market = np.random.default_rng(seed).normal(0.0003, 0.01, len(self.index))
+
+    def closes(self, symbol: str) -> pd.Series:
+        rng = np.random.default_rng([self.seed, zlib.crc32(symbol.encode())])
+        beta = rng.uniform(0.5, 1.5)
+        returns = self.market * beta + rng.normal(0.0001, 0.015, len(self.index))
+        return pd.Series(100 * np.exp(np.cumsum(returns)), index=self.index)
+
+    def fetch_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> pd.DataFrame:
+        close = self.closes(symbol).loc[pd.Timestamp(start):pd.Timestamp(end)]
+        return pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1_000_000.0})
+
+    def fetch_quote(self, symbol: str, timeout: Optional[float] = None) -> Optional[float]:
+        return float(self.closes(symbol).iloc[-1])
@@ -0,0 +1,87 @@
+"""Shared fixtures; the whole session runs against a throwaway database and price store
+
+Settings are read when `app` is first imported, so the environment is set
+here before anything else imports it.
+"""
+import os
+import tempfile
+from pathlib import Path
+
+WORKDIR = tempfile.mkdtemp(prefix="qtop-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{WORKDIR}/test.db"
+os.environ["MARKET_DATA_PROVIDER"] = "fixture"
+os.environ["MARKET_DATA_FIXTURE_DIR"] = f"{WORKDIR}/fixtures"
+os.environ["MARKET_DATA_DIR"] = f"{WORKDIR}/market_data"
+os.environ["CONSTITUENT_FIXTURE_PATH"] = str(Path(__file__).resolve().parent.parent / "fixtures" / "qtop_constituents.json")
+
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.synthetic import SyntheticProvider
+from app.api.auth import create_access_token
+from app.db.base_class import Base
+from app.db.session import SessionLocal, engine
+from app.main import app
+from app.models.models import Portfolio, PortfolioHolding, Stock, User
+from app.services import auth_service, market_data
+
+@pytest.fixture
+def db():
+    """A session on an empty schema"""
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+@pytest.fixture
+def client():
+    """The app without its startup and shutdown hooks, so no background workers run"""
+    return TestClient(app)
+
+@pytest.fixture
+def make_user(db):
+    """Add a user and return (user, headers carrying a bearer token for them)"""
+    def make(email: str = "user@example.com", role: str = "free"):
+        user = User(email=email, full_name="Test User", hashed_password="unused", role=role)
+        db.add(user)
+        db.commit()
+        auth_service.principal_cache.invalidate(email)
+        return user, {"Authorization": f"Bearer {create_access_token({'sub': email})}"}
+    return make
+
+@pytest.fixture
+def provider(tmp_path):
+    """Deterministic synthetic bars behind a fresh price store, swapped in for the test"""
+    previous = market_data._store
+    provider = SyntheticProvider()
+    market_data.set_provider(provider, root=str(tmp_path / "market_data"))
+    yield provider
+    market_data._store = previous
+
+@pytest.fixture
+def make_portfolio(db):
+    """Add a portfolio holding 10 shares bought at 100 of each symbol; returns its id"""
+    def make(symbols, sectors=None):
+        existing = {stock.symbol: stock for stock in db.query(Stock)}
+        for i, symbol in enumerate(symbols):
+            if symbol not in existing:
+                existing[symbol] = Stock(
+                    symbol=symbol, name=symbol, sector=(sectors or {}).get(symbol, f"Sector {i % 3}"),
+                    industry="Synthetic", market_cap=1e9,
+                )
+                db.add(existing[symbol])
+        user = User(email=f"owner{db.query(User).count()}@example.com", full_name="Owner", hashed_password="unused")
+        db.add(user)
+        db.commit()
+        portfolio = Portfolio(user_id=user.id, name=f"{len(symbols)} holdings")
+        db.add(portfolio)
+        db.commit()
+        db.add_all([
+            PortfolioHolding(portfolio_id=portfolio.id, stock_id=existing[symbol].id, quantity=10, average_price=100)
+            for symbol in symbols
+        ])
+        db.commit()
+        return portfolio.id
+    return make
@@ -0,0 +1,36 @@
+from app.core.config import settings
+from app.services import constituent_sync, upstream
+
+class OfflineClient:
+    """Upstream client whose every call fails, as when Yahoo is unreachable"""
+
+    def call(self, fn, *args, timeout=None):
+        raise upstream.UpstreamUnavailable("offline")
+
+def test_fixture_sync_into_empty_table_is_served(db, client, make_user):
+    _, headers = make_user()
+    result = constituent_sync.sync(db, constituent_sync.FixtureSource(settings.CONSTITUENT_FIXTURE_PATH))
+    assert len(result["added"]) == 30
+
+    response = client.get("/api/stocks/qtop-holdings", headers=headers)
+    assert response.status_code == 200
+    stocks = response.json()
+    assert sorted(stock["symbol"] for stock in stocks) == result["added"]
+    assert all(stock["market_cap"] is None for stock in stocks)
+
+def test_yfinance_sync_without_fundamentals_is_served(db, client, make_user):
+    _, headers = make_user()
+    listing = constituent_sync.FixtureSource(settings.CONSTITUENT_FIXTURE_PATH)
+    result = constituent_sync.sync(db, constituent_sync.YFinanceSource(OfflineClient(), listing))
+    assert len(result["added"]) == 30
+    assert sorted(result["failed"]) == result["added"]
+
+    response = client.get("/api/stocks/qtop-holdings", headers=headers)
+    assert response.status_code == 200
+    assert {stock["symbol"]: stock["name"] for stock in response.json()}["AAPL"] == "Apple Inc."
+
+def test_rerun_changes_nothing(db):
+    source = constituent_sync.FixtureSource(settings.CONSTITUENT_FIXTURE_PATH)
+    constituent_sync.sync(db, source)
+    result = constituent_sync.sync(db, source)
+    assert result["added"] == [] and result["updated"] == []
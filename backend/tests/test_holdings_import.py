@@ -0,0 +1,42 @@
+import threading
+import pytest
+from app.models.models import PortfolioHolding, Stock
+from app.services import portfolio_service
+
+@pytest.fixture
+def portfolio(db, client, make_user):
+    """A portfolio owned by a fresh user, with AAPL and MSFT in the stock table; returns (import url, headers)"""
+    db.add_all([Stock(symbol=symbol, name=symbol, sector="Tech", industry="Software") for symbol in ("AAPL", "MSFT")])
+    db.commit()
+    _, headers = make_user()
+    portfolio_id = client.post("/api/portfolio/", json={"name": "Imported"}, headers=headers).json()["id"]
+    return f"/api/portfolio/{portfolio_id}/holdings/bulk", headers
+
+def post_csv(client, portfolio, body: bytes):
+    url, headers = portfolio
+    return client.post(url, content=body, headers={**headers, "Content-Type": "text/csv"})
+
+def test_csv_is_parsed_off_the_event_loop(db, client, portfolio, monkeypatch):
+    threads = []
+    parse = portfolio_service.parse_holdings_csv
+
+    def recording_parse(text):
+        threads.append(threading.current_thread().name)
+        return parse(text)
+
+    monkeypatch.setattr(portfolio_service, "parse_holdings_csv", recording_parse)
+    response = post_csv(client, portfolio, b"symbol,quantity,average_price\nAAPL,10,150\nmsft,5,300\n")
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert db.query(PortfolioHolding).count() == 2
+    assert len(threads) == 1 and threads[0].startswith("analytics")
+
+def test_csv_that_is_not_utf8_is_rejected(db, client, portfolio):
+    response = post_csv(client, portfolio, "symbol,quantity,average_price\nAAPL,10,1€\n".encode("cp1252"))
+    assert response.status_code == 422
+    assert db.query(PortfolioHolding).count() == 0
+
+def test_json_body_must_be_an_array(client, portfolio):
+    url, headers = portfolio
+    response = client.post(url, json={"symbol": "AAPL"}, headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,152 @@
+import math
+import zlib
+from datetime import date, datetime, timedelta
+from typing import Optional
+import numpy as np
+import pandas as pd
+import pytest
+from benchmarks import synthetic
+from app.services import indicators, market_data, stock_service, upstream
+
+TOLERANCE = 1e-8
+
+class FlakyProvider(synthetic.SyntheticProvider):
+    """Synthetic bars that can skip days, report an intraday close for one day, be re-adjusted or refuse every call"""
+
+    def __init__(self, gap_rate: float = 0.0):
+        super().__init__()
+        self.gap_rate = gap_rate
+        self.down = False
+        self.intraday = {}
+        self.adjustment = 1.0
+
+    def closes(self, symbol: str) -> pd.Series:
+        closes = super().closes(symbol)
+        if not self.gap_rate:
+            return closes
+        # A symbol-specific set of days without a bar, never the last one
+        gaps = np.random.default_rng(zlib.crc32(symbol.encode())).random(len(closes)) < self.gap_rate
+        gaps[-1] = False
+        return closes[~gaps]
+
+    def fetch_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> pd.DataFrame:
+        if self.down:
+            raise upstream.UpstreamUnavailable("injected outage")
+        close = self.closes(symbol).loc[pd.Timestamp(start):pd.Timestamp(end)] * self.adjustment
+        bars = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1_000_000.0})
+        for day, close in self.intraday.items():
+            if pd.Timestamp(day) in bars.index:
+                bars.loc[pd.Timestamp(day), ["Open", "High", "Low", "Close"]] = close
+        return bars
+
+def wilder_rsi(closes: pd.Series, period: int = indicators.RSI_PERIOD) -> float:
+    deltas = closes.diff().dropna().tolist()
+    if len(deltas) < period:
+        return math.nan
+    gains = [max(delta, 0.0) for delta in deltas]
+    losses = [max(-delta, 0.0) for delta in deltas]
+    avg_gain, avg_loss = sum(gains[:period]) / period, sum(losses[:period]) / period
+    for gain, loss in zip(gains[period:], losses[period:]):
+        avg_gain = (avg_gain * (period - 1) + gain) / period
+        avg_loss = (avg_loss * (period - 1) + loss) / period
+    return 100 - 100 / (1 + avg_gain / avg_loss)
+
+def reference(closes: pd.Series) -> dict:
+    """What the pandas implementation reports on the last of `closes`"""
+    return {
+        "Close": closes.iloc[-1],
+        "SMA_20": closes.rolling(window=20).mean().iloc[-1],
+        "SMA_50": closes.rolling(window=50).mean().iloc[-1],
+        "RSI": stock_service.calculate_rsi(closes).iloc[-1],
+        "RSI_Wilder": wilder_rsi(closes),
+    }
+
+def mismatches(values: dict, expected: dict) -> list:
+    return [
+        f"{name}: {values[name]!r} != {expected[name]!r}"
+        for name in expected
+        if not (
+            (math.isnan(values[name]) and math.isnan(expected[name]))
+            or abs(values[name] - expected[name]) <= TOLERANCE * max(1.0, abs(expected[name]))
+        )
+    ]
+
+def during_session(store: market_data.PriceStore, day: date):
+    """Make the store treat `day` as today, with its session still open"""
+    store._now = lambda: datetime.combine(day, datetime.min.time()) + timedelta(hours=15)
+
+def replay(engine: indicators.IndicatorEngine, provider: FlakyProvider, symbol: str, days: list, first_start: date) -> list:
+    """Advance the engine one day at a time, each asked for during that day's session; returns mismatches against pandas"""
+    errors = []
+    for day in days:
+        during_session(engine.store, day)
+        values = engine.latest(symbol, as_of=day).values()
+        closes = provider.closes(symbol).loc[pd.Timestamp(first_start):pd.Timestamp(day)] * provider.adjustment
+        closes = closes.drop([pd.Timestamp(missing) for missing, close in provider.intraday.items() if math.isnan(close)], errors="ignore")
+        errors += [f"{symbol} {day}: {error}" for error in mismatches(values, reference(closes))]
+    return errors
+
+@pytest.fixture
+def engine(tmp_path):
+    provider = FlakyProvider()
+    return indicators.IndicatorEngine(market_data.PriceStore(str(tmp_path), provider)), provider
+
+def replay_days(provider: FlakyProvider, n_days: int) -> tuple:
+    days = [timestamp.date() for timestamp in provider.index[-n_days:]]
+    return days, market_data.period_range("1y", days[0])[0]
+
+def test_daily_updates_match_pandas(engine):
+    engine, provider = engine
+    days, first_start = replay_days(provider, 120)
+    assert replay(engine, provider, "SYN0000", days, first_start) == []
+
+def test_intraday_bar_replaced_after_an_outage_is_not_persisted(engine):
+    engine, provider = engine
+    days, first_start = replay_days(provider, 40)
+    symbol = "SYN0001"
+    assert replay(engine, provider, symbol, days[:-3], first_start) == []
+
+    intraday_day, outage_day, final_day = days[-3:]
+    provider.intraday = {intraday_day: float(provider.closes(symbol).loc[pd.Timestamp(intraday_day)]) * 1.05}
+    during_session(engine.store, intraday_day)
+    engine.latest(symbol, as_of=intraday_day)
+    provider.intraday = {}
+    provider.down = True
+    during_session(engine.store, outage_day)
+    assert engine.latest(symbol, as_of=outage_day).last_date == intraday_day
+    provider.down = False
+    assert replay(engine, provider, symbol, [outage_day, final_day], first_start) == []
+
+def test_bars_without_a_close_are_skipped(engine):
+    engine, provider = engine
+    days, first_start = replay_days(provider, 40)
+    # Upstream reports a row with no prices for one day
+    provider.intraday = {days[20]: math.nan}
+    assert replay(engine, provider, "SYN0002", days, first_start) == []
+
+def test_state_is_rebuilt_when_history_is_readjusted(engine):
+    engine, provider = engine
+    days, first_start = replay_days(provider, 40)
+    assert replay(engine, provider, "SYN0000", days[:10], first_start) == []
+
+    # A 2-for-1 split: upstream now reports every earlier close halved, and
+    # the state is rebuilt over the period ending on the next day
+    provider.adjustment = 0.5
+    rebuilt_start = market_data.period_range("1y", days[10])[0]
+    assert replay(engine, provider, "SYN0000", days[10:12], rebuilt_start) == []
+
+def test_bulk_signals_match_the_engine_on_symbols_with_gaps(tmp_path):
+    provider = FlakyProvider(gap_rate=0.1)
+    store = market_data.PriceStore(str(tmp_path), provider)
+    engine = indicators.IndicatorEngine(store)
+    symbols = synthetic.symbols(30)
+    start, end = market_data.period_range("1y", provider.index[-1].date())
+    closes = pd.concat({symbol: store.get_history(symbol, start, end)["Close"] for symbol in symbols}, axis=1).sort_index()
+    signals = indicators.compute_signals(closes)
+
+    errors = []
+    for symbol in symbols:
+        values = engine.latest(symbol, as_of=end).values()
+        expected = {name: float(signals.loc[symbol, name]) for name in ("Close", "SMA_20", "SMA_50", "RSI")}
+        errors += [f"{symbol}: {error}" for error in mismatches(values, expected)]
+    assert errors == []
@@ -0,0 +1,16 @@
+from sqlalchemy import inspect, text
+from app.db import migrations
+from app.db.session import engine
+
+def recommendation_indexes() -> set:
+    return {index["name"] for index in inspect(engine).get_indexes("stock_recommendations")}
+
+def test_redundant_recommendation_index_is_dropped(db):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_stock_recommendations_stock_id_as_of ON stock_recommendations (stock_id, as_of)"))
+
+    migrations.upgrade(engine)
+    migrations.upgrade(engine)
+    indexes = recommendation_indexes()
+    assert "ix_stock_recommendations_stock_id_as_of" not in indexes
+    assert "uq_stock_recommendations_stock_id_as_of_model_version" in indexes
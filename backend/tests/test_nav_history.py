@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+from benchmarks import synthetic
+from app.db.session import SessionLocal
+from app.models.models import PortfolioHolding, PortfolioValuation
+from app.services import market_data, nav_history
+
+def backdate_holdings(db, days: int):
+    db.query(PortfolioHolding).update({PortfolioHolding.created_at: datetime.now(timezone.utc) - timedelta(days=days)})
+    db.commit()
+
+def test_run_racing_another_overwrites_its_rows(db, make_portfolio, provider, monkeypatch):
+    make_portfolio(synthetic.symbols(3))
+    backdate_holdings(db, 30)
+    through = provider.index[-1].date()
+
+    # The competing run stores the same days after this one has read which
+    # days are missing but before it writes them
+    get_price_panel = market_data.get_price_panel
+    competing = []
+
+    def racing_get_price_panel(*args, **kwargs):
+        if not competing:
+            competing.append(None)
+            other = SessionLocal()
+            try:
+                competing[0] = nav_history.materialize(other, through)
+            finally:
+                other.close()
+        return get_price_panel(*args, **kwargs)
+
+    monkeypatch.setattr(market_data, "get_price_panel", racing_get_price_panel)
+    written = nav_history.materialize(db, through)
+    assert written == competing[0] > 0
+    assert db.query(PortfolioValuation).count() == written
+
+def test_rerun_writes_nothing_new(db, make_portfolio, provider):
+    make_portfolio(synthetic.symbols(2))
+    backdate_holdings(db, 30)
+    through = provider.index[-1].date()
+    first = nav_history.materialize(db, through)
+    assert first > 0
+    assert nav_history.materialize(db, through) == 0
+    assert db.query(PortfolioValuation).count() == first
@@ -0,0 +1,27 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.core.config import settings
+from app.services import optimizer, stock_service
+
+def daily_returns(n_assets: int) -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    returns = rng.normal(0.0005, 0.01, size=(250, n_assets))
+    return pd.DataFrame(returns, columns=[f"SYN{i:04d}" for i in range(n_assets)])
+
+def test_position_cap_too_tight_for_the_universe_falls_back_to_equal_weight(monkeypatch):
+    monkeypatch.setattr(settings, "OPTIMIZER_MAX_WEIGHT", 0.1)
+    returns = daily_returns(3)
+    weights = stock_service.calculate_optimal_weights(returns, returns.corr())
+    assert list(weights.values()) == pytest.approx([1 / 3] * 3)
+
+def test_position_cap_is_kept_when_feasible(monkeypatch):
+    monkeypatch.setattr(settings, "OPTIMIZER_MAX_WEIGHT", 0.1)
+    returns = daily_returns(20)
+    weights = np.array(list(stock_service.calculate_optimal_weights(returns, returns.corr()).values()))
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights.max() <= 0.1 + 1e-9
+
+def test_infeasible_cap_is_still_rejected_by_the_solver():
+    with pytest.raises(ValueError):
+        optimizer.Constraints(3, max_weight=0.1)
@@ -0,0 +1,55 @@
+import pytest
+from sqlalchemy import event
+from benchmarks import synthetic
+from app.db.session import engine
+from app.services import portfolio_service, upstream
+
+SYMBOLS = synthetic.symbols(4)
+
+@pytest.fixture
+def quoted(provider, monkeypatch):
+    """Quotes 10% above the stored close, as if the price moved since the bar was fetched"""
+    quotes = {symbol: float(provider.closes(symbol).iloc[-1]) * 1.1 for symbol in SYMBOLS}
+    monkeypatch.setattr(provider, "fetch_quote", lambda symbol, timeout=None: quotes[symbol])
+    return quotes
+
+def test_holdings_are_valued_at_the_live_quote(db, make_portfolio, quoted):
+    portfolio_id = make_portfolio(SYMBOLS)
+    analysis = portfolio_service.analyze_portfolio(db, portfolio_id)
+    assert analysis["total_value"] == pytest.approx(sum(10 * quote for quote in quoted.values()))
+    assert not any("Live quotes unavailable" in line for line in analysis["recommendations"])
+
+def test_missing_quotes_fall_back_to_the_stored_close(db, make_portfolio, provider, monkeypatch):
+    def fetch_quote(symbol, timeout=None):
+        raise upstream.UpstreamUnavailable("quote endpoint down")
+
+    monkeypatch.setattr(provider, "fetch_quote", fetch_quote)
+    portfolio_id = make_portfolio(SYMBOLS)
+    analysis = portfolio_service.analyze_portfolio(db, portfolio_id)
+    closes = [float(provider.closes(symbol).iloc[-1]) for symbol in SYMBOLS]
+    assert analysis["total_value"] == pytest.approx(sum(10 * close for close in closes))
+    assert f"Live quotes unavailable for {', '.join(SYMBOLS)}; valued at the latest stored close" in analysis["recommendations"]
+
+def test_risk_positions_use_the_live_quote(db, make_portfolio, quoted):
+    portfolio_id = make_portfolio(SYMBOLS)
+    result = portfolio_service.simulate_risk(db, portfolio_id, [1], [0.95], 1000, seed=0)
+    assert result["portfolio_value"] == pytest.approx(sum(10 * quote for quote in quoted.values()))
+
+def test_query_count_does_not_grow_with_holdings(db, make_portfolio, provider):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    counts = {}
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        for n_holdings in (2, 40):
+            portfolio_id = make_portfolio(synthetic.symbols(n_holdings))
+            db.expunge_all()
+            statements.clear()
+            portfolio_service.analyze_portfolio(db, portfolio_id)
+            counts[n_holdings] = len(statements)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert counts[2] == counts[40] == 1
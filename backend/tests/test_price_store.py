@@ -0,0 +1,99 @@
+import json
+from datetime import date, datetime, time, timedelta
+import pandas as pd
+import pytest
+from benchmarks.synthetic import SyntheticProvider
+from app.core.config import settings
+from app.services import market_data
+
+class CountingProvider(SyntheticProvider):
+    """Synthetic bars on every calendar day through today, whose newest close can be overridden; counts every fetch"""
+
+    def __init__(self):
+        super().__init__()
+        self.index = pd.date_range(end=pd.Timestamp.today().normalize(), periods=len(self.index), name="Date")
+        self.calls = []
+        self.last_close = None
+        self.adjustment = 1.0
+
+    def fetch_history(self, symbol, start, end, timeout=None):
+        self.calls.append((start, end))
+        bars = super().fetch_history(symbol, start, end, timeout) * self.adjustment
+        if self.last_close is not None and not bars.empty and bars.index[-1] == self.index[-1]:
+            bars.iloc[-1, bars.columns.get_loc("Close")] = self.last_close * self.adjustment
+        return bars
+
+@pytest.fixture
+def store(tmp_path):
+    provider = CountingProvider()
+    return market_data.PriceStore(str(tmp_path), provider), provider
+
+def test_intraday_bar_is_refetched_once_it_is_old_enough(store, monkeypatch):
+    store, provider = store
+    today = provider.index[-1].date()
+    start = today - timedelta(days=30)
+    # Mid-session, so today's bar is intraday
+    store._now = lambda: datetime.combine(today, time(15))
+    provider.last_close = 100.0
+    assert store.get_history("SYN0000", start, today)["Close"].iloc[-1] == 100.0
+
+    # Within the refresh interval the stored bar is served as is
+    provider.last_close = 105.0
+    assert store.get_history("SYN0000", start, today)["Close"].iloc[-1] == 100.0
+    assert len(provider.calls) == 1
+
+    monkeypatch.setattr(settings, "MARKET_DATA_INTRADAY_REFRESH_SECONDS", 0.0)
+    assert store.get_history("SYN0000", start, today)["Close"].iloc[-1] == 105.0
+    # The tail overlaps the last final bar to check the seam
+    assert provider.calls[-1] == (today - timedelta(days=1), today)
+
+def test_final_bars_are_not_refetched(store, monkeypatch):
+    store, provider = store
+    monkeypatch.setattr(settings, "MARKET_DATA_INTRADAY_REFRESH_SECONDS", 0.0)
+    end = date.today() - timedelta(days=3)
+    start = end - timedelta(days=30)
+    store.get_history("SYN0000", start, end)
+    store.get_history("SYN0000", start, end)
+    assert provider.calls == [(start, end)]
+
+def test_legacy_meta_refetches_its_last_day(store, monkeypatch):
+    store, provider = store
+    monkeypatch.setattr(settings, "MARKET_DATA_INTRADAY_REFRESH_SECONDS", 0.0)
+    end = date.today() - timedelta(days=3)
+    start = end - timedelta(days=30)
+    store.get_history("SYN0000", start, end)
+    version = store._current("SYN0000")
+    meta = store._read_meta(version)
+    del meta["final_end"]
+    (version / "meta.json").write_text(json.dumps(meta))
+
+    store.get_history("SYN0000", start, end)
+    assert provider.calls[-1] == (end - timedelta(days=1), end)
+    store.get_history("SYN0000", start, end)
+    assert len(provider.calls) == 2
+
+def test_readjusted_history_replaces_the_stored_bars(store):
+    store, provider = store
+    end = date.today() - timedelta(days=10)
+    start = end - timedelta(days=60)
+    store.get_history("SYN0000", start, end)
+    adjusted_at = store.adjusted_at("SYN0000")
+
+    # A 2-for-1 split: upstream now reports every earlier close halved
+    provider.adjustment = 0.5
+    bars = store.get_history("SYN0000", start, date.today())
+    expected = provider.closes("SYN0000").loc[pd.Timestamp(start):pd.Timestamp(date.today())] * 0.5
+    assert bars["Close"].to_numpy() == pytest.approx(expected.to_numpy())
+    assert provider.calls[-1] == (start, date.today())
+    assert store.adjusted_at("SYN0000") != adjusted_at
+
+def test_unchanged_adjustment_only_fetches_missing_bars(store):
+    store, provider = store
+    end = date.today() - timedelta(days=10)
+    start = end - timedelta(days=60)
+    store.get_history("SYN0000", start, end)
+    adjusted_at = store.adjusted_at("SYN0000")
+
+    store.get_history("SYN0000", start - timedelta(days=30), date.today())
+    assert provider.calls[1:] == [(start - timedelta(days=30), start), (end, date.today())]
+    assert store.adjusted_at("SYN0000") == adjusted_at
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+import pytest
+from app.core.singleflight import SingleFlight
+
+def test_followers_share_the_leaders_result():
+    group = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return "done"
+
+    async def main():
+        tasks = [asyncio.create_task(group.do_async("key", work)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(main()) == ["done"] * 5
+    assert len(calls) == 1
+    assert group.stats() == {"in_flight": 0, "leaders": 1, "followers": 4}
+
+def test_cancelled_follower_leaves_the_call_to_the_others():
+    group = SingleFlight()
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        return "done"
+
+    async def main():
+        leader = asyncio.create_task(group.do_async("key", work))
+        await asyncio.sleep(0.05)
+        followers = [asyncio.create_task(group.do_async("key", work)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        followers[0].cancel()
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(leader, *followers, return_exceptions=True)
+
+    leader, cancelled, *others = asyncio.run(main())
+    assert isinstance(cancelled, asyncio.CancelledError)
+    assert leader == "done"
+    assert others == ["done", "done"]
+    assert group.stats()["in_flight"] == 0
+
+def test_followers_get_the_leaders_exception():
+    group = SingleFlight()
+    release = threading.Event()
+
+    def work():
+        release.wait(5)
+        raise ValueError("boom")
+
+    async def main():
+        tasks = [asyncio.create_task(group.do_async("key", work)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(main()))
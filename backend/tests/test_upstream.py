@@ -0,0 +1,142 @@
+import io
+import threading
+import time
+import urllib.request
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+import pandas as pd
+import pytest
+from benchmarks import synthetic
+from app.services import market_data, upstream
+
+CLOSES = synthetic.price_frame(3, n_days=300)
+END = CLOSES.index[-1].date()
+START = END - timedelta(days=120)
+
+class FaultyUpstream(BaseHTTPRequestHandler):
+    """GET /<SYMBOL>?start=&end= returns bars as CSV after `latency` seconds, or `error` as the status"""
+
+    latency = 0.0
+    error: Optional[int] = None
+    hits = []
+    hits_lock = threading.Lock()
+
+    def do_GET(self):
+        with self.hits_lock:
+            self.hits.append(time.monotonic())
+        time.sleep(self.latency)
+        if self.error:
+            self.send_error(self.error)
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        close = CLOSES[url.path.strip("/")].loc[query["start"][0]:query["end"][0]]
+        body = pd.DataFrame({"Open": close, "High": close, "Low": close, "Close": close, "Volume": 1.0}).to_csv()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/csv")
+            self.end_headers()
+            self.wfile.write(body.encode())
+        except BrokenPipeError:
+            # The client gave up on a slow answer
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+class HTTPProvider(market_data.MarketDataProvider):
+    name = "fake-http"
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+
+    def fetch_history(self, symbol: str, start: date, end: date, timeout: Optional[float] = None) -> pd.DataFrame:
+        url = f"{self.base_url}/{symbol}?start={start.isoformat()}&end={end.isoformat()}"
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            return market_data._normalize(pd.read_csv(io.BytesIO(response.read()), index_col=0, parse_dates=True))
+
+def fault(latency: float = 0.0, error: Optional[int] = None):
+    FaultyUpstream.latency = latency
+    FaultyUpstream.error = error
+
+def hits_since(mark: float) -> int:
+    with FaultyUpstream.hits_lock:
+        return sum(1 for hit in FaultyUpstream.hits if hit >= mark)
+
+@pytest.fixture(scope="module")
+def provider():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), FaultyUpstream)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield HTTPProvider(f"http://127.0.0.1:{httpd.server_address[1]}")
+    httpd.shutdown()
+
+@pytest.fixture(autouse=True)
+def healthy_upstream():
+    fault()
+    yield
+    fault()
+
+def fail_calls(client: upstream.UpstreamClient, n: int, symbol: str = "SYN0000"):
+    for _ in range(n):
+        with pytest.raises(upstream.UpstreamUnavailable):
+            client.fetch_history(symbol, START, END, timeout=1.0)
+
+def test_burst_is_held_to_the_request_budget(provider):
+    rate, burst, calls = 50.0, 5, 30
+    client = upstream.UpstreamClient(provider, rate, burst, failure_threshold=100, reset_timeout=1.0, max_workers=8)
+    mark = time.monotonic()
+    threads = [
+        threading.Thread(target=client.fetch_history, args=("SYN0000", START, END), kwargs={"timeout": 10.0})
+        for _ in range(calls)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - mark
+    assert hits_since(mark) <= burst + rate * elapsed
+    assert elapsed >= (calls - burst) / rate * 0.9
+
+def test_slow_call_is_cut_off_at_its_timeout(provider):
+    client = upstream.UpstreamClient(provider, 100.0, 100, failure_threshold=3, reset_timeout=0.5, max_workers=8)
+    fault(latency=1.0)
+    mark = time.monotonic()
+    with pytest.raises(upstream.UpstreamTimeout):
+        client.fetch_history("SYN0000", START, END, timeout=0.2)
+    assert time.monotonic() - mark < 0.5
+
+def test_breaker_opens_and_rejects_without_calling_upstream(provider):
+    client = upstream.UpstreamClient(provider, 100.0, 100, failure_threshold=3, reset_timeout=10.0, max_workers=8)
+    fault(error=503)
+    fail_calls(client, 3)
+    assert client.breaker.state == client.breaker.OPEN
+
+    mark = time.monotonic()
+    with pytest.raises(upstream.CircuitOpen):
+        client.fetch_history("SYN0000", START, END, timeout=1.0)
+    assert hits_since(mark) == 0
+
+def test_stored_bars_are_served_stale_while_open_and_fresh_after_recovery(provider, tmp_path):
+    client = upstream.UpstreamClient(provider, 100.0, 100, failure_threshold=3, reset_timeout=0.5, max_workers=8)
+    store = market_data.PriceStore(str(tmp_path), client)
+    fresh = store.get_history("SYN0001", START, END - timedelta(days=30))
+    assert not fresh.attrs.get("stale")
+
+    fault(error=500)
+    fail_calls(client, 3, "SYN0001")
+    stale = store.get_history("SYN0001", START, END)
+    assert stale.attrs.get("stale") is True
+    assert stale.attrs["as_of"] == (END - timedelta(days=30)).isoformat()
+    assert len(stale) == len(fresh)
+    with pytest.raises(upstream.CircuitOpen):
+        store.get_history("SYN0002", START, END)
+
+    # After reset_timeout one trial call goes through and closes the breaker
+    fault()
+    time.sleep(client.breaker.reset_timeout)
+    recovered = store.get_history("SYN0001", START, END)
+    assert client.breaker.state == client.breaker.CLOSED
+    assert not recovered.attrs.get("stale")
+    assert len(recovered) > len(fresh)
@@ -0,0 +1,47 @@
+import pytest
+from sqlalchemy import event
+from app.db.session import engine
+from app.models.models import StockView, StockViewQuota
+from app.services import view_quota
+
+LIMIT = 3
+
+@pytest.fixture(autouse=True)
+def forget_exhausted():
+    view_quota._exhausted.clear()
+    yield
+    view_quota._exhausted.clear()
+
+def consume_statements(db, user_id: int) -> list:
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement.split()[0].upper())
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        view_quota.consume(db, user_id, LIMIT)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    return statements
+
+def test_counted_view_is_a_single_update(db, make_user):
+    user, _ = make_user()
+    db.add(StockViewQuota(user_id=user.id, view_count=0))
+    db.commit()
+    assert consume_statements(db, user.id) == ["UPDATE"]
+    assert view_quota.get_view_count(db, user.id) == 1
+
+def test_counter_is_created_from_the_view_log_on_first_use(db, make_user):
+    user, _ = make_user()
+    db.add(StockView(user_id=user.id, stock_id=1))
+    db.commit()
+    assert view_quota.consume(db, user.id, LIMIT)
+    assert view_quota.get_view_count(db, user.id) == 2
+
+def test_limit_is_enforced_and_remembered(db, make_user):
+    user, _ = make_user()
+    assert [view_quota.consume(db, user.id, LIMIT) for _ in range(LIMIT + 1)] == [True] * LIMIT + [False]
+    assert view_quota.get_view_count(db, user.id) == LIMIT
+    assert view_quota.is_exhausted(user.id)
+    assert consume_statements(db, user.id) == []